@@ -0,0 +1,142 @@
+"""
+Fit per-tenant PCA projections for two-stage search.
+
+Collections created with VECTOR_TWO_STAGE on store a coarse vector per
+point, truncated from the full embedding until a projection is fitted.
+This samples up to VECTOR_COARSE_FIT_SAMPLE of the tenant's vectors, fits
+a VECTOR_COARSE_DIM-component PCA and stores it in vector_projections as
+refitting. Workers pick it up within TENANT_CACHE_TTL: from then on they
+project new points with it but search single-stage, since the stored
+coarse vectors are about to be in two spaces. Once that time has passed,
+every point's coarse vector is rewritten with the new projection and it
+is marked applied; workers return to two-stage search with it within
+TENANT_CACHE_TTL. Refit after a tenant's content changes substantially:
+
+    python -m app.coarse_index --tenant 12
+    python -m app.coarse_index --all
+"""
+from typing import Any, Dict, List
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.coarse_projection import CoarseProjection
+from app.services.vector_service import VectorService
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+
+def _reproject(vector_service: VectorService, tenant_id: int, projection: CoarseProjection) -> int:
+    """Rewrite every point's coarse vector; returns the number of points"""
+    backend = vector_service.backend
+    offset, points = None, 0
+    while True:
+        ids, vectors, offset = backend.scroll_vectors(tenant_id, PAGE_SIZE, offset)
+        if ids:
+            backend.set_coarse_vectors(tenant_id, ids, projection.apply(vectors).tolist())
+            points += len(ids)
+        if offset is None:
+            return points
+
+
+def fit_tenant(vector_service: VectorService, tenant_id: int, sample: int = None, settle: bool = True) -> Dict[str, Any]:
+    """
+    Fit and store a PCA projection for one tenant's collection; with
+    settle, wait TENANT_CACHE_TTL and apply it (else call apply_tenant)
+    """
+    backend = vector_service.backend
+    coarse_dimension = backend.coarse_dimension(tenant_id)
+    if not coarse_dimension:
+        raise ValueError(f"Tenant {tenant_id}'s collection has no coarse vectors (created with VECTOR_TWO_STAGE off)")
+    sample = sample or settings.VECTOR_COARSE_FIT_SAMPLE
+    
+    # Point ids are random UUIDs, so the first pages are a uniform sample
+    vectors: List[List[float]] = []
+    offset = None
+    while len(vectors) < sample:
+        _, page, offset = backend.scroll_vectors(tenant_id, min(PAGE_SIZE, sample - len(vectors)), offset)
+        vectors.extend(page)
+        if offset is None:
+            break
+    projection = CoarseProjection.fit_pca(np.asarray(vectors, dtype=np.float32), coarse_dimension)
+    
+    db = SessionLocal()
+    try:
+        projection.save(db, tenant_id, sample_size=len(vectors))
+        db.commit()
+    finally:
+        db.close()
+    vector_service.invalidate_projection(tenant_id)
+    
+    points = None
+    if settle:
+        # Workers still caching the old projection search two-stage with it
+        time.sleep(settings.TENANT_CACHE_TTL)
+        points = apply_tenant(vector_service, tenant_id)
+    
+    report = {
+        "tenant_id": tenant_id,
+        "points": points,
+        "sample_size": len(vectors),
+        "coarse_dimension": coarse_dimension,
+        "explained_variance": round(projection.explained_variance, 4),
+    }
+    logger.info(f"Fitted coarse projection: {report}")
+    return report
+
+
+def apply_tenant(vector_service: VectorService, tenant_id: int) -> int:
+    """
+    Rewrite every point with the stored projection and mark it applied;
+    only once every worker has loaded it (TENANT_CACHE_TTL after fit_tenant)
+    """
+    db = SessionLocal()
+    try:
+        projection = CoarseProjection.load(db, tenant_id)
+        points = _reproject(vector_service, tenant_id, projection)
+        CoarseProjection.mark_applied(db, tenant_id)
+        db.commit()
+    finally:
+        db.close()
+    vector_service.invalidate_projection(tenant_id)
+    return points
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fit PCA projections for two-stage vector search")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--tenant", type=int, action="append", help="tenant id (repeatable)")
+    target.add_argument("--all", action="store_true", help="every collection with coarse vectors")
+    parser.add_argument("--sample", type=int, help=f"vectors to fit on (default {settings.VECTOR_COARSE_FIT_SAMPLE})")
+    parser.add_argument("--no-settle", action="store_true",
+                        help="apply without waiting TENANT_CACHE_TTL (no API workers running)")
+    args = parser.parse_args(argv)
+    
+    vector_service = VectorService()
+    vector_service.connect()
+    tenant_ids = args.tenant or [
+        tenant_id for tenant_id in vector_service.backend.list_tenants()
+        if vector_service.backend.coarse_dimension(tenant_id)
+    ]
+    reports = [fit_tenant(vector_service, tenant_id, args.sample, settle=False) for tenant_id in tenant_ids]
+    if reports and not args.no_settle:
+        # One wait for all tenants, until every worker searches them single-stage
+        time.sleep(settings.TENANT_CACHE_TTL)
+    for report in reports:
+        report["points"] = apply_tenant(vector_service, report["tenant_id"])
+    for report in reports:
+        print(json.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    sys.exit(main())
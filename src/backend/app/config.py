@@ -9,11 +9,65 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: Optional[str] = None
     POSTGRES_DB: Optional[str] = None
     
+    # Connection pool (per worker). Pool size and overflow are derived from
+    # DB_MAX_CONNECTIONS / WEB_CONCURRENCY when not set explicitly.
+    WEB_CONCURRENCY: int = 1
+    DB_MAX_CONNECTIONS: int = 40
+    DB_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: Optional[int] = None
+    DB_POOL_TIMEOUT: int = 10
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800
+    DB_CONNECT_TIMEOUT: int = 5
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    DB_PGBOUNCER_MODE: bool = False
+    
+    # Audit table partitions (app.partitions): months created ahead of time,
+    # and how often each worker re-runs maintenance (creation and expiry)
+    PARTITION_MONTHS_AHEAD: int = 3
+    PARTITION_MAINTENANCE_INTERVAL: int = 86400
+    
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     
     # Qdrant
-    QDRANT_URL: str = "http://localhost:6333"
+    QDRANT_URL: str = "http://localhost:6333"  # https:// enables TLS
+    QDRANT_API_KEY: Optional[str] = None
+    # gRPC (QDRANT_GRPC_PORT, same host) instead of REST: binary-encoded
+    # vectors and a persistent HTTP/2 connection
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_TIMEOUT: int = 30
+    # Ingest writes: points per upsert request, and requests in flight per
+    # worker; document ingests send them without waiting and finish with
+    # one barrier
+    QDRANT_UPSERT_BATCH: int = 256
+    QDRANT_UPSERT_PARALLEL: int = 4
+    
+    # Vector store: "qdrant", or "local" for an embedded per-tenant index on
+    # disk (small single-host deployments; no Qdrant needed)
+    VECTOR_BACKEND: str = "qdrant"
+    VECTOR_LOCAL_PATH: str = "/data/vectors"
+    # Two-stage search (Qdrant): new collections also store a
+    # VECTOR_COARSE_DIM projection of each vector (per-tenant PCA once fitted
+    # with app.coarse_index, truncation until then); searches fetch top_k *
+    # VECTOR_COARSE_OVERSAMPLING candidates on it and rescore them with the
+    # full vectors
+    VECTOR_TWO_STAGE: bool = False
+    VECTOR_COARSE_DIM: int = 64
+    VECTOR_COARSE_OVERSAMPLING: int = 8
+    VECTOR_COARSE_FIT_SAMPLE: int = 20000  # vectors sampled to fit the PCA
+    
+    # Hot/cold tiering: collections of tenants without an /ask for
+    # TIERING_IDLE_SECONDS are moved "on_disk" (still searchable, memory-
+    # mapped) or to a Qdrant "snapshot" (dropped, restored on next access)
+    TIERING_ENABLED: bool = False
+    TIERING_MODE: str = "on_disk"
+    TIERING_IDLE_SECONDS: int = 259200  # 3 days
+    TIERING_SWEEP_INTERVAL: int = 3600
+    TIERING_REHYDRATE_TIMEOUT: float = 10.0  # longer waits return 503 + Retry-After
+    # Where the Qdrant server finds its own snapshots when recovering
+    QDRANT_SNAPSHOT_LOCATION: str = "file:///qdrant/snapshots"
     
     # LLM
     LLM_API_KEY: Optional[str] = None
@@ -24,11 +78,91 @@ class Settings(BaseSettings):
     APP_ENV: str = "development"
     LOG_LEVEL: str = "INFO"
     CACHE_TTL: int = 3600
+    # Cached answers are msgpack, zstd-compressed from this size (0 = never)
+    CACHE_COMPRESSION_MIN_BYTES: int = 256
+    CACHE_ZSTD_LEVEL: int = 3
+    CACHE_PIPELINE_BATCH: int = 500  # keys per round trip in batch get/set
+    # Cache warming: recompute answers to each tenant's top questions after
+    # document changes and every CACHE_WARM_INTERVAL (keep it below
+    # CACHE_TTL), capped per run by question count and wall time, and per
+    # tenant by LLM calls per UTC day (0 = no cap). Every warmed answer is a
+    # paid LLM call, so it is opt-in
+    CACHE_WARM_ENABLED: bool = False
+    CACHE_WARM_DAILY_LLM_CALLS: int = 200
+    CACHE_WARM_TOP_N: int = 20
+    CACHE_WARM_MIN_COUNT: int = 2  # times asked within the lookback
+    CACHE_WARM_LOOKBACK_DAYS: int = 7
+    CACHE_WARM_DEBOUNCE_SECONDS: float = 30.0
+    CACHE_WARM_INTERVAL: int = 3000
+    CACHE_WARM_MAX_SECONDS: float = 60.0
     RATE_LIMIT_PER_MINUTE: int = 60
     
+    # Idempotency-Key on POST /documents and /ask: completed responses are
+    # replayed for IDEMPOTENCY_TTL; duplicates arriving while the first
+    # request runs wait up to IDEMPOTENCY_WAIT_TIMEOUT, then get 409
+    IDEMPOTENCY_TTL: int = 86400
+    IDEMPOTENCY_LOCK_TTL: int = 300  # in-progress marker, outlives a crashed worker's request
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 30.0
+    
+    # Tracing (app.tracing; needs requirements-tracing.txt). Spans go to the
+    # "console" or to a JSON-lines "file" (TRACING_FILE, {pid} per worker).
+    # Traces of TRACING_SLOW_MS or longer and failed ones are always kept,
+    # others with probability TRACING_SAMPLE_RATIO; TRACING_SLOW_MS=0 samples
+    # by ratio up front instead
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "console"
+    TRACING_FILE: str = "/data/traces/traces-{pid}.jsonl"
+    TRACING_SAMPLE_RATIO: float = 0.01
+    TRACING_SLOW_MS: int = 1000
+    TRACING_MAX_PENDING_SPANS: int = 50000  # finished spans held per worker until their trace ends
+    TRACING_SERVICE_NAME: str = "knowledge-assistant"
+    
+    # Tenant metadata cache (seconds)
+    TENANT_CACHE_TTL: int = 60
+    TENANT_CACHE_NEGATIVE_TTL: int = 10
+    
     # Embedding
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION: int = 384
+    # "local" loads the model in every worker; "remote" uses the per-host
+    # embedding server (python -m app.embedding_server) over a Unix socket
+    EMBEDDING_MODE: str = "local"
+    EMBEDDING_SOCKET_PATH: str = "/tmp/embedding/embedding.sock"
+    EMBEDDING_SERVER_MAX_BATCH: int = 64
+    EMBEDDING_SERVER_BATCH_WAIT_MS: int = 5
+    EMBEDDING_WARMUP_BATCH: int = 8
+    # "torch" or "onnx" (needs requirements-onnx.txt)
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_INTRA_OP_THREADS: int = 0  # 0 = library default
+    EMBEDDING_ONNX_QUANTIZE: bool = False
+    EMBEDDING_ONNX_QUANTIZATION_CONFIG: str = "avx2"  # avx2, avx512, avx512_vnni or arm64
+    EMBEDDING_ONNX_CACHE_DIR: str = "/tmp/embedding/onnx"
+    # Executor for embedding work: "interactive" (/ask) jobs run before
+    # "bulk" (ingest) jobs, which may occupy all threads but one. Requests
+    # finding their lane's queue full get 503 + Retry-After
+    EMBEDDING_EXECUTOR_THREADS: int = 2
+    EMBEDDING_QUEUE_INTERACTIVE: int = 32
+    EMBEDDING_QUEUE_BULK: int = 8
+    EMBEDDING_BULK_BATCH: int = 64  # chunks per ingest job
+    # Re-indexing into new collections (python -m app.reindex): chunks read,
+    # embedded and written per batch, and a cap on chunks per second so the
+    # job leaves Postgres and Qdrant capacity for live traffic (0 = none)
+    REINDEX_BATCH_SIZE: int = 256
+    REINDEX_MAX_CHUNKS_PER_SECOND: int = 200
+    # The job only switches a tenant once the API's /ready reports the
+    # job's EMBEDDING_MODEL, so queries and ingests match the new vectors
+    REINDEX_API_URL: str = "http://localhost:8000"
+    
+    # Uploads (POST /documents/upload)
+    UPLOAD_MAX_BYTES: int = 100 * 1024 * 1024
+    UPLOAD_TMP_DIR: Optional[str] = None  # None = system temp dir
+    EXTRACTION_TIMEOUT: float = 30.0  # seconds per file
+    EXTRACTION_WORKERS: int = 0  # 0 = CPU count / WEB_CONCURRENCY
+    # Uploads above the threshold are chunked and embedded from disk in
+    # windows, with the body stored gzip-compressed under DOCUMENT_STORE_PATH
+    LARGE_DOCUMENT_THRESHOLD: int = 1024 * 1024
+    LARGE_DOCUMENT_WINDOW: int = 64  # chunks embedded and inserted per batch
+    DOCUMENT_STORE_PATH: str = "/data/documents"
     
     # Chunking
     CHUNK_SIZE: int = 500
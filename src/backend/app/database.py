@@ -1,9 +1,119 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, NullPool
+from typing import Dict, Any, Tuple
+import threading
+import time
+
 from app.config import settings
+from app.metrics import DB_POOL_WAIT_SECONDS, DB_POOL_CHECKOUT_FAILURES
+
+
+class PoolWaitStats:
+    """Tracks how long requests wait to check a connection out of the pool"""
+    
+    BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.failed = 0
+        self.buckets = [0] * (len(self.BUCKETS_MS) + 1)
+    
+    def observe(self, wait_ms: float):
+        with self._lock:
+            self.count += 1
+            self.total_ms += wait_ms
+            self.max_ms = max(self.max_ms, wait_ms)
+            for i, bound in enumerate(self.BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+    
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"le_{b}ms" for b in self.BUCKETS_MS] + ["gt_5000ms"]
+            return {
+                "checkouts": self.count,
+                "failed_checkouts": self.failed,
+                "avg_wait_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+                "max_wait_ms": round(self.max_ms, 3),
+                "wait_buckets": dict(zip(labels, self.buckets))
+            }
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records checkout wait time"""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            pool_wait_stats.record_failure()
+            DB_POOL_CHECKOUT_FAILURES.inc()
+            raise
+        waited = time.perf_counter() - start
+        pool_wait_stats.observe(waited * 1000)
+        DB_POOL_WAIT_SECONDS.observe(waited)
+        return conn
 
-engine = create_engine(settings.DATABASE_URL)
+
+def pool_sizing() -> Tuple[int, int]:
+    """Per-worker (pool_size, max_overflow), split from the host connection budget"""
+    workers = max(1, settings.WEB_CONCURRENCY)
+    per_worker = max(2, settings.DB_MAX_CONNECTIONS // workers)
+    pool_size = settings.DB_POOL_SIZE
+    if pool_size is None:
+        pool_size = max(1, per_worker // 2)
+    max_overflow = settings.DB_MAX_OVERFLOW
+    if max_overflow is None:
+        max_overflow = max(0, per_worker - pool_size)
+    return pool_size, max_overflow
+
+
+def build_engine(url: str):
+    """Create the engine with pool settings suited to the target database"""
+    if url.startswith("sqlite"):
+        # Local stand-in (benchmarks); sessions cross threads in FastAPI
+        return create_engine(url, connect_args={"check_same_thread": False})
+    if not url.startswith("postgresql"):
+        return create_engine(url)
+    
+    connect_args = {"connect_timeout": settings.DB_CONNECT_TIMEOUT}
+    
+    if settings.DB_PGBOUNCER_MODE:
+        # PgBouncer owns pooling; it also rejects unknown startup options, so
+        # statement_timeout must be configured on the PgBouncer/role side.
+        return create_engine(url, poolclass=NullPool, connect_args=connect_args)
+    
+    connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+    pool_size, max_overflow = pool_sizing()
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        connect_args=connect_args
+    )
+
+
+engine = build_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -14,3 +124,18 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def pool_metrics() -> Dict[str, Any]:
+    """Current pool occupancy plus checkout wait statistics"""
+    pool = engine.pool
+    metrics: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        metrics.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow()
+        })
+    metrics.update(pool_wait_stats.snapshot())
+    return metrics
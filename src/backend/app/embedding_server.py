@@ -0,0 +1,135 @@
+"""
+Per-host embedding server.
+
+Owns the single copy of the embedding model on a box and serves batched
+encode requests to API workers over a Unix socket, so uvicorn workers run
+with EMBEDDING_MODE=remote and never load the model themselves.
+
+    python -m app.embedding_server
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_client import (
+    REQUEST_HEADER, RESPONSE_HEADER, STATUS_OK, STATUS_ERROR
+)
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingServer:
+    """Coalesces concurrent requests into model-sized batches"""
+    
+    def __init__(self, encoder, max_batch: int, batch_wait_ms: int):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # One thread: the model already uses all cores per batch
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.dimension = encoder.get_sentence_embedding_dimension()
+    
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+    
+    async def batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending: List[Tuple[List[str], asyncio.Future]] = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.batch_wait
+            # Gather more requests until the batch is full or the wait expires
+            while size < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            
+            texts = [text for item, _ in pending for text in item]
+            try:
+                vectors = await loop.run_in_executor(
+                    self.executor, self.encoder.encode, texts
+                )
+                vectors = np.asarray(vectors, dtype=np.float32)
+            except Exception as e:
+                logger.error(f"Batch encode failed: {e}")
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            offset = 0
+            for item, future in pending:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item)])
+                offset += len(item)
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(REQUEST_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (length,) = REQUEST_HEADER.unpack(header)
+                request = json.loads(await reader.readexactly(length))
+                try:
+                    vectors = await self.embed(request["texts"])
+                    rows, dim = vectors.shape
+                    writer.write(RESPONSE_HEADER.pack(STATUS_OK, rows, dim))
+                    writer.write(vectors.astype("<f4", copy=False).tobytes())
+                except Exception as e:
+                    message = str(e).encode()
+                    writer.write(RESPONSE_HEADER.pack(STATUS_ERROR, len(message), 0) + message)
+                await writer.drain()
+        except Exception as e:
+            logger.error(f"Embedding connection error: {e}")
+        finally:
+            writer.close()
+
+
+async def serve():
+    from app.services.embedding_backends import load_encoder
+    
+    path = settings.EMBEDDING_SOCKET_PATH
+    encoder = load_encoder()
+    server = EmbeddingServer(
+        encoder,
+        max_batch=settings.EMBEDDING_SERVER_MAX_BATCH,
+        batch_wait_ms=settings.EMBEDDING_SERVER_BATCH_WAIT_MS
+    )
+    
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    unix_server = await asyncio.start_unix_server(server.handle, path=path)
+    os.chmod(path, 0o660)
+    logger.info(f"Embedding server listening on {path}")
+    
+    batcher = asyncio.create_task(server.batch_loop())
+    async with unix_server:
+        try:
+            await unix_server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
@@ -0,0 +1,84 @@
+"""
+Idempotency-Key handling for POST /documents and /ask.
+
+The first request with a key claims it in Redis and runs; its response is
+stored and replayed to any retry with the same key, without re-embedding or
+re-generating. Duplicates that arrive while the first request is still
+running poll the in-progress marker until the response is stored. A failed
+request releases its marker, so a retry runs again.
+"""
+from typing import Any, Awaitable, Callable, Optional, Type
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.config import settings
+from app.services.cache_service import CacheService
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+
+
+def fingerprint(payload: Any) -> str:
+    """Stable hash of the request body, to catch keys reused for other requests"""
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _replay(record: dict) -> JSONResponse:
+    return JSONResponse(content=record["body"], headers={"Idempotent-Replayed": "true"})
+
+
+async def run_idempotent(
+    cache_service: CacheService,
+    scope: str,
+    key: Optional[str],
+    payload: Any,
+    response_model: Type[BaseModel],
+    handler: Callable[[], Awaitable[Any]]
+):
+    """Run handler once per scope (endpoint and tenant) and key, replaying its response after"""
+    if key is None:
+        return await handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key is limited to {MAX_KEY_LENGTH} characters")
+    key = f"{scope}:{key}"
+    
+    request_fingerprint = fingerprint(payload)
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    interval = POLL_INTERVAL
+    while True:
+        record = cache_service.check_idempotency(key, request_fingerprint, owner)
+        if record is None:
+            break
+        if record.get("fingerprint", request_fingerprint) != request_fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was used for a different request")
+        if record["state"] == "done":
+            return _replay(record)
+        # In progress elsewhere: wait for its response, or for its marker to
+        # go away (failure, expiry) and claim the key ourselves
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress",
+                headers={"Retry-After": "5"}
+            )
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+    
+    try:
+        result = await handler()
+    except BaseException:
+        cache_service.release_idempotency(key, owner)
+        raise
+    cache_service.set_idempotency(key, request_fingerprint, jsonable_encoder(response_model.model_validate(result)))
+    return result
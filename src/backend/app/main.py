@@ -1,37 +1,133 @@
 from fastapi import FastAPI, Depends, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
+import time
 
+from app import tracing
 from app.config import settings
 from app.database import engine, Base, get_db
-from app.routers import documents, questions, tenants, health
+from app.routers import documents, questions, tenants, health, metrics
+from app.partitions import maintain_partitions
 from app.services.vector_service import VectorService
 from app.services.cache_service import CacheService
+from app.services.tenant_service import TenantService
+from app.services.extraction_service import ExtractionService
+from app.services.embedding_executor import EmbeddingExecutor
+from app.services.tiering_service import TieringService
+from app.services.usage_service import UsageService
+from app.services.cache_warmer import CacheWarmer
 
 logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
+async def warm_up(app: FastAPI):
+    """Bring up Qdrant and the embedding model without blocking startup"""
+    timings = app.state.startup_timings
+    try:
+        await app.state.vector_service.initialize(timings)
+        timings["total"] = round((time.perf_counter() - app.state.started_at) * 1000, 1)
+        logger.info(f"Vector service ready, startup phases (ms): {timings}")
+    except Exception as e:
+        app.state.startup_error = str(e)
+        logger.error(f"Vector service warm-up failed: {e}")
+
+
+async def tiering_loop(app: FastAPI):
+    """Periodically move idle tenant collections to cold storage"""
+    while True:
+        await asyncio.sleep(settings.TIERING_SWEEP_INTERVAL)
+        if not app.state.vector_service.ready:
+            continue
+        try:
+            moved = await asyncio.to_thread(app.state.tiering_service.sweep)
+            if moved:
+                logger.info(f"Tiering sweep offloaded {moved} collections")
+        except Exception as e:
+            logger.error(f"Tiering sweep failed: {e}")
+
+
+async def cache_warm_loop(app: FastAPI):
+    """Periodically recompute top answers for tenants with recent traffic"""
+    while True:
+        await asyncio.sleep(settings.CACHE_WARM_INTERVAL)
+        try:
+            warmed = await app.state.cache_warmer.warm_active(settings.CACHE_WARM_INTERVAL)
+            if warmed:
+                logger.info(f"Scheduled cache warming wrote {warmed} answers")
+        except Exception as e:
+            logger.error(f"Scheduled cache warming failed: {e}")
+
+
+async def partition_loop():
+    """Keep audit partitions created ahead and expired ones dropped"""
+    while True:
+        try:
+            await asyncio.to_thread(maintain_partitions)
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+        await asyncio.sleep(settings.PARTITION_MAINTENANCE_INTERVAL)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Knowledge Assistant API...")
+    app.state.started_at = time.perf_counter()
+    app.state.startup_timings = {}
+    app.state.startup_error = None
+    tracing.configure()
     
-    # Initialize vector service
+    # Vector service warms up in the background; /ready reports when done
     vector_service = VectorService()
-    await vector_service.initialize()
     app.state.vector_service = vector_service
+    warm_up_task = asyncio.create_task(warm_up(app))
     
     # Initialize cache service
     cache_service = CacheService()
     app.state.cache_service = cache_service
     
-    logger.info("Services initialized successfully")
+    # Initialize tenant resolver
+    app.state.tenant_service = TenantService()
+    
+    # Hourly usage rollups, written alongside ai_results
+    app.state.usage_service = UsageService()
+    
+    # Dedicated threads for embedding, with interactive and bulk lanes
+    app.state.embedding_executor = EmbeddingExecutor()
+    
+    # Process pool for parsing uploads, started on first use
+    app.state.extraction_service = ExtractionService()
+    
+    # Activity tracking shares the cache's Redis
+    app.state.tiering_service = TieringService(cache_service.client, vector_service)
+    background_tasks = [warm_up_task, asyncio.create_task(partition_loop())]
+    if settings.TIERING_ENABLED:
+        background_tasks.append(asyncio.create_task(tiering_loop(app)))
+    
+    # Recomputes top answers after document changes and on a schedule
+    app.state.cache_warmer = CacheWarmer(
+        cache_service, vector_service, app.state.tenant_service,
+        app.state.tiering_service, app.state.embedding_executor
+    )
+    if settings.CACHE_WARM_ENABLED:
+        background_tasks.append(asyncio.create_task(cache_warm_loop(app)))
+    
+    app.state.startup_timings["accepting_requests"] = round(
+        (time.perf_counter() - app.state.started_at) * 1000, 1
+    )
+    logger.info("Services initialized, vector service warming up")
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    for task in background_tasks:
+        task.cancel()
+    app.state.extraction_service.shutdown()
+    app.state.embedding_executor.shutdown()
+    tracing.shutdown()
 
 
 app = FastAPI(
@@ -47,10 +143,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# Outermost, so the root span covers the whole request
+app.add_middleware(tracing.TracingMiddleware)
 
 # Include routers
 app.include_router(health.router, tags=["Health"])
+app.include_router(metrics.router, tags=["Metrics"])
 app.include_router(tenants.router, prefix="/tenants", tags=["Tenants"])
 app.include_router(documents.router, prefix="/documents", tags=["Documents"])
 app.include_router(questions.router, tags=["Questions"])
@@ -0,0 +1,70 @@
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+import os
+import time
+
+# Latency buckets (seconds) spanning cache hits through LLM calls
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds",
+    "Duration of request pipeline stages",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+CACHE_HITS = Counter("cache_hits_total", "Answer cache hits", ["tier"])
+CACHE_MISSES = Counter("cache_misses_total", "Answer cache misses", ["tier"])
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected by the rate limiter", ["tier"])
+INGEST_CHUNKS = Counter("ingest_chunks_total", "Document chunks embedded and stored", ["tier"])
+CACHE_WARMED_ANSWERS = Counter("cache_warmed_answers_total", "Answers recomputed by the cache warmer", ["trigger"])
+
+TIERING_OFFLOADS = Counter("tiering_offloads_total", "Idle tenant collections moved to cold storage", ["mode"])
+TIERING_REHYDRATE_SECONDS = Histogram(
+    "tiering_rehydrate_seconds",
+    "Time to restore a cold tenant collection",
+    buckets=STAGE_BUCKETS
+)
+
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    buckets=STAGE_BUCKETS
+)
+DB_POOL_CHECKOUT_FAILURES = Counter("db_pool_checkout_failures_total", "Failed pool checkouts")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use", multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections opened beyond pool_size", multiprocess_mode="livesum")
+
+EMBEDDING_QUEUE_DEPTH = Gauge(
+    "embedding_queue_depth", "Jobs waiting in the embedding executor", ["lane"], multiprocess_mode="livesum"
+)
+EMBEDDING_QUEUE_WAIT_SECONDS = Histogram(
+    "embedding_queue_wait_seconds",
+    "Time embedding jobs wait for an executor thread",
+    ["lane"],
+    buckets=STAGE_BUCKETS
+)
+EMBEDDING_REJECTIONS = Counter("embedding_rejections_total", "Requests rejected by a full embedding queue", ["lane"])
+
+
+@contextmanager
+def track(stage: str) -> Iterator[None]:
+    """Time a block into stage_duration_seconds{stage=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition output, aggregated across workers in multiprocess mode"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
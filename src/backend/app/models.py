@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, ARRAY
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Text, Boolean, DateTime, ForeignKey, ARRAY, Index, Float, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -12,6 +12,9 @@ class Tenant(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
     slug = Column(String(100), unique=True, nullable=False)
+    tier = Column(String(50), nullable=False, default="standard")
+    retrieval_profile = Column(JSONB)  # overrides RetrievalProfile defaults
+    retention_months = Column(SmallInteger, nullable=False, default=12)  # months of audit rows, see schemas.RetentionMonths
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     is_active = Column(Boolean, default=True)
@@ -25,7 +28,8 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
     title = Column(String(500), nullable=False)
-    content = Column(Text, nullable=False)
+    content = Column(Text)  # NULL for large documents, see content_ref
+    content_ref = Column(String(500))  # gzip body under DOCUMENT_STORE_PATH
     source = Column(String(500))
     content_hash = Column(String(64), nullable=False)
     chunk_count = Column(Integer, default=0)
@@ -35,6 +39,11 @@ class Document(Base):
     
     tenant = relationship("Tenant", back_populates="documents")
     chunks = relationship("DocumentChunk", back_populates="document")
+    
+    __table_args__ = (
+        # Backs keyset-paginated listing of a tenant's active documents
+        Index("idx_documents_tenant_active_id", "tenant_id", "is_active", "id"),
+    )
 
 
 class DocumentChunk(Base):
@@ -51,27 +60,42 @@ class DocumentChunk(Base):
     document = relationship("Document", back_populates="chunks")
 
 
+# ai_requests, ai_results and audit_logs are partitioned by month and
+# retention class in Postgres (init.sql). The database key is (id,
+# created_at, retention_months); id alone comes from a sequence and is
+# enough for the ORM. Every insert must set retention_months from the tenant.
+AuditId = BigInteger().with_variant(Integer, "sqlite")
+
+
 class AIRequest(Base):
     __tablename__ = "ai_requests"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(AuditId, primary_key=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
-    request_id = Column(UUID(as_uuid=True), unique=True, nullable=False, default=uuid.uuid4)
+    request_id = Column(UUID(as_uuid=True), index=True, nullable=False, default=uuid.uuid4)
     question = Column(Text, nullable=False)
     context_chunks = Column(ARRAY(Text))
     prompt_tokens = Column(Integer)
     created_at = Column(DateTime, server_default=func.now())
     user_id = Column(String(100))
     ip_address = Column(String(45))
+    retention_months = Column(SmallInteger, nullable=False)
     
-    result = relationship("AIResult", back_populates="request", uselist=False)
+    # No foreign key across partitioned tables, so the join is spelled out
+    result = relationship(
+        "AIResult",
+        primaryjoin="AIRequest.request_id == foreign(AIResult.request_id)",
+        back_populates="request",
+        uselist=False,
+        viewonly=True
+    )
 
 
 class AIResult(Base):
     __tablename__ = "ai_results"
     
-    id = Column(Integer, primary_key=True, index=True)
-    request_id = Column(UUID(as_uuid=True), ForeignKey("ai_requests.request_id", ondelete="CASCADE"), nullable=False)
+    id = Column(AuditId, primary_key=True)
+    request_id = Column(UUID(as_uuid=True), index=True, nullable=False)
     tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
     answer = Column(Text, nullable=False)
     sources = Column(JSONB)
@@ -81,17 +105,73 @@ class AIResult(Base):
     latency_ms = Column(Integer)
     was_cached = Column(Boolean, default=False)
     created_at = Column(DateTime, server_default=func.now())
+    retention_months = Column(SmallInteger, nullable=False)
     
-    request = relationship("AIRequest", back_populates="result")
+    request = relationship(
+        "AIRequest",
+        primaryjoin="foreign(AIResult.request_id) == AIRequest.request_id",
+        back_populates="result",
+        viewonly=True
+    )
 
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(AuditId, primary_key=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="SET NULL"))
     action = Column(String(100), nullable=False)
     entity_type = Column(String(100))
-    entity_id = Column(Integer)
+    entity_id = Column(BigInteger)
     details = Column(JSONB)
     created_at = Column(DateTime, server_default=func.now())
+    retention_months = Column(SmallInteger, nullable=False)
+
+
+class TenantUsageHourly(Base):
+    """Per-tenant usage rollup for one UTC hour and latency bucket (UsageService)"""
+    __tablename__ = "tenant_usage_hourly"
+    
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    latency_bucket = Column(SmallInteger, primary_key=True)  # index into LATENCY_BUCKETS_MS
+    request_count = Column(Integer, nullable=False, default=0)
+    cached_count = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    latency_ms_sum = Column(BigInteger, nullable=False, default=0)
+
+
+class VectorProjection(Base):
+    """Fitted coarse-vector projection of one tenant's collection (CoarseProjection)"""
+    __tablename__ = "vector_projections"
+    
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True)
+    method = Column(String(20), nullable=False)
+    dimension = Column(SmallInteger, nullable=False)
+    coarse_dimension = Column(SmallInteger, nullable=False)
+    components = Column(LargeBinary, nullable=False)  # float32 (coarse_dimension, dimension), row-major
+    mean = Column(LargeBinary, nullable=False)  # float32 (dimension,)
+    sample_size = Column(Integer)
+    explained_variance = Column(Float)
+    # refitting: points are being rewritten with it and searches are single-stage; applied: done
+    status = Column(String(20), nullable=False, default="applied")
+    fitted_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class ReindexProgress(Base):
+    """Checkpoint of one re-index job for one tenant (app.reindex)"""
+    __tablename__ = "reindex_progress"
+    
+    job = Column(String(50), primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True)
+    model = Column(String(200), nullable=False)
+    collection = Column(String(100), nullable=False)
+    last_chunk_id = Column(Integer, nullable=False, default=0)  # keyset position in document_chunks
+    chunks_done = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False, default="copying")  # copying, switching, switched
+    replaced_collection = Column(String(100))  # alias target before the switch, dropped after it
+    started_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    switched_at = Column(DateTime)
@@ -0,0 +1,48 @@
+"""
+Partition maintenance for the audit tables.
+
+ai_requests, ai_results and audit_logs are partitioned by month and then by
+retention class (see init.sql). This keeps PARTITION_MONTHS_AHEAD months of
+empty partitions ready for inserts and drops the partitions whose retention
+has run out, so old audit rows go away without DELETE or table locks. Rows
+written while it was behind wait in each table's DEFAULT partition and are
+moved into their month on the next run. The API runs it at startup and
+every PARTITION_MAINTENANCE_INTERVAL; it can also be run from cron:
+
+    python -m app.partitions
+"""
+from datetime import date
+from typing import Dict
+import logging
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("ai_requests", "ai_results", "audit_logs")
+
+
+def maintain_partitions() -> Dict[str, Dict[str, int]]:
+    """Create upcoming partitions and drop expired ones; a no-op off Postgres"""
+    if engine.dialect.name != "postgresql":
+        return {}
+    
+    report = {}
+    with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            created = conn.execute(
+                text("SELECT create_monthly_partitions(:table, :from_month, :ahead)"),
+                {"table": table, "from_month": date.today(), "ahead": settings.PARTITION_MONTHS_AHEAD}
+            ).scalar()
+            dropped = conn.execute(text("SELECT drop_expired_partitions(:table)"), {"table": table}).scalar()
+            report[table] = {"created": created, "dropped": dropped}
+    logger.info(f"Partition maintenance: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    maintain_partitions()
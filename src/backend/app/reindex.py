@@ -0,0 +1,301 @@
+"""
+Re-embed every tenant's chunks into new collections, then switch to them.
+
+Run it with the new model configured while the API keeps serving queries
+from the current collections:
+
+    EMBEDDING_MODEL=all-mpnet-base-v2 EMBEDDING_DIMENSION=768 \\
+        python -m app.reindex --job mpnet [--tenant 12 ...]
+    python -m app.reindex --job mpnet --status
+
+Per tenant, the job reads the chunks of active documents from Postgres in
+id order, REINDEX_BATCH_SIZE at a time (keyset pagination, so each batch is
+an index range scan however far in it is), embeds them and writes them with
+their existing point ids to tenant_{id}_{job}. After every batch the last
+chunk id is checkpointed in reindex_progress; rerunning the same job after
+a crash resumes there, and rewriting a batch is harmless. Writes are capped
+at REINDEX_MAX_CHUNKS_PER_SECOND.
+
+Once a tenant is copied, the new collection is reconciled with Postgres
+(chunks committed out of id order are added, documents deleted meanwhile
+are removed) and the tenant_{id} alias is switched to it in one atomic
+update; the collection it replaced, recorded in reindex_progress before
+the switch, is then dropped. Queries are served by the old collection
+until that moment and by the new one after it. The switch holds the
+tenant's tiering lock, so document writes wait for it, and a cold
+(offloaded) collection is restored before it.
+
+Collections created before aliases are plain tenant_{id} collections,
+which cannot be switched atomically. Migrate them once, ahead of time:
+
+    python -m app.reindex --migrate-aliases [--tenant 12 ...]
+
+copies each into tenant_{id}_v0 with document writes blocked and makes
+tenant_{id} an alias of it; only queries in the instant between deleting
+the plain collection and creating the alias find nothing.
+
+Queries and ingests must use the model of the collection they reach, so
+a tenant is only switched while the API's /ready (REINDEX_API_URL)
+reports the job's EMBEDDING_MODEL. Copy with --no-switch ahead of time,
+deploy the new EMBEDDING_MODEL to the API, then rerun to switch.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+import uuid
+
+import httpx
+import redis
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Document, DocumentChunk, ReindexProgress, VectorProjection
+from app.services.coarse_projection import CoarseProjection
+from app.services.tiering_service import TieringService
+from app.services.vector_backends import QdrantBackend
+from app.services.vector_service import VectorService, chunk_payload
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,39}$")
+
+
+class Throttle:
+    """Sleeps as needed to keep a running total under rate items per second"""
+    
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.count = 0
+    
+    def add(self, count: int):
+        self.count += count
+        if self.rate:
+            ahead = self.count / self.rate - (time.monotonic() - self.start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def point_id(chunk: DocumentChunk) -> str:
+    """The chunk's point id; chunks from before vector ids were stored get a stable one"""
+    return chunk.vector_id or str(uuid.uuid5(uuid.NAMESPACE_URL, f"chunk:{chunk.id}"))
+
+
+def _qdrant_backend(vector_service: VectorService) -> QdrantBackend:
+    if not isinstance(vector_service.backend, QdrantBackend):
+        raise ValueError("Re-indexing switches Qdrant aliases and needs VECTOR_BACKEND=qdrant")
+    return vector_service.backend
+
+
+def migrate_aliases(vector_service: VectorService, tiering_service: TieringService, tenant_ids: List[int]) -> List[int]:
+    """Turn tenants' pre-alias collections into aliases (QdrantBackend.migrate_to_alias); returns those migrated"""
+    backend = _qdrant_backend(vector_service)
+    migrated = []
+    for tenant_id in tenant_ids:
+        if not backend.is_plain_collection(tenant_id) and not tiering_service.cold_state(tenant_id):
+            continue
+        with tiering_service.exclusive(tenant_id):
+            if backend.migrate_to_alias(tenant_id):
+                migrated.append(tenant_id)
+    return migrated
+
+
+class ReindexJob:
+    def __init__(self, vector_service: VectorService, tiering_service: TieringService, job: str, api_url: str = None):
+        if not JOB_NAME.match(job):
+            raise ValueError("Job names are lower-case letters, digits, '-' and '_' (at most 40)")
+        self.vector_service = vector_service
+        self.tiering_service = tiering_service
+        self.backend = _qdrant_backend(vector_service)
+        self.job = job
+        self.api_url = (api_url or settings.REINDEX_API_URL).rstrip("/")
+        self.batch_size = settings.REINDEX_BATCH_SIZE
+        self.throttle = Throttle(settings.REINDEX_MAX_CHUNKS_PER_SECOND)
+        self.coarse: Optional[CoarseProjection] = None
+        if settings.VECTOR_TWO_STAGE:
+            # Refit with app.coarse_index after the switch
+            self.coarse = CoarseProjection.truncate(settings.EMBEDDING_DIMENSION, settings.VECTOR_COARSE_DIM)
+    
+    def _batch(self, db: Session, tenant_id: int, after_id: int) -> List[Any]:
+        """Next chunks of active documents by id, with their document titles"""
+        return db.query(DocumentChunk, Document.title).join(
+            Document, Document.id == DocumentChunk.document_id
+        ).filter(
+            DocumentChunk.tenant_id == tenant_id,
+            DocumentChunk.id > after_id,
+            Document.is_active == True
+        ).order_by(DocumentChunk.id).limit(self.batch_size).all()
+    
+    def _write(self, name: str, tenant_id: int, rows: List[Any]):
+        embeddings = self.vector_service.embed_texts([chunk.content for chunk, _ in rows])
+        self.backend.upsert_shadow(
+            name,
+            [point_id(chunk) for chunk, _ in rows],
+            embeddings,
+            [
+                chunk_payload(tenant_id, chunk.document_id, chunk.chunk_index, chunk.content, title or "")
+                for chunk, title in rows
+            ],
+            self.coarse.apply(embeddings).tolist() if self.coarse else None
+        )
+        self.throttle.add(len(rows))
+    
+    def _copy(self, db: Session, progress: ReindexProgress):
+        """Copy from the checkpoint to the last chunk, checkpointing each batch"""
+        while rows := self._batch(db, progress.tenant_id, progress.last_chunk_id):
+            self._write(progress.collection, progress.tenant_id, rows)
+            progress.last_chunk_id = rows[-1][0].id
+            progress.chunks_done += len(rows)
+            db.commit()
+            logger.info(f"Re-index {self.job}: tenant {progress.tenant_id} at chunk {progress.last_chunk_id}")
+    
+    def _reconcile(self, db: Session, tenant_id: int, name: str) -> int:
+        """Add chunks the copy missed and drop deleted documents; returns chunks added"""
+        added, after_id = 0, 0
+        while rows := self._batch(db, tenant_id, after_id):
+            after_id = rows[-1][0].id
+            present = self.backend.existing_ids(name, [point_id(chunk) for chunk, _ in rows])
+            missing = [row for row in rows if point_id(row[0]) not in present]
+            if missing:
+                self._write(name, tenant_id, missing)
+                added += len(missing)
+        active = [
+            row[0] for row in db.query(Document.id).filter(
+                Document.tenant_id == tenant_id,
+                Document.is_active == True
+            ).all()
+        ]
+        self.backend.prune_shadow(name, tenant_id, active)
+        return added
+    
+    def _check_api_model(self):
+        """Refuse to switch while the API embeds with another model than the job"""
+        try:
+            model = httpx.get(f"{self.api_url}/ready", timeout=10).json().get("embedding_model")
+        except (httpx.HTTPError, ValueError) as e:
+            raise RuntimeError(f"Cannot read the API's embedding model from {self.api_url}/ready: {e}")
+        if model != settings.EMBEDDING_MODEL:
+            raise ValueError(f"The API at {self.api_url} embeds with {model}, not {settings.EMBEDDING_MODEL}; "
+                             f"deploy the new model before switching (--no-switch copies only)")
+    
+    def reindex_tenant(self, tenant_id: int, switch: bool = True, keep_old: bool = False) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            progress = db.get(ReindexProgress, (self.job, tenant_id))
+            if progress is None:
+                progress = ReindexProgress(
+                    job=self.job,
+                    tenant_id=tenant_id,
+                    model=settings.EMBEDDING_MODEL,
+                    collection=self.backend.create_shadow(
+                        tenant_id, self.job, settings.EMBEDDING_DIMENSION,
+                        settings.VECTOR_COARSE_DIM if self.coarse else None
+                    ),
+                    last_chunk_id=0,
+                    chunks_done=0,
+                    status="copying"
+                )
+                db.add(progress)
+                db.commit()
+            elif progress.model != settings.EMBEDDING_MODEL:
+                raise ValueError(f"Job {self.job} embeds with {progress.model}, not {settings.EMBEDDING_MODEL}")
+            
+            if progress.status != "switched":
+                self._copy(db, progress)
+                if switch:
+                    self._check_api_model()
+                    added = self._reconcile(db, tenant_id, progress.collection)
+                    # Restores an offloaded collection, and keeps writes and
+                    # offloads out until the switch is recorded
+                    with self.tiering_service.exclusive(tenant_id):
+                        if self.backend.is_plain_collection(tenant_id):
+                            raise ValueError(f"Tenant {tenant_id} has a pre-alias collection; "
+                                             f"run app.reindex --migrate-aliases first")
+                        if progress.status == "copying":
+                            # Recorded first: after a crash past the switch, the alias
+                            # already points at progress.collection
+                            progress.replaced_collection = self.backend.aliased_collection(tenant_id)
+                            progress.status = "switching"
+                            db.commit()
+                        self.backend.switch_alias(tenant_id, progress.collection)
+                        progress.status = "switched"
+                        progress.switched_at = datetime.now(timezone.utc).replace(tzinfo=None)
+                        # A PCA fitted on the old model's vectors no longer applies
+                        db.query(VectorProjection).filter(VectorProjection.tenant_id == tenant_id).delete()
+                        db.commit()
+                    self.vector_service.invalidate_projection(tenant_id)
+                    # Chunks ingested into the old collection while switching
+                    added += self._reconcile(db, tenant_id, progress.collection)
+                    previous = progress.replaced_collection
+                    if previous and previous != progress.collection and not keep_old:
+                        self.backend.drop_named(previous)
+                    logger.info(f"Re-index {self.job}: tenant {tenant_id} switched ({added} chunks reconciled)")
+            return self._status(progress)
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _status(progress: ReindexProgress) -> Dict[str, Any]:
+        return {
+            "tenant_id": progress.tenant_id,
+            "collection": progress.collection,
+            "model": progress.model,
+            "status": progress.status,
+            "chunks_done": progress.chunks_done,
+            "last_chunk_id": progress.last_chunk_id,
+        }
+    
+    def status(self) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            rows = db.query(ReindexProgress).filter(ReindexProgress.job == self.job).order_by(ReindexProgress.tenant_id)
+            return [self._status(progress) for progress in rows]
+        finally:
+            db.close()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-embed tenant collections with the configured model")
+    parser.add_argument("--job", help="job name; also the suffix of the new collections")
+    parser.add_argument("--migrate-aliases", action="store_true",
+                        help="turn pre-alias collections into aliases of tenant_{id}_v0 and exit")
+    parser.add_argument("--tenant", type=int, action="append", help="tenant id (repeatable; default all)")
+    parser.add_argument("--status", action="store_true", help="print the job's progress and exit")
+    parser.add_argument("--no-switch", action="store_true", help="copy only; rerun without it to switch")
+    parser.add_argument("--keep-old", action="store_true", help="keep the replaced collections")
+    parser.add_argument("--api-url", help="API whose /ready must report the job's model before switching "
+                                          "(default REINDEX_API_URL)")
+    args = parser.parse_args(argv)
+    if not args.job and not args.migrate_aliases:
+        parser.error("--job is required")
+    
+    vector_service = VectorService()
+    vector_service.connect()
+    tiering_service = TieringService(redis.from_url(settings.REDIS_URL, decode_responses=True), vector_service)
+    if args.migrate_aliases:
+        tenant_ids = args.tenant or vector_service.backend.list_tenants()
+        print(json.dumps({"migrated": migrate_aliases(vector_service, tiering_service, tenant_ids)}))
+        return 0
+    
+    job = ReindexJob(vector_service, tiering_service, args.job, args.api_url)
+    if args.status:
+        for line in job.status():
+            print(json.dumps(line))
+        return 0
+    
+    vector_service.load_encoder()
+    tenant_ids = args.tenant or vector_service.backend.list_tenants()
+    for tenant_id in tenant_ids:
+        print(json.dumps(job.reindex_tenant(tenant_id, switch=not args.no_switch, keep_old=args.keep_old)))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    sys.exit(main())
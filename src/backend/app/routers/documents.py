@@ -1,11 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Header, Query, Request, Response, UploadFile
 from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy import insert
+from typing import AsyncIterator, Iterable, Iterator, List, Optional
+import asyncio
+import itertools
+import logging
+import os
+import tempfile
 
+from app.config import settings
 from app.database import get_db
-from app.models import Tenant, Document, DocumentChunk, AuditLog
+from app.models import Document, DocumentChunk, AuditLog
 from app.schemas import DocumentCreate, DocumentResponse
 from app.services.document_service import DocumentService
+from app.services.extraction_service import ExtractionError, detect_format
+from app.services.embedding_executor import BULK, ExecutorSaturated
+from app.services.tiering_service import TenantBusy
+from app.metrics import track, INGEST_CHUNKS
+from app.idempotency import run_idempotent
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -20,26 +34,74 @@ def get_tenant_id(x_tenant_id: Optional[str] = Header(None)) -> int:
         raise HTTPException(status_code=400, detail="Invalid tenant ID")
 
 
-@router.post("", response_model=DocumentResponse)
-async def create_document(
-    request: Request,
-    document: DocumentCreate,
-    tenant_id: int = Depends(get_tenant_id),
-    db: Session = Depends(get_db)
-):
-    """Ingest a document for a tenant"""
-    
-    # Verify tenant exists
-    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+async def tenant_writing(request: Request, tenant_id: int = Depends(get_tenant_id)) -> AsyncIterator[None]:
+    """Keep the tenant's collection from being offloaded while documents are written or deleted"""
+    try:
+        async with request.app.state.tiering_service.writing(tenant_id):
+            yield
+    except TenantBusy:
+        raise HTTPException(status_code=503, detail="Tenant index is being moved", headers={"Retry-After": "5"})
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+async def _ingest_target(request: Request, db: Session, tenant_id: int):
+    """Resolve the tenant and make sure its collection can take writes"""
+    # Verify tenant exists and is active
+    tenant = request.app.state.tenant_service.get_tenant(db, tenant_id)
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant not found")
+    if not tenant["is_active"]:
+        raise HTTPException(status_code=403, detail="Tenant is inactive")
     
-    # Initialize services
+    vector_service = request.app.state.vector_service
+    if not vector_service.ready:
+        raise HTTPException(status_code=503, detail="Service warming up", headers={"Retry-After": "5"})
+    tiering_service = request.app.state.tiering_service
+    if not await tiering_service.ensure_hot(tenant_id, tiering_service.cold_state(tenant_id)):
+        raise HTTPException(status_code=503, detail="Tenant index is being restored", headers={"Retry-After": "5"})
+    
+    # Shed ingest load while the embedding executor's bulk lane is full
+    try:
+        request.app.state.embedding_executor.admit(BULK)
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Embedding capacity exhausted", headers={"Retry-After": "5"})
+    return tenant
+
+
+async def _abort_ingest(db: Session, vector_service, doc_service: DocumentService, db_document: Document):
+    """Leave nothing half-ingested behind, so the upload can be retried"""
+    # Read before the rollback expires them; a body ref may not be committed yet
+    tenant_id, document_id, content_ref = db_document.tenant_id, db_document.id, db_document.content_ref
+    db.rollback()
+    await asyncio.to_thread(vector_service.delete_document_vectors, tenant_id, document_id)
+    if content_ref:
+        doc_service.remove_body(content_ref)
+    db.delete(db_document)
+    db.commit()
+
+
+async def _ingest(
+    request: Request,
+    db: Session,
+    tenant: dict,
+    title: str,
+    content: str,
+    source: Optional[str],
+    pieces: Optional[Iterable[str]] = None
+) -> Document:
+    """Store, chunk and embed a document; pieces stream the content when given"""
+    tenant_id = tenant["id"]
     doc_service = DocumentService()
     vector_service = request.app.state.vector_service
+    embedding_executor = request.app.state.embedding_executor
     
     # Generate content hash
-    content_hash = doc_service.hash_content(document.content)
+    content_hash = doc_service.hash_content(content)
     
     # Check for duplicate
     existing = db.query(Document).filter(
@@ -52,39 +114,152 @@ async def create_document(
     # Create document record
     db_document = Document(
         tenant_id=tenant_id,
-        title=document.title,
-        content=document.content,
-        source=document.source,
+        title=title,
+        content=content,
+        source=source,
         content_hash=content_hash
     )
     db.add(db_document)
     db.commit()
     db.refresh(db_document)
     
-    # Chunk document
-    chunks = doc_service.chunk_document(document.content, document.title)
+    with vector_service.document_writes(tenant_id, db_document.id):
+        try:
+            # Chunk document
+            with track("ingest_chunking"):
+                if pieces is None:
+                    chunks = doc_service.chunk_document(content, title)
+                else:
+                    chunks = list(doc_service.iter_chunks(pieces, title))
+            
+            # Store embeddings in vector DB, in bounded bulk jobs so queries can
+            # run between them; upserts overlap with the next batch's embedding
+            # and are waited for once at the end
+            vector_ids = []
+            for batch in _batched(chunks, settings.EMBEDDING_BULK_BATCH):
+                vector_ids += await embedding_executor.run(
+                    BULK,
+                    vector_service.upsert_chunks,
+                    tenant_id=tenant_id,
+                    document_id=db_document.id,
+                    chunks=batch,
+                    wait_for_write=False,
+                    wait=True
+                )
+            await asyncio.to_thread(vector_service.flush_writes, tenant_id, db_document.id)
+            
+            # Store chunk records in PostgreSQL
+            for i, (chunk, vector_id) in enumerate(zip(chunks, vector_ids)):
+                db_chunk = DocumentChunk(
+                    document_id=db_document.id,
+                    tenant_id=tenant_id,
+                    chunk_index=i,
+                    content=chunk["content"],
+                    vector_id=vector_id
+                )
+                db.add(db_chunk)
+            
+            # Update chunk count
+            db_document.chunk_count = len(chunks)
+            db.commit()
+        except Exception:
+            logger.exception(f"Document ingest failed for tenant {tenant_id}")
+            await _abort_ingest(db, vector_service, doc_service, db_document)
+            raise
+    
+    INGEST_CHUNKS.labels(tier=tenant["tier"]).inc(len(chunks))
     
-    # Store embeddings in vector DB
-    vector_ids = vector_service.upsert_chunks(
+    # Audit log
+    audit = AuditLog(
         tenant_id=tenant_id,
-        document_id=db_document.id,
-        chunks=chunks
+        action="document_created",
+        entity_type="document",
+        entity_id=db_document.id,
+        details={"title": title, "chunks": len(chunks)},
+        retention_months=tenant["retention_months"]
     )
+    db.add(audit)
+    db.commit()
+    
+    # Refresh cached answers to the tenant's common questions
+    request.app.state.cache_warmer.trigger(tenant_id)
+    return db_document
+
+
+async def _ingest_large(
+    request: Request,
+    db: Session,
+    tenant: dict,
+    title: str,
+    text_path: str,
+    source: Optional[str]
+) -> Document:
+    """
+    Ingest extracted text from disk with bounded memory: chunks are embedded
+    and inserted LARGE_DOCUMENT_WINDOW at a time, and the body is stored
+    gzip-compressed by reference rather than in documents.content.
+    """
+    tenant_id = tenant["id"]
+    doc_service = DocumentService()
+    vector_service = request.app.state.vector_service
+    embedding_executor = request.app.state.embedding_executor
+    
+    content_hash = doc_service.hash_file(text_path)
+    existing = db.query(Document).filter(
+        Document.tenant_id == tenant_id,
+        Document.content_hash == content_hash
+    ).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Document already exists")
     
-    # Store chunk records in PostgreSQL
-    for i, (chunk, vector_id) in enumerate(zip(chunks, vector_ids)):
-        db_chunk = DocumentChunk(
-            document_id=db_document.id,
-            tenant_id=tenant_id,
-            chunk_index=i,
-            content=chunk["content"],
-            vector_id=vector_id
-        )
-        db.add(db_chunk)
-    
-    # Update chunk count
-    db_document.chunk_count = len(chunks)
+    # Row first, for the id; the body reference follows
+    db_document = Document(
+        tenant_id=tenant_id,
+        title=title,
+        content_ref="",
+        source=source,
+        content_hash=content_hash
+    )
+    db.add(db_document)
     db.commit()
+    db.refresh(db_document)
+    
+    chunk_count = 0
+    with vector_service.document_writes(tenant_id, db_document.id):
+        try:
+            db_document.content_ref = doc_service.store_body(text_path, tenant_id, db_document.id)
+            chunks = doc_service.iter_chunks(doc_service.iter_file(text_path), title)
+            for window in _batched(chunks, settings.LARGE_DOCUMENT_WINDOW):
+                vector_ids = await embedding_executor.run(
+                    BULK,
+                    vector_service.upsert_chunks,
+                    tenant_id=tenant_id,
+                    document_id=db_document.id,
+                    chunks=window,
+                    wait_for_write=False,
+                    wait=True
+                )
+                # Core insert, so chunk rows do not pile up in the session
+                db.execute(insert(DocumentChunk), [
+                    {
+                        "document_id": db_document.id,
+                        "tenant_id": tenant_id,
+                        "chunk_index": chunk["chunk_index"],
+                        "content": chunk["content"],
+                        "vector_id": vector_id
+                    }
+                    for chunk, vector_id in zip(window, vector_ids)
+                ])
+                chunk_count += len(window)
+                INGEST_CHUNKS.labels(tier=tenant["tier"]).inc(len(window))
+            
+            await asyncio.to_thread(vector_service.flush_writes, tenant_id, db_document.id)
+            db_document.chunk_count = chunk_count
+            db.commit()
+        except Exception:
+            logger.exception(f"Large document ingest failed for tenant {tenant_id}")
+            await _abort_ingest(db, vector_service, doc_service, db_document)
+            raise
     
     # Audit log
     audit = AuditLog(
@@ -92,24 +267,150 @@ async def create_document(
         action="document_created",
         entity_type="document",
         entity_id=db_document.id,
-        details={"title": document.title, "chunks": len(chunks)}
+        details={"title": title, "chunks": chunk_count, "content_ref": db_document.content_ref},
+        retention_months=tenant["retention_months"]
     )
     db.add(audit)
     db.commit()
     
+    # Refresh cached answers to the tenant's common questions
+    request.app.state.cache_warmer.trigger(tenant_id)
     return db_document
 
 
-@router.get("", response_model=list[DocumentResponse])
+@router.post("", response_model=DocumentResponse)
+async def create_document(
+    request: Request,
+    document: DocumentCreate,
+    tenant_id: int = Depends(get_tenant_id),
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    _writing: None = Depends(tenant_writing)
+):
+    """Ingest a document for a tenant"""
+    async def ingest():
+        tenant = await _ingest_target(request, db, tenant_id)
+        return await _ingest(request, db, tenant, document.title, document.content, document.source)
+    
+    return await run_idempotent(
+        request.app.state.cache_service,
+        f"documents:{tenant_id}",
+        idempotency_key,
+        document,
+        DocumentResponse,
+        ingest
+    )
+
+
+async def _save_upload(file: UploadFile) -> str:
+    """Stream an upload to a temporary file, enforcing UPLOAD_MAX_BYTES"""
+    fd, path = tempfile.mkstemp(prefix="upload-", dir=settings.UPLOAD_TMP_DIR)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while block := await file.read(1024 * 1024):
+                size += len(block)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds {settings.UPLOAD_MAX_BYTES} bytes"
+                    )
+                out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+@router.post("/upload", response_model=DocumentResponse)
+async def upload_document(
+    request: Request,
+    file: UploadFile = File(...),
+    title: Optional[str] = Form(None),
+    source: Optional[str] = Form(None),
+    tenant_id: int = Depends(get_tenant_id),
+    db: Session = Depends(get_db),
+    _writing: None = Depends(tenant_writing)
+):
+    """Ingest a PDF, DOCX, HTML, Markdown or text file"""
+    file_format = detect_format(file.filename, file.content_type)
+    if file_format is None:
+        raise HTTPException(status_code=415, detail="Unsupported file type")
+    tenant = await _ingest_target(request, db, tenant_id)
+    
+    path = await _save_upload(file)
+    title = title or os.path.splitext(file.filename or "")[0] or "Untitled"
+    source = source or file.filename
+    extraction_service = request.app.state.extraction_service
+    
+    if os.path.getsize(path) > settings.LARGE_DOCUMENT_THRESHOLD:
+        # Large document mode: the text goes to disk and is ingested in windows
+        text_path = f"{path}.txt"
+        try:
+            with track("ingest_extraction"):
+                written = await extraction_service.extract(path, file_format, out_path=text_path)
+            if not written:
+                raise HTTPException(status_code=422, detail="No text could be extracted")
+            return await _ingest_large(request, db, tenant, title, text_path, source)
+        except ExtractionError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        finally:
+            for leftover in (path, text_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+    
+    try:
+        with track("ingest_extraction"):
+            pieces = await extraction_service.extract(path, file_format)
+    except ExtractionError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    finally:
+        os.remove(path)
+    
+    content = "".join(pieces)
+    if not content.strip():
+        raise HTTPException(status_code=422, detail="No text could be extracted")
+    return await _ingest(request, db, tenant, title, content, source, pieces)
+
+
+@router.get("", response_model=List[DocumentResponse])
 def list_documents(
+    response: Response,
     tenant_id: int = Depends(get_tenant_id),
+    cursor: Optional[int] = Query(None, description="Return documents with id below this cursor"),
+    limit: int = Query(50, ge=1, le=200),
+    source: Optional[str] = None,
+    title_prefix: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """List all documents for a tenant"""
-    return db.query(Document).filter(
+    """
+    List documents for a tenant, newest first, using keyset pagination. The
+    body stays a plain list; the next page's cursor is in X-Next-Cursor.
+    """
+    # Project only the listed columns so the content TEXT column is never read
+    query = db.query(
+        Document.id,
+        Document.tenant_id,
+        Document.title,
+        Document.source,
+        Document.chunk_count,
+        Document.created_at
+    ).filter(
         Document.tenant_id == tenant_id,
         Document.is_active == True
-    ).all()
+    )
+    if cursor is not None:
+        query = query.filter(Document.id < cursor)
+    if source is not None:
+        query = query.filter(Document.source == source)
+    if title_prefix:
+        query = query.filter(Document.title.startswith(title_prefix, autoescape=True))
+    
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(Document.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        response.headers["X-Next-Cursor"] = str(rows[limit - 1].id)
+    return [DocumentResponse.model_validate(row) for row in rows[:limit]]
 
 
 @router.delete("/{document_id}")
@@ -117,7 +418,8 @@ async def delete_document(
     request: Request,
     document_id: int,
     tenant_id: int = Depends(get_tenant_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    _writing: None = Depends(tenant_writing)
 ):
     """Delete a document"""
     document = db.query(Document).filter(
@@ -130,20 +432,28 @@ async def delete_document(
     
     # Delete from vector DB
     vector_service = request.app.state.vector_service
-    vector_service.delete_document_vectors(tenant_id, document_id)
+    if not vector_service.ready:
+        raise HTTPException(status_code=503, detail="Service warming up", headers={"Retry-After": "5"})
+    tiering_service = request.app.state.tiering_service
+    if not await tiering_service.ensure_hot(tenant_id, tiering_service.cold_state(tenant_id)):
+        raise HTTPException(status_code=503, detail="Tenant index is being restored", headers={"Retry-After": "5"})
+    await asyncio.to_thread(vector_service.delete_document_vectors, tenant_id, document_id)
     
     # Soft delete
     document.is_active = False
     db.commit()
     
     # Audit log
+    tenant = request.app.state.tenant_service.get_tenant(db, tenant_id)
     audit = AuditLog(
         tenant_id=tenant_id,
         action="document_deleted",
         entity_type="document",
-        entity_id=document_id
+        entity_id=document_id,
+        retention_months=tenant["retention_months"] if tenant else 12
     )
     db.add(audit)
     db.commit()
     
+    request.app.state.cache_warmer.trigger(tenant_id)
     return {"status": "deleted"}
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy import text
-from app.database import SessionLocal
-from app.schemas import HealthResponse
+from app.config import settings
+from app.database import engine, pool_metrics
+from app.schemas import HealthResponse, ReadinessResponse
 
 router = APIRouter()
 
@@ -13,9 +15,9 @@ async def health_check(request: Request):
     # Check PostgreSQL
     postgres_ok = False
     try:
-        db = SessionLocal()
-        db.execute(text("SELECT 1"))
-        db.close()
+        # Borrow a pooled connection; it is returned even if the probe fails
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
         postgres_ok = True
     except Exception:
         pass
@@ -44,3 +46,24 @@ async def health_check(request: Request):
         redis=redis_ok,
         qdrant=qdrant_ok
     )
+
+
+@router.get("/ready", response_model=ReadinessResponse)
+async def readiness_check(request: Request):
+    """Ready once the embedding model is loaded and warmed; 503 until then"""
+    state = request.app.state
+    readiness = ReadinessResponse(
+        ready=state.vector_service.ready,
+        phases=state.startup_timings,
+        error=state.startup_error,
+        embedding_model=settings.EMBEDDING_MODEL
+    )
+    if not readiness.ready:
+        return JSONResponse(status_code=503, content=readiness.model_dump())
+    return readiness
+
+
+@router.get("/health/db-pool")
+async def db_pool_stats():
+    """Connection pool occupancy and checkout wait times"""
+    return pool_metrics()
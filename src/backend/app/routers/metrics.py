@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Response
+from sqlalchemy.pool import QueuePool
+
+from app.database import engine
+from app.metrics import DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, render
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint"""
+    # Pool occupancy is sampled at scrape time
+    if isinstance(engine.pool, QueuePool):
+        DB_POOL_CHECKED_OUT.set(engine.pool.checkedout())
+        DB_POOL_OVERFLOW.set(max(0, engine.pool.overflow()))
+    body, content_type = render()
+    return Response(content=body, headers={"Content-Type": content_type})
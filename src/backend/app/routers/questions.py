@@ -5,9 +5,13 @@ import uuid
 import time
 
 from app.database import get_db
-from app.models import Tenant, AIRequest, AIResult, AuditLog
+from app.models import AIRequest, AIResult, AuditLog
 from app.schemas import QuestionRequest, QuestionResponse, SourceInfo
 from app.services.llm_service import LLMService
+from app.services.embedding_executor import INTERACTIVE, ExecutorSaturated
+from app.metrics import track, CACHE_HITS, CACHE_MISSES, RATE_LIMIT_REJECTIONS
+from app.idempotency import run_idempotent
+from app.tracing import set_request_id
 
 router = APIRouter()
 
@@ -27,42 +31,72 @@ async def ask_question(
     request: Request,
     question_req: QuestionRequest,
     tenant_id: int = Depends(get_tenant_id),
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """Ask a question about internal documents"""
+    return await run_idempotent(
+        request.app.state.cache_service,
+        f"ask:{tenant_id}",
+        idempotency_key,
+        question_req,
+        QuestionResponse,
+        lambda: _answer(request, question_req, tenant_id, db)
+    )
+
+
+async def _answer(request: Request, question_req: QuestionRequest, tenant_id: int, db: Session) -> QuestionResponse:
+    """The /ask pipeline, run at most once per Idempotency-Key"""
     start_time = time.time()
+    request_id = uuid.uuid4()
+    set_request_id(request_id)
     
-    # Verify tenant exists
-    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    # Verify tenant exists and is active (cached, no DB read on hit)
+    with track("tenant_lookup"):
+        tenant = request.app.state.tenant_service.get_tenant(db, tenant_id)
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant not found")
+    if not tenant["is_active"]:
+        raise HTTPException(status_code=403, detail="Tenant is inactive")
     
     # Get services
     cache_service = request.app.state.cache_service
     vector_service = request.app.state.vector_service
+    usage_service = request.app.state.usage_service
     
     # Rate limiting
-    if not cache_service.check_rate_limit(tenant_id):
+    with track("rate_limit"):
+        allowed = cache_service.check_rate_limit(tenant_id)
+    if not allowed:
+        RATE_LIMIT_REJECTIONS.labels(tier=tenant["tier"]).inc()
         raise HTTPException(status_code=429, detail="Rate limit exceeded")
     
-    # Generate request ID
-    request_id = uuid.uuid4()
+    # Activity drives hot/cold tiering of the tenant's collection
+    tiering_service = request.app.state.tiering_service
+    with track("tiering_activity"):
+        cold_state = tiering_service.record_activity(tenant_id)
     
     # Check cache first
-    cached = cache_service.get_cached_answer(tenant_id, question_req.question)
+    with track("cache_get"):
+        cached = cache_service.get_cached_answer(tenant_id, question_req.question)
     if cached:
-        # Return cached response
-        latency_ms = int((time.time() - start_time) * 1000)
+        CACHE_HITS.labels(tier=tenant["tier"]).inc()
         
         # Log cached request
         ai_request = AIRequest(
             tenant_id=tenant_id,
             request_id=request_id,
             question=question_req.question,
-            context_chunks=[]
+            context_chunks=[],
+            retention_months=tenant["retention_months"]
         )
         db.add(ai_request)
-        db.commit()
+        with track("db_commit_ai_request"):
+            db.commit()
+        
+        # Measured after the request row is written; the result commit that
+        # stores it is timed by db_commit_ai_result
+        latency_ms = int((time.time() - start_time) * 1000)
         
         ai_result = AIResult(
             request_id=request_id,
@@ -71,10 +105,13 @@ async def ask_question(
             sources=cached["sources"],
             confidence=cached["confidence"],
             latency_ms=latency_ms,
-            was_cached=True
+            was_cached=True,
+            retention_months=tenant["retention_months"]
         )
         db.add(ai_result)
-        db.commit()
+        usage_service.record(db, tenant_id, latency_ms, was_cached=True)
+        with track("db_commit_ai_result"):
+            db.commit()
         
         return QuestionResponse(
             answer=cached["answer"],
@@ -83,23 +120,46 @@ async def ask_question(
             request_id=request_id
         )
     
-    # Search for relevant context
-    context_chunks = vector_service.search(
-        tenant_id=tenant_id,
-        query=question_req.question,
-        top_k=5,
-        score_threshold=0.3
-    )
+    CACHE_MISSES.labels(tier=tenant["tier"]).inc()
+    
+    # Cache misses need the encoder, which may still be warming up
+    if not vector_service.ready:
+        raise HTTPException(status_code=503, detail="Service warming up", headers={"Retry-After": "5"})
+    
+    # Idle tenants' collections may be in cold storage
+    if cold_state:
+        with track("tiering_rehydrate"):
+            restored = await tiering_service.ensure_hot(tenant_id, cold_state)
+        if not restored:
+            raise HTTPException(status_code=503, detail="Tenant index is being restored", headers={"Retry-After": "5"})
+    
+    # Search for relevant context with the tenant's retrieval profile, on
+    # the embedding executor's interactive lane
+    profile = tenant["retrieval_profile"]
+    try:
+        context_chunks = await request.app.state.embedding_executor.run(
+            INTERACTIVE,
+            vector_service.search,
+            tenant_id=tenant_id,
+            query=question_req.question,
+            top_k=profile["top_k"],
+            score_threshold=profile["score_threshold"],
+            hnsw_ef=profile["hnsw_ef"],
+            exact=profile["exact"],
+            quantization_rescore=profile["quantization_rescore"],
+            two_stage_oversampling=profile["two_stage_oversampling"]
+        )
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Embedding capacity exhausted", headers={"Retry-After": "1"})
     
     # Generate answer
     llm_service = LLMService()
-    llm_response = await llm_service.generate_answer(
-        question=question_req.question,
-        context_chunks=context_chunks,
-        tenant_name=tenant.name
-    )
-    
-    latency_ms = int((time.time() - start_time) * 1000)
+    with track("llm"):
+        llm_response = await llm_service.generate_answer(
+            question=question_req.question,
+            context_chunks=context_chunks,
+            tenant_name=tenant["name"]
+        )
     
     # Store request
     ai_request = AIRequest(
@@ -107,10 +167,14 @@ async def ask_question(
         request_id=request_id,
         question=question_req.question,
         context_chunks=[c["content"] for c in context_chunks],
-        prompt_tokens=llm_response.get("prompt_tokens")
+        prompt_tokens=llm_response.get("prompt_tokens"),
+        retention_months=tenant["retention_months"]
     )
     db.add(ai_request)
-    db.commit()
+    with track("db_commit_ai_request"):
+        db.commit()
+    
+    latency_ms = int((time.time() - start_time) * 1000)
     
     # Store result
     ai_result = AIResult(
@@ -122,21 +186,33 @@ async def ask_question(
         completion_tokens=llm_response.get("completion_tokens"),
         total_tokens=llm_response.get("total_tokens"),
         latency_ms=latency_ms,
-        was_cached=False
+        was_cached=False,
+        retention_months=tenant["retention_months"]
     )
     db.add(ai_result)
-    db.commit()
+    usage_service.record(
+        db,
+        tenant_id,
+        latency_ms,
+        was_cached=False,
+        prompt_tokens=llm_response.get("prompt_tokens"),
+        completion_tokens=llm_response.get("completion_tokens"),
+        total_tokens=llm_response.get("total_tokens")
+    )
+    with track("db_commit_ai_result"):
+        db.commit()
     
     # Cache the response
-    cache_service.cache_answer(
-        tenant_id=tenant_id,
-        question=question_req.question,
-        answer={
-            "answer": llm_response["answer"],
-            "sources": llm_response["sources"],
-            "confidence": llm_response["confidence"]
-        }
-    )
+    with track("cache_set"):
+        cache_service.cache_answer(
+            tenant_id=tenant_id,
+            question=question_req.question,
+            answer={
+                "answer": llm_response["answer"],
+                "sources": llm_response["sources"],
+                "confidence": llm_response["confidence"]
+            }
+        )
     
     # Audit log
     audit = AuditLog(
@@ -149,10 +225,12 @@ async def ask_question(
             "context_count": len(context_chunks),
             "confidence": llm_response["confidence"],
             "latency_ms": latency_ms
-        }
+        },
+        retention_months=tenant["retention_months"]
     )
     db.add(audit)
-    db.commit()
+    with track("db_commit_audit"):
+        db.commit()
     
     # Build source info
     sources = []
@@ -1,26 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
 
 from app.database import get_db
-from app.models import Tenant
-from app.schemas import TenantCreate, TenantResponse
+from app.models import Tenant, AuditLog
+from app.schemas import TenantCreate, TenantResponse, RetrievalProfile, UsageResponse
+from app.services.usage_service import to_utc
 
 router = APIRouter()
 
 
 @router.post("", response_model=TenantResponse)
-def create_tenant(tenant: TenantCreate, db: Session = Depends(get_db)):
+def create_tenant(request: Request, tenant: TenantCreate, db: Session = Depends(get_db)):
     """Create a new tenant"""
     # Check if slug already exists
     existing = db.query(Tenant).filter(Tenant.slug == tenant.slug).first()
     if existing:
         raise HTTPException(status_code=400, detail="Tenant slug already exists")
     
-    db_tenant = Tenant(name=tenant.name, slug=tenant.slug)
+    db_tenant = Tenant(
+        name=tenant.name,
+        slug=tenant.slug,
+        tier=tenant.tier,
+        retention_months=tenant.retention_months
+    )
     db.add(db_tenant)
     db.commit()
     db.refresh(db_tenant)
+    
+    # Replace any negative cache entry for the new id
+    request.app.state.tenant_service.prime(db_tenant)
     return db_tenant
 
 
@@ -37,3 +47,91 @@ def get_tenant(tenant_id: int, db: Session = Depends(get_db)):
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant not found")
     return tenant
+
+
+@router.delete("/{tenant_id}")
+def deactivate_tenant(request: Request, tenant_id: int, db: Session = Depends(get_db)):
+    """Deactivate a tenant"""
+    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    if not tenant:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    
+    # Soft delete
+    tenant.is_active = False
+    db.commit()
+    request.app.state.tenant_service.invalidate(tenant_id)
+    
+    # Audit log
+    audit = AuditLog(
+        tenant_id=tenant_id,
+        action="tenant_deactivated",
+        entity_type="tenant",
+        entity_id=tenant_id,
+        retention_months=tenant.retention_months
+    )
+    db.add(audit)
+    db.commit()
+    
+    return {"status": "deactivated"}
+
+
+@router.get("/{tenant_id}/retrieval-profile", response_model=RetrievalProfile)
+def get_retrieval_profile(tenant_id: int, db: Session = Depends(get_db)):
+    """Get the tenant's retrieval parameters, with defaults filled in"""
+    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    if not tenant:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    return RetrievalProfile(**(tenant.retrieval_profile or {}))
+
+
+@router.put("/{tenant_id}/retrieval-profile", response_model=RetrievalProfile)
+def update_retrieval_profile(
+    request: Request,
+    tenant_id: int,
+    profile: RetrievalProfile,
+    db: Session = Depends(get_db)
+):
+    """Replace the tenant's retrieval parameters"""
+    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    if not tenant:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    
+    # Only store overrides, so later default changes still reach this tenant
+    tenant.retrieval_profile = profile.model_dump(exclude_defaults=True) or None
+    db.commit()
+    db.refresh(tenant)
+    request.app.state.tenant_service.prime(tenant)
+    
+    # Audit log
+    audit = AuditLog(
+        tenant_id=tenant_id,
+        action="retrieval_profile_updated",
+        entity_type="tenant",
+        entity_id=tenant_id,
+        details=profile.model_dump(),
+        retention_months=tenant.retention_months
+    )
+    db.add(audit)
+    db.commit()
+    
+    return profile
+
+
+@router.get("/{tenant_id}/usage", response_model=UsageResponse)
+def get_usage(
+    request: Request,
+    tenant_id: int,
+    start: Optional[datetime] = Query(None, description="Default: 24 hours before end"),
+    end: Optional[datetime] = Query(None, description="Default: now (UTC)"),
+    db: Session = Depends(get_db)
+):
+    """Hourly request, cache, token and latency usage, from the rollup table only"""
+    if not request.app.state.tenant_service.get_tenant(db, tenant_id):
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    end = to_utc(end or datetime.now(timezone.utc))
+    start = to_utc(start) if start else end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if end - start > timedelta(days=366):
+        raise HTTPException(status_code=400, detail="Range is limited to 366 days")
+    return request.app.state.usage_service.report(db, tenant_id, start, end)
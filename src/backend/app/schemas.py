@@ -1,19 +1,44 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Literal
 from datetime import datetime
 from uuid import UUID
 
 
 # Tenant schemas
+
+# Audit retention classes; each has its own partitions (retention_classes() in init.sql)
+RetentionMonths = Literal[1, 3, 6, 12, 24]
+
+# Tenant tiers label the per-tenant metrics, so the set stays small and closed
+# (CHECK constraint on tenants.tier in init.sql)
+TenantTier = Literal["free", "standard", "enterprise"]
+
+
 class TenantCreate(BaseModel):
     name: str
     slug: str
+    tier: TenantTier = "standard"
+    retention_months: RetentionMonths = 12
+
+
+class RetrievalProfile(BaseModel):
+    top_k: int = Field(5, ge=1, le=50)
+    score_threshold: float = Field(0.3, ge=0.0, le=1.0)
+    hnsw_ef: Optional[int] = Field(None, ge=1, description="None uses the collection default")
+    exact: bool = Field(False, description="Brute-force search, for small tenants")
+    quantization_rescore: Optional[bool] = Field(None, description="Rescore quantized hits with full vectors")
+    two_stage_oversampling: Optional[int] = Field(
+        None, ge=0, le=50,
+        description="Coarse candidates fetched per result in two-stage search; 0 disables it, None uses the default"
+    )
 
 
 class TenantResponse(BaseModel):
     id: int
     name: str
     slug: str
+    tier: str
+    retention_months: int
     is_active: bool
     created_at: datetime
     
@@ -43,6 +68,11 @@ class DocumentResponse(BaseModel):
 # Question schemas
 class QuestionRequest(BaseModel):
     question: str = Field(..., min_length=3, max_length=1000)
+    
+    class Config:
+        # Stripped before it is stored, so CacheWarmer.top_questions groups
+        # the same text the answer cache key is made from
+        str_strip_whitespace = True
 
 
 class SourceInfo(BaseModel):
@@ -57,9 +87,48 @@ class QuestionResponse(BaseModel):
     request_id: UUID
 
 
+# Usage schemas
+class LatencyBucket(BaseModel):
+    le_ms: Optional[int] = Field(..., description="Bucket upper bound; None for slower requests")
+    count: int
+
+
+class UsageSummary(BaseModel):
+    request_count: int
+    cached_count: int
+    cache_hit_ratio: float
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    avg_latency_ms: Optional[float]
+    latency_percentiles_ms: Dict[str, Optional[int]] = Field(
+        ..., description="Upper bound of the histogram bucket holding p50/p95/p99"
+    )
+    latency_histogram: List[LatencyBucket]
+
+
+class UsageHour(UsageSummary):
+    hour: datetime
+
+
+class UsageResponse(BaseModel):
+    tenant_id: int
+    start: datetime
+    end: datetime
+    totals: UsageSummary
+    hours: List[UsageHour]
+
+
 # Health schemas
 class HealthResponse(BaseModel):
     status: str
     postgres: bool
     redis: bool
     qdrant: bool
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    phases: Dict[str, float]
+    error: Optional[str] = None
+    embedding_model: Optional[str] = None
@@ -1,18 +1,78 @@
 import redis
 import json
 import hashlib
-from typing import Optional, Any
+from typing import Optional, Any, Dict, Iterable, List
 import logging
+import threading
+
+import msgpack
+import zstandard
 
 from app.config import settings
+from app.tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# Cached answers are stored as bytes: a format version byte, a codec byte,
+# then the msgpack payload, zstd-compressed at CACHE_COMPRESSION_MIN_BYTES
+# and above. Values starting with "{" are JSON written by older releases.
+FORMAT_VERSION = 1
+CODEC_MSGPACK = 0
+CODEC_MSGPACK_ZSTD = 1
+
+
+# zstd contexts are reusable but not thread-safe, so one pair per thread
+_zstd = threading.local()
+
+
+class CacheDecodeError(Exception):
+    """A cached value is in a format this release cannot read"""
+
+
+def _compressor() -> zstandard.ZstdCompressor:
+    if getattr(_zstd, "compressor", None) is None:
+        _zstd.compressor = zstandard.ZstdCompressor(level=settings.CACHE_ZSTD_LEVEL)
+        _zstd.decompressor = zstandard.ZstdDecompressor()
+    return _zstd.compressor
+
+
+def encode_value(value: Any) -> bytes:
+    """Serialise a cache value with the versioned binary header"""
+    payload = msgpack.packb(value, use_bin_type=True)
+    threshold = settings.CACHE_COMPRESSION_MIN_BYTES
+    if threshold and len(payload) >= threshold:
+        compressed = _compressor().compress(payload)
+        if len(compressed) < len(payload):
+            return bytes((FORMAT_VERSION, CODEC_MSGPACK_ZSTD)) + compressed
+    return bytes((FORMAT_VERSION, CODEC_MSGPACK)) + payload
+
+
+def decode_value(data: bytes) -> Any:
+    """Inverse of encode_value; also reads legacy JSON values"""
+    if data[:1] == b"{":
+        return json.loads(data)
+    if len(data) < 2 or data[0] != FORMAT_VERSION:
+        raise CacheDecodeError(f"Unknown cache format {data[:1]!r}")
+    codec, payload = data[1], data[2:]
+    if codec == CODEC_MSGPACK_ZSTD:
+        _compressor()
+        payload = _zstd.decompressor.decompress(payload)
+    elif codec != CODEC_MSGPACK:
+        raise CacheDecodeError(f"Unknown cache codec {codec}")
+    return msgpack.unpackb(payload, raw=False)
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 
 class CacheService:
     def __init__(self):
         self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
-        
+        # Answers are binary (encode_value), so they use a client that returns bytes
+        self.binary_client = redis.from_url(settings.REDIS_URL)
+    
     def _make_key(self, tenant_id: int, question: str) -> str:
         """Generate cache key from tenant and question"""
         # Normalize question for caching
@@ -20,18 +80,20 @@ class CacheService:
         question_hash = hashlib.md5(normalized.encode()).hexdigest()
         return f"qa:{tenant_id}:{question_hash}"
     
+    @traced
     def get_cached_answer(self, tenant_id: int, question: str) -> Optional[dict]:
         """Get cached answer if exists"""
         key = self._make_key(tenant_id, question)
         try:
-            cached = self.client.get(key)
+            cached = self.binary_client.get(key)
             if cached:
                 logger.info(f"Cache hit for tenant {tenant_id}")
-                return json.loads(cached)
+                return decode_value(cached)
         except Exception as e:
             logger.error(f"Cache get error: {e}")
         return None
     
+    @traced
     def cache_answer(
         self,
         tenant_id: int,
@@ -43,11 +105,56 @@ class CacheService:
         key = self._make_key(tenant_id, question)
         ttl = ttl or settings.CACHE_TTL
         try:
-            self.client.setex(key, ttl, json.dumps(answer))
+            self.binary_client.setex(key, ttl, encode_value(answer))
             logger.info(f"Cached answer for tenant {tenant_id}")
         except Exception as e:
             logger.error(f"Cache set error: {e}")
     
+    @traced
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Decoded values for keys (None for misses), pipelined CACHE_PIPELINE_BATCH keys per round trip"""
+        values: List[Optional[Any]] = []
+        try:
+            for batch in _chunks(keys, settings.CACHE_PIPELINE_BATCH):
+                pipe = self.binary_client.pipeline(transaction=False)
+                for key in batch:
+                    pipe.get(key)
+                values.extend(pipe.execute())
+        except Exception as e:
+            logger.error(f"Cache batch get error: {e}")
+            return [None] * len(keys)
+        
+        decoded = []
+        for key, value in zip(keys, values):
+            try:
+                decoded.append(decode_value(value) if value else None)
+            except Exception as e:
+                logger.warning(f"Ignoring undecodable cache value {key}: {e}")
+                decoded.append(None)
+        return decoded
+    
+    @traced
+    def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None):
+        """Encode and store values with a TTL, pipelined like get_many"""
+        ttl = ttl or settings.CACHE_TTL
+        try:
+            for batch in _chunks(list(items.items()), settings.CACHE_PIPELINE_BATCH):
+                pipe = self.binary_client.pipeline(transaction=False)
+                for key, value in batch:
+                    pipe.setex(key, ttl, encode_value(value))
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache batch set error: {e}")
+    
+    def get_cached_answers(self, tenant_id: int, questions: List[str]) -> List[Optional[dict]]:
+        """Cached answers for many questions in as few round trips as possible"""
+        return self.get_many([self._make_key(tenant_id, question) for question in questions])
+    
+    def cache_answers(self, tenant_id: int, answers: Dict[str, dict], ttl: Optional[int] = None):
+        """Cache answers for many questions at once"""
+        self.set_many({self._make_key(tenant_id, question): answer for question, answer in answers.items()}, ttl)
+    
+    @traced
     def check_rate_limit(self, tenant_id: int) -> bool:
         """Check if tenant is within rate limit"""
         key = f"rate:{tenant_id}"
@@ -64,24 +171,54 @@ class CacheService:
             logger.error(f"Rate limit check error: {e}")
             return True  # Fail open
     
-    def check_idempotency(self, request_id: str) -> bool:
-        """Check if request was already processed (idempotency)"""
-        key = f"idem:{request_id}"
+    # Idempotency records live at idem:{key} as JSON: {"state": "pending",
+    # "owner", "fingerprint"} while the first request runs, then {"state":
+    # "done", "fingerprint", "body"} for IDEMPOTENCY_TTL
+    
+    @traced
+    def check_idempotency(self, key: str, fingerprint: str, owner: str) -> Optional[dict]:
+        """Claim an idempotency key; None if claimed, else the existing record"""
+        redis_key = f"idem:{key}"
+        pending = json.dumps({"state": "pending", "owner": owner, "fingerprint": fingerprint})
         try:
-            # SETNX returns True if key was set (new request)
-            return self.client.setnx(key, "1")
+            # SET NX succeeds only for the first request with this key
+            if self.client.set(redis_key, pending, nx=True, ex=settings.IDEMPOTENCY_LOCK_TTL):
+                return None
+            return self.get_idempotency(key) or {"state": "pending"}
         except Exception as e:
             logger.error(f"Idempotency check error: {e}")
-            return True
+            return None  # Fail open: run the request
     
-    def set_idempotency(self, request_id: str, ttl: int = 3600):
-        """Mark request as processed"""
-        key = f"idem:{request_id}"
+    @traced
+    def get_idempotency(self, key: str) -> Optional[dict]:
+        """Current idempotency record, if any"""
         try:
-            self.client.setex(key, ttl, "1")
+            record = self.client.get(f"idem:{key}")
+            return json.loads(record) if record else None
+        except Exception as e:
+            logger.error(f"Idempotency get error: {e}")
+            return None
+    
+    @traced
+    def set_idempotency(self, key: str, fingerprint: str, body: Any, ttl: Optional[int] = None):
+        """Store the completed response for replay"""
+        record = json.dumps({"state": "done", "fingerprint": fingerprint, "body": body})
+        try:
+            self.client.setex(f"idem:{key}", ttl or settings.IDEMPOTENCY_TTL, record)
         except Exception as e:
             logger.error(f"Idempotency set error: {e}")
     
+    @traced
+    def release_idempotency(self, key: str, owner: str):
+        """Drop our in-progress marker after a failure, so a retry runs again"""
+        record = self.get_idempotency(key)
+        if record and record.get("owner") == owner:
+            try:
+                self.client.delete(f"idem:{key}")
+            except Exception as e:
+                logger.error(f"Idempotency release error: {e}")
+    
+    @traced
     def health_check(self) -> bool:
         """Check if Redis is healthy"""
         try:
@@ -0,0 +1,182 @@
+"""
+Proactive answer cache warming.
+
+Recomputes the answers to each tenant's most frequent recent questions and
+writes them to the answer cache, so the first users after a document
+change (or after answers expire) get cache hits. Runs are triggered by
+document changes, debounced so a burst of ingests warms once, and on a
+schedule for tenants with recent traffic.
+
+Warming is off unless CACHE_WARM_ENABLED, since every warmed answer is a
+paid LLM call, and capped: one run at a time per worker and one per tenant
+across workers (Redis lock), at most CACHE_WARM_TOP_N questions and
+CACHE_WARM_MAX_SECONDS per run, at most CACHE_WARM_DAILY_LLM_CALLS LLM
+calls per tenant per UTC day, and searches go to the embedding executor's
+bulk lane. A run stops as soon as real requests are queued
+there, so warming never delays /ask or ingests.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+import asyncio
+import logging
+import time
+import uuid
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.metrics import CACHE_WARMED_ANSWERS
+from app.models import AIRequest, TenantUsageHourly
+from app.services.embedding_executor import BULK, INTERACTIVE, ExecutorSaturated
+from app.services.llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer:
+    def __init__(self, cache_service, vector_service, tenant_service, tiering_service, embedding_executor):
+        self.cache_service = cache_service
+        self.vector_service = vector_service
+        self.tenant_service = tenant_service
+        self.tiering_service = tiering_service
+        self.embedding_executor = embedding_executor
+        self.enabled = settings.CACHE_WARM_ENABLED
+        self.top_n = settings.CACHE_WARM_TOP_N
+        self.min_count = settings.CACHE_WARM_MIN_COUNT
+        self.lookback = timedelta(days=settings.CACHE_WARM_LOOKBACK_DAYS)
+        self.debounce = settings.CACHE_WARM_DEBOUNCE_SECONDS
+        self.max_seconds = settings.CACHE_WARM_MAX_SECONDS
+        self.daily_llm_calls = settings.CACHE_WARM_DAILY_LLM_CALLS
+        # tenant_id -> task waiting out the debounce delay
+        self._pending: Dict[int, asyncio.Task] = {}
+        self._running = asyncio.Semaphore(1)
+    
+    def trigger(self, tenant_id: int):
+        """Warm a tenant soon after a document change; repeated calls coalesce"""
+        if not self.enabled:
+            return
+        task = self._pending.get(tenant_id)
+        if task is None or task.done():
+            self._pending[tenant_id] = asyncio.create_task(self._debounced(tenant_id))
+    
+    async def _debounced(self, tenant_id: int):
+        await asyncio.sleep(self.debounce)
+        # Changes from here on schedule a new run
+        self._pending.pop(tenant_id, None)
+        await self.warm_tenant(tenant_id, "document")
+    
+    def top_questions(self, db: Session, tenant_id: int) -> List[str]:
+        """The tenant's most frequent questions in the lookback window, as the cache normalises them"""
+        # Questions are stored stripped of all whitespace (QuestionRequest),
+        # so only case is left to fold; trim covers rows stored before that
+        normalized = func.lower(func.trim(AIRequest.question))
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - self.lookback
+        rows = db.query(func.min(AIRequest.question)).filter(
+            AIRequest.tenant_id == tenant_id,
+            AIRequest.created_at >= cutoff
+        ).group_by(normalized).having(
+            func.count() >= self.min_count
+        ).order_by(func.count().desc()).limit(self.top_n).all()
+        return [row[0] for row in rows]
+    
+    def active_tenants(self, db: Session, since: datetime) -> List[int]:
+        """Tenants with answered questions since a time, from the usage rollups"""
+        rows = db.query(TenantUsageHourly.tenant_id).filter(
+            TenantUsageHourly.hour >= since.replace(minute=0, second=0, microsecond=0)
+        ).distinct().all()
+        return [row[0] for row in rows]
+    
+    async def warm_active(self, interval: float) -> int:
+        """Scheduled run: warm every tenant that asked questions in the last interval"""
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=interval)
+        db = SessionLocal()
+        try:
+            tenant_ids = await asyncio.to_thread(self.active_tenants, db, since)
+        finally:
+            db.close()
+        warmed = 0
+        for tenant_id in tenant_ids:
+            warmed += await self.warm_tenant(tenant_id, "schedule")
+        return warmed
+    
+    async def warm_tenant(self, tenant_id: int, trigger: str) -> int:
+        """Recompute and cache the tenant's top answers; returns how many were written"""
+        if not self.vector_service.ready:
+            return 0
+        async with self._running:
+            lock_key = f"warm:lock:{tenant_id}"
+            token = uuid.uuid4().hex
+            if not self.cache_service.client.set(lock_key, token, nx=True, ex=int(self.max_seconds) + 60):
+                return 0
+            try:
+                return await self._warm(tenant_id, trigger)
+            except Exception as e:
+                logger.error(f"Cache warming failed for tenant {tenant_id}: {e}")
+                return 0
+            finally:
+                if self.cache_service.client.get(lock_key) == token:
+                    self.cache_service.client.delete(lock_key)
+    
+    def _busy(self) -> bool:
+        return bool(self.embedding_executor.depth(INTERACTIVE) or self.embedding_executor.depth(BULK))
+    
+    def _spend_llm_call(self, tenant_id: int) -> bool:
+        """Count one LLM call against the tenant's daily budget; False once it is used up"""
+        if not self.daily_llm_calls:
+            return True
+        key = f"warm:llm_calls:{tenant_id}:{datetime.now(timezone.utc):%Y%m%d}"
+        pipe = self.cache_service.client.pipeline(transaction=False)
+        pipe.incr(key)
+        pipe.expire(key, 2 * 86400)
+        return pipe.execute()[0] <= self.daily_llm_calls
+    
+    async def _warm(self, tenant_id: int, trigger: str) -> int:
+        db = SessionLocal()
+        try:
+            tenant = await asyncio.to_thread(self.tenant_service.get_tenant, db, tenant_id)
+            if not tenant or not tenant["is_active"]:
+                return 0
+            questions = await asyncio.to_thread(self.top_questions, db, tenant_id)
+        finally:
+            db.close()
+        # Warming must not pull a cold collection back into memory
+        if not questions or self.tiering_service.cold_state(tenant_id):
+            return 0
+        
+        deadline = time.monotonic() + self.max_seconds
+        llm_service = LLMService()
+        answers = {}
+        for question in questions:
+            if time.monotonic() >= deadline or self._busy():
+                logger.info(f"Cache warming for tenant {tenant_id} stopped after {len(answers)} answers")
+                break
+            try:
+                context_chunks = await self.embedding_executor.run(
+                    BULK,
+                    self.vector_service.search,
+                    tenant_id=tenant_id,
+                    query=question,
+                    **tenant["retrieval_profile"]
+                )
+            except ExecutorSaturated:
+                break
+            if not self._spend_llm_call(tenant_id):
+                logger.info(f"Cache warming for tenant {tenant_id} reached its daily LLM call budget")
+                break
+            response = await llm_service.generate_answer(
+                question=question,
+                context_chunks=context_chunks,
+                tenant_name=tenant["name"]
+            )
+            answers[question] = {
+                "answer": response["answer"],
+                "sources": response["sources"],
+                "confidence": response["confidence"]
+            }
+        
+        self.cache_service.cache_answers(tenant_id, answers)
+        CACHE_WARMED_ANSWERS.labels(trigger=trigger).inc(len(answers))
+        logger.info(f"Warmed {len(answers)} answers for tenant {tenant_id} ({trigger})")
+        return len(answers)
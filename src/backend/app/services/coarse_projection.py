@@ -0,0 +1,96 @@
+"""
+Projections from full embeddings to the coarse vectors of two-stage search.
+
+A projection is a linear map x -> (x - mean) @ components.T. Truncation
+(identity rows, zero mean) needs no fitting and is what collections start
+with; a per-tenant PCA fitted on the tenant's own vectors keeps far more of
+the neighbourhood structure at the same dimension. Fitted projections live
+in the vector_projections table so every worker projects queries the same
+way the stored coarse vectors were projected. A projection that is not
+applied yet (its points are still being rewritten) projects new points,
+but queries skip the coarse stage until it is.
+"""
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models import VectorProjection
+
+
+class CoarseProjection:
+    def __init__(
+        self,
+        method: str,
+        components: np.ndarray,
+        mean: np.ndarray,
+        explained_variance: Optional[float] = None,
+        applied: bool = True
+    ):
+        self.method = method
+        # (coarse_dimension, dimension), float32
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.mean = np.ascontiguousarray(mean, dtype=np.float32)
+        self.explained_variance = explained_variance
+        # False while the stored coarse vectors are a mix of this and the previous projection
+        self.applied = applied
+    
+    @property
+    def dimension(self) -> int:
+        return self.components.shape[1]
+    
+    @property
+    def coarse_dimension(self) -> int:
+        return self.components.shape[0]
+    
+    @classmethod
+    def truncate(cls, dimension: int, coarse_dimension: int) -> "CoarseProjection":
+        """The first coarse_dimension components, unchanged"""
+        return cls("truncate", np.eye(coarse_dimension, dimension, dtype=np.float32), np.zeros(dimension, dtype=np.float32))
+    
+    @classmethod
+    def fit_pca(cls, vectors: np.ndarray, coarse_dimension: int) -> "CoarseProjection":
+        """Top principal components of a sample of unit-normalised vectors"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < coarse_dimension:
+            raise ValueError(f"Need at least {coarse_dimension} vectors to fit, got {len(vectors)}")
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        mean = vectors.mean(axis=0)
+        # float64 SVD: the sample is small next to the cost of the search it saves
+        _, singular, vt = np.linalg.svd((vectors - mean).astype(np.float64), full_matrices=False)
+        variance = singular ** 2
+        explained = float(variance[:coarse_dimension].sum() / max(variance.sum(), 1e-12))
+        return cls("pca", vt[:coarse_dimension], mean, explained)
+    
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        """Project rows (or a single vector) into the coarse space"""
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+    
+    @classmethod
+    def load(cls, db: Session, tenant_id: int) -> Optional["CoarseProjection"]:
+        row = db.get(VectorProjection, tenant_id)
+        if row is None:
+            return None
+        components = np.frombuffer(row.components, dtype=np.float32).reshape(row.coarse_dimension, row.dimension)
+        return cls(
+            row.method, components, np.frombuffer(row.mean, dtype=np.float32), row.explained_variance,
+            applied=row.status != "refitting"
+        )
+    
+    def save(self, db: Session, tenant_id: int, sample_size: int):
+        """Insert or replace the tenant's projection, as refitting; the caller commits"""
+        row = db.get(VectorProjection, tenant_id) or VectorProjection(tenant_id=tenant_id)
+        row.method = self.method
+        row.dimension = self.dimension
+        row.coarse_dimension = self.coarse_dimension
+        row.components = self.components.tobytes()
+        row.mean = self.mean.tobytes()
+        row.sample_size = sample_size
+        row.explained_variance = self.explained_variance
+        row.status = "refitting"
+        db.add(row)
+    
+    @staticmethod
+    def mark_applied(db: Session, tenant_id: int):
+        """Every point now has its coarse vector from the stored projection; the caller commits"""
+        db.query(VectorProjection).filter(VectorProjection.tenant_id == tenant_id).update({"status": "applied"})
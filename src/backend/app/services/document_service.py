@@ -1,5 +1,8 @@
+import gzip
 import hashlib
-from typing import List, Dict, Any
+import os
+import shutil
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, TextIO, Tuple
 import logging
 
 from app.config import settings
@@ -16,33 +19,79 @@ class DocumentService:
         """Generate hash for content deduplication"""
         return hashlib.sha256(content.encode()).hexdigest()
     
+    def hash_file(self, path: str) -> str:
+        """hash_content of a UTF-8 text file, without reading it whole"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def iter_file(self, path: str, window: int = 64 * 1024) -> Iterator[str]:
+        """Read a UTF-8 text file in windows, for iter_chunks"""
+        with open(path, encoding="utf-8", newline="") as f:
+            yield from iter(lambda: f.read(window), "")
+    
+    def _body_ref(self, tenant_id: int, document_id: int) -> str:
+        """content_ref for a document's body, creating its directory"""
+        ref = f"{tenant_id}/{document_id}.txt.gz"
+        os.makedirs(os.path.join(settings.DOCUMENT_STORE_PATH, str(tenant_id)), exist_ok=True)
+        return ref
+    
+    def store_body(self, path: str, tenant_id: int, document_id: int) -> str:
+        """Gzip a document body into DOCUMENT_STORE_PATH; returns its content_ref"""
+        ref = self._body_ref(tenant_id, document_id)
+        with open(path, "rb") as src, gzip.open(os.path.join(settings.DOCUMENT_STORE_PATH, ref), "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        return ref
+    
+    def copy_body(self, gzipped: BinaryIO, tenant_id: int, document_id: int) -> str:
+        """Store an already gzipped body (from a tenant bundle) as is; returns its content_ref"""
+        ref = self._body_ref(tenant_id, document_id)
+        with open(os.path.join(settings.DOCUMENT_STORE_PATH, ref), "wb") as dst:
+            shutil.copyfileobj(gzipped, dst, 1024 * 1024)
+        return ref
+    
+    def open_body(self, ref: str) -> TextIO:
+        """Open a stored body for streaming reads"""
+        return gzip.open(os.path.join(settings.DOCUMENT_STORE_PATH, ref), "rt", encoding="utf-8", newline="")
+    
+    def remove_body(self, ref: str):
+        try:
+            os.remove(os.path.join(settings.DOCUMENT_STORE_PATH, ref))
+        except FileNotFoundError:
+            pass
+    
     def chunk_document(self, content: str, document_title: str = "") -> List[Dict[str, Any]]:
         """Split document into overlapping chunks"""
-        chunks = []
-        
-        # Simple sentence-aware chunking
-        sentences = content.replace('\n', ' ').split('. ')
-        
+        chunks = list(self.iter_chunks([content], document_title))
+        logger.info(f"Document chunked into {len(chunks)} chunks")
+        return chunks
+    
+    def iter_chunks(self, pieces: Iterable[str], document_title: str = "") -> Iterator[Dict[str, Any]]:
+        """Chunk text arriving in pieces (pages, file windows), as if they were concatenated"""
         current_chunk = ""
         chunk_index = 0
         
-        for sentence in sentences:
+        # Simple sentence-aware chunking; the text after the last ". " is
+        # carried into the next piece, since the sentence may continue there
+        for sentence, complete in self._iter_sentences(pieces):
             sentence = sentence.strip()
             if not sentence:
                 continue
-                
+            
             # Add period back if it was removed
-            if not sentence.endswith('.'):
+            if complete and not sentence.endswith('.'):
                 sentence += '.'
             
             # Check if adding this sentence exceeds chunk size
             if len(current_chunk) + len(sentence) > self.chunk_size:
                 if current_chunk:
-                    chunks.append({
+                    yield {
                         "content": current_chunk.strip(),
                         "chunk_index": chunk_index,
                         "document_title": document_title
-                    })
+                    }
                     chunk_index += 1
                     
                     # Keep overlap
@@ -56,11 +105,32 @@ class DocumentService:
         
         # Add remaining content
         if current_chunk.strip():
-            chunks.append({
+            yield {
                 "content": current_chunk.strip(),
                 "chunk_index": chunk_index,
                 "document_title": document_title
-            })
-        
-        logger.info(f"Document chunked into {len(chunks)} chunks")
-        return chunks
+            }
+    
+    def _split_long(self, text: str) -> Iterator[str]:
+        """Cut text longer than chunk_size at its last space within the limit (or at the limit)"""
+        while len(text) > self.chunk_size:
+            cut = text.rfind(' ', 1, self.chunk_size + 1)
+            cut = cut if cut > 0 else self.chunk_size
+            yield text[:cut]
+            text = text[cut:]
+        yield text
+    
+    def _iter_sentences(self, pieces: Iterable[str]) -> Iterator[Tuple[str, bool]]:
+        """(text, complete) per sentence; sentences over chunk_size come in incomplete parts"""
+        carry = ""
+        for piece in pieces:
+            sentences = (carry + piece.replace('\n', ' ')).split('. ')
+            carry = sentences.pop()
+            for sentence in sentences:
+                *parts, last = self._split_long(sentence)
+                yield from ((part, False) for part in parts)
+                yield last, True
+            # Text without ". " must not pile up across pieces
+            *parts, carry = self._split_long(carry)
+            yield from ((part, False) for part in parts)
+        yield carry, True
@@ -0,0 +1,69 @@
+import logging
+import os
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def load_encoder():
+    """Load EMBEDDING_MODEL with the configured backend (torch or onnx)"""
+    backend = settings.EMBEDDING_BACKEND
+    if backend == "onnx":
+        return _load_onnx()
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+    
+    from sentence_transformers import SentenceTransformer
+    
+    if settings.EMBEDDING_INTRA_OP_THREADS:
+        import torch
+        torch.set_num_threads(settings.EMBEDDING_INTRA_OP_THREADS)
+    logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL} (torch)")
+    return SentenceTransformer(settings.EMBEDDING_MODEL)
+
+
+def _load_onnx():
+    """Run the same model through ONNX Runtime, optionally int8-quantized"""
+    import onnxruntime as ort
+    from sentence_transformers import SentenceTransformer
+    
+    options = ort.SessionOptions()
+    if settings.EMBEDDING_INTRA_OP_THREADS:
+        options.intra_op_num_threads = settings.EMBEDDING_INTRA_OP_THREADS
+    model_kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+    
+    if not settings.EMBEDDING_ONNX_QUANTIZE:
+        logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL} (onnx)")
+        return SentenceTransformer(settings.EMBEDDING_MODEL, backend="onnx", model_kwargs=model_kwargs)
+    
+    # Quantized weights are exported once and reused from the cache dir
+    config = settings.EMBEDDING_ONNX_QUANTIZATION_CONFIG
+    model_dir = os.path.join(
+        settings.EMBEDDING_ONNX_CACHE_DIR,
+        settings.EMBEDDING_MODEL.replace("/", "__")
+    )
+    file_name = f"onnx/model_qint8_{config}.onnx"
+    if not os.path.exists(os.path.join(model_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        
+        logger.info(f"Exporting int8 ONNX model ({config}) to {model_dir}")
+        model = SentenceTransformer(settings.EMBEDDING_MODEL, backend="onnx", model_kwargs=model_kwargs)
+        model.save(model_dir)
+        export_dynamic_quantized_onnx_model(model, config, model_dir)
+    
+    logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL} (onnx int8 {config})")
+    return SentenceTransformer(
+        model_dir,
+        backend="onnx",
+        model_kwargs={**model_kwargs, "file_name": file_name}
+    )
+
+
+def min_cosine_similarity(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """Worst-case row-wise cosine similarity between two embedding matrices"""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return float(np.min(np.sum(reference * candidate, axis=1)))
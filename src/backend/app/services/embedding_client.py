@@ -0,0 +1,94 @@
+import json
+import logging
+import socket
+import struct
+import threading
+from typing import List, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Wire format shared with app.embedding_server
+#   request:  >I length, then UTF-8 JSON {"texts": [...]}
+#   response: >BII status, rows, dim; status 0 is followed by rows*dim
+#             little-endian float32, status 1 by a UTF-8 error of length rows
+REQUEST_HEADER = struct.Struct(">I")
+RESPONSE_HEADER = struct.Struct(">BII")
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    """Read exactly size bytes or raise if the peer closes"""
+    buf = bytearray()
+    while len(buf) < size:
+        part = sock.recv(size - len(buf))
+        if not part:
+            raise ConnectionError("Embedding server closed the connection")
+        buf.extend(part)
+    return bytes(buf)
+
+
+class RemoteEncoder:
+    """SentenceTransformer-compatible encoder backed by the per-host embedding server"""
+    
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+    
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+    
+    def _socket(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = self._connect()
+            self._local.sock = sock
+        return sock
+    
+    def _reset(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+    
+    def _request(self, texts: List[str]) -> np.ndarray:
+        payload = json.dumps({"texts": texts}).encode()
+        sock = self._socket()
+        sock.sendall(REQUEST_HEADER.pack(len(payload)) + payload)
+        status, rows, dim = RESPONSE_HEADER.unpack(recv_exactly(sock, RESPONSE_HEADER.size))
+        if status == STATUS_ERROR:
+            message = recv_exactly(sock, rows).decode()
+            raise RuntimeError(f"Embedding server error: {message}")
+        data = recv_exactly(sock, rows * dim * 4)
+        return np.frombuffer(data, dtype="<f4").reshape(rows, dim)
+    
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> np.ndarray:
+        """Encode one text (1-D result) or a list of texts (2-D result)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        try:
+            vectors = self._request(texts)
+        except (ConnectionError, OSError) as e:
+            # Server restarts drop the connection; retry once on a fresh socket
+            logger.warning(f"Embedding server connection lost, reconnecting: {e}")
+            self._reset()
+            vectors = self._request(texts)
+        return vectors[0] if single else vectors
+    
+    def ping(self) -> bool:
+        """Check the embedding server answers"""
+        try:
+            self.encode([])
+            return True
+        except Exception:
+            self._reset()
+            return False
@@ -0,0 +1,138 @@
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+
+from app.config import settings
+from app.metrics import EMBEDDING_QUEUE_DEPTH, EMBEDDING_QUEUE_WAIT_SECONDS, EMBEDDING_REJECTIONS
+from app.tracing import span
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# (future, func, args, kwargs, enqueued_at, submitter's context)
+Job = Tuple[Future, Callable, tuple, dict, float, contextvars.Context]
+
+
+class ExecutorSaturated(Exception):
+    """The lane's queue is full"""
+
+
+class EmbeddingExecutor:
+    """
+    Dedicated threads for encoder-bound vector work (query embedding and
+    search, chunk embedding and upsert), off the event loop. Interactive
+    jobs always run before queued bulk jobs, and bulk jobs may hold at most
+    threads - 1 threads, so a query never queues behind an ingest. Each
+    lane's queue is bounded; submitting to a full lane raises
+    ExecutorSaturated instead of letting latency grow.
+    """
+    
+    def __init__(self, threads: Optional[int] = None):
+        self.threads = threads or settings.EMBEDDING_EXECUTOR_THREADS
+        self.max_depth = {
+            INTERACTIVE: settings.EMBEDDING_QUEUE_INTERACTIVE,
+            BULK: settings.EMBEDDING_QUEUE_BULK,
+        }
+        self._queues: Dict[str, Deque[Job]] = {INTERACTIVE: deque(), BULK: deque()}
+        self._bulk_limit = max(self.threads - 1, 1)
+        self._running_bulk = 0
+        self._shutdown = False
+        self._cond = threading.Condition()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"embedding-{i}", daemon=True)
+            for i in range(self.threads)
+        ]
+        for worker in self._workers:
+            worker.start()
+    
+    def depth(self, lane: str) -> int:
+        with self._cond:
+            return len(self._queues[lane])
+    
+    def admit(self, lane: str):
+        """Reject up front, before a request does work it could not finish"""
+        if self.depth(lane) >= self.max_depth[lane]:
+            EMBEDDING_REJECTIONS.labels(lane=lane).inc()
+            raise ExecutorSaturated(lane)
+    
+    def _enqueue(self, lane: str, func: Callable, args: tuple, kwargs: dict) -> Optional[Future]:
+        future = Future()
+        with self._cond:
+            if len(self._queues[lane]) >= self.max_depth[lane]:
+                return None
+            self._queues[lane].append((future, func, args, kwargs, time.perf_counter(), contextvars.copy_context()))
+            EMBEDDING_QUEUE_DEPTH.labels(lane=lane).inc()
+            self._cond.notify_all()
+        return future
+    
+    def submit(self, lane: str, func: Callable, *args, **kwargs) -> Future:
+        future = self._enqueue(lane, func, args, kwargs)
+        if future is None:
+            EMBEDDING_REJECTIONS.labels(lane=lane).inc()
+            raise ExecutorSaturated(lane)
+        return future
+    
+    async def run(self, lane: str, func: Callable, *args, wait: bool = False, **kwargs) -> Any:
+        """
+        Run func on the executor and await its result. With wait=True a full
+        queue is waited out instead of raising; use it for the later batches
+        of a request that already passed admit().
+        """
+        while (future := self._enqueue(lane, func, args, kwargs)) is None:
+            if not wait:
+                EMBEDDING_REJECTIONS.labels(lane=lane).inc()
+                raise ExecutorSaturated(lane)
+            await asyncio.sleep(0.05)
+        return await asyncio.wrap_future(future)
+    
+    def _next_job(self) -> Optional[Tuple[str, Job]]:
+        """Caller holds the condition"""
+        if self._queues[INTERACTIVE]:
+            return INTERACTIVE, self._queues[INTERACTIVE].popleft()
+        if self._queues[BULK] and self._running_bulk < self._bulk_limit:
+            self._running_bulk += 1
+            return BULK, self._queues[BULK].popleft()
+        return None
+    
+    @staticmethod
+    def _run_job(lane: str, waited: float, func: Callable, args: tuple, kwargs: dict) -> Any:
+        """Runs in the submitter's context, so spans join its trace"""
+        with span("EmbeddingExecutor.job", lane=lane, queue_wait_ms=round(waited * 1000, 3)):
+            return func(*args, **kwargs)
+    
+    def _work(self):
+        while True:
+            with self._cond:
+                while (picked := self._next_job()) is None and not self._shutdown:
+                    self._cond.wait()
+                if picked is None:
+                    return
+                lane, (future, func, args, kwargs, enqueued_at, context) = picked
+                EMBEDDING_QUEUE_DEPTH.labels(lane=lane).dec()
+            
+            waited = time.perf_counter() - enqueued_at
+            EMBEDDING_QUEUE_WAIT_SECONDS.labels(lane=lane).observe(waited)
+            # Skips jobs whose caller went away while they were queued
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(context.run(self._run_job, lane, waited, func, args, kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            
+            if lane == BULK:
+                with self._cond:
+                    self._running_bulk -= 1
+                    self._cond.notify_all()
+    
+    def shutdown(self):
+        """Stop the threads once queued jobs have drained"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
@@ -0,0 +1,208 @@
+"""
+Text extraction for uploaded files.
+
+Parsing PDF and DOCX is CPU-bound, so it runs in a process pool sized to
+the cores available to this API worker. Each extraction is bounded by
+EXTRACTION_TIMEOUT inside the worker process (SIGALRM), so a pathological
+file cannot hold a pool slot forever. Pool processes are started by a
+forkserver, not forked from the API worker with its model, threads and
+connections. A pool process that dies (OOM kill, parser crash) fails the
+extractions it was running; the next upload starts a fresh pool.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import signal
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {
+    ".pdf": "pdf",
+    ".docx": "docx",
+    ".html": "html",
+    ".htm": "html",
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".txt": "text",
+}
+CONTENT_TYPES = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "text/html": "html",
+    "text/markdown": "markdown",
+    "text/plain": "text",
+}
+
+
+class ExtractionError(Exception):
+    """The file could not be parsed (or took too long)"""
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Format from the file extension, falling back to the declared content type"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in EXTENSIONS:
+        return EXTENSIONS[extension]
+    return CONTENT_TYPES.get((content_type or "").split(";")[0].strip())
+
+
+# Extractors run inside pool processes and yield text pieces (pages,
+# paragraphs) that DocumentService.iter_chunks consumes in order.
+
+def _extract_pdf(path: str) -> Iterator[str]:
+    from pypdf import PdfReader
+    for page in PdfReader(path).pages:
+        yield (page.extract_text() or "") + "\n"
+
+
+def _extract_docx(path: str) -> Iterator[str]:
+    import docx
+    for paragraph in docx.Document(path).paragraphs:
+        yield paragraph.text + "\n"
+
+
+class _HTMLText(HTMLParser):
+    SKIP = {"script", "style", "head", "noscript"}
+    BLOCKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article"}
+    
+    def __init__(self):
+        super().__init__()
+        self.pieces: List[str] = []
+        self._skipping = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+        elif tag in self.BLOCKS:
+            self.pieces.append("\n")
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+        elif tag in self.BLOCKS:
+            self.pieces.append("\n")
+    
+    def handle_data(self, data):
+        if not self._skipping:
+            self.pieces.append(data)
+
+
+def _read_text(path: str) -> str:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def _extract_html(path: str) -> Iterator[str]:
+    parser = _HTMLText()
+    parser.feed(_read_text(path))
+    parser.close()
+    yield from parser.pieces
+
+
+MARKDOWN_SYNTAX = [
+    (re.compile(r"```.*?\n"), ""),                      # code fence markers
+    (re.compile(r"!?\[([^\]]*)\]\([^)]*\)"), r"\1"),     # links and images keep their text
+    (re.compile(r"^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+", re.MULTILINE), ""),  # headings, quotes, lists
+    (re.compile(r"(\*\*|__|\*|_|`)"), ""),              # emphasis and inline code
+]
+
+
+def _extract_markdown(path: str) -> Iterator[str]:
+    text = _read_text(path)
+    for pattern, replacement in MARKDOWN_SYNTAX:
+        text = pattern.sub(replacement, text)
+    yield text
+
+
+def _extract_text(path: str) -> Iterator[str]:
+    # Windows, so large plain-text files stream through
+    with open(path, encoding="utf-8", errors="replace") as f:
+        yield from iter(lambda: f.read(1024 * 1024), "")
+
+
+EXTRACTORS = {
+    "pdf": _extract_pdf,
+    "docx": _extract_docx,
+    "html": _extract_html,
+    "markdown": _extract_markdown,
+    "text": _extract_text,
+}
+
+
+def _on_timeout(signum, frame):
+    raise ExtractionError("Extraction timed out")
+
+
+def extract_file(path: str, file_format: str, timeout: float, out_path: Optional[str] = None):
+    """
+    Entry point in the pool process. Returns the text pieces, or with
+    out_path writes them there as they are produced and returns the number
+    of characters written, so large documents never travel back whole.
+    """
+    # Pool tasks run on the worker process's main thread, so SIGALRM works
+    signal.signal(signal.SIGALRM, _on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        pieces = EXTRACTORS[file_format](path)
+        if out_path is None:
+            return list(pieces)
+        written = 0
+        with open(out_path, "w", encoding="utf-8", newline="") as out:
+            for piece in pieces:
+                written += out.write(piece)
+        return written
+    except ExtractionError:
+        raise
+    except Exception as e:
+        # Library exceptions may not pickle back to the parent
+        raise ExtractionError(f"Could not parse {file_format} file: {e}")
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class ExtractionService:
+    def __init__(self):
+        self.timeout = settings.EXTRACTION_TIMEOUT
+        self.workers = settings.EXTRACTION_WORKERS or max((os.cpu_count() or 1) // settings.WEB_CONCURRENCY, 1)
+        self._pool: Optional[ProcessPoolExecutor] = None
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Created on first upload so workers that never parse files start nothing
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver")
+            )
+            logger.info(f"Started extraction pool with {self.workers} processes")
+        return self._pool
+    
+    async def extract(self, path: str, file_format: str, out_path: Optional[str] = None):
+        """Extract text from a file without blocking the event loop (see extract_file)"""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        try:
+            future = loop.run_in_executor(pool, extract_file, path, file_format, self.timeout, out_path)
+            # The worker enforces the limit; this is a backstop if it cannot
+            return await asyncio.wait_for(future, self.timeout + 5)
+        except asyncio.TimeoutError:
+            raise ExtractionError("Extraction timed out")
+        except BrokenProcessPool:
+            # A broken pool rejects every later task, so replace it
+            if self._pool is pool:
+                self._pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            logger.error(f"Extraction process died parsing a {file_format} file; pool restarted")
+            raise ExtractionError("Extraction process crashed")
+    
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -3,6 +3,7 @@ import json
 import logging
 
 from app.config import settings
+from app.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +14,7 @@ class LLMService:
     def __init__(self):
         self.stub_mode = settings.LLM_STUB_MODE
         self.model = settings.LLM_MODEL
-        
+    
     def build_system_prompt(self, tenant_name: str) -> str:
         """Build system prompt for knowledge assistant"""
         return f"""You are an internal knowledge assistant for {tenant_name}. Your role is to answer employee questions based ONLY on the provided context documents.
@@ -40,7 +41,7 @@ Respond with:
   "sources": [],
   "confidence": "none"
 }}"""
-        
+
         context_text = "\n\n".join([
             f"[Document: {chunk.get('document_title', 'Unknown')}]\n{chunk['content']}"
             for chunk in context_chunks
@@ -58,6 +59,7 @@ Respond in JSON format:
   "confidence": "high|medium|low|none"
 }}"""
 
+    @traced
     async def generate_answer(
         self,
         question: str,
@@ -0,0 +1,62 @@
+from sqlalchemy.orm import Session
+from typing import Dict, Any, Optional, Tuple
+import logging
+import threading
+import time
+
+from app.config import settings
+from app.models import Tenant
+from app.schemas import RetrievalProfile
+
+logger = logging.getLogger(__name__)
+
+
+class TenantService:
+    """Resolves tenant metadata through an in-process TTL cache"""
+    
+    def __init__(self):
+        self.ttl = settings.TENANT_CACHE_TTL
+        self.negative_ttl = settings.TENANT_CACHE_NEGATIVE_TTL
+        # tenant_id -> (expires_at, tenant dict or None for unknown ids)
+        self._cache: Dict[int, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+    
+    def _to_entry(self, tenant: Tenant) -> Dict[str, Any]:
+        """Copy the fields we need so the cache never holds ORM instances"""
+        return {
+            "id": tenant.id,
+            "name": tenant.name,
+            "slug": tenant.slug,
+            "tier": tenant.tier or "standard",
+            "retrieval_profile": RetrievalProfile(**(tenant.retrieval_profile or {})).model_dump(),
+            "retention_months": tenant.retention_months or 12,
+            "is_active": bool(tenant.is_active)
+        }
+    
+    def _store(self, tenant_id: int, entry: Optional[Dict[str, Any]]):
+        ttl = self.ttl if entry else self.negative_ttl
+        with self._lock:
+            self._cache[tenant_id] = (time.monotonic() + ttl, entry)
+    
+    def get_tenant(self, db: Session, tenant_id: int) -> Optional[Dict[str, Any]]:
+        """Get tenant metadata, hitting the database only on a cache miss"""
+        with self._lock:
+            cached = self._cache.get(tenant_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+        entry = self._to_entry(tenant) if tenant else None
+        self._store(tenant_id, entry)
+        if entry is None:
+            logger.info(f"Tenant {tenant_id} not found, caching negative result")
+        return entry
+    
+    def prime(self, tenant: Tenant):
+        """Cache a tenant that was just written"""
+        self._store(tenant.id, self._to_entry(tenant))
+    
+    def invalidate(self, tenant_id: int):
+        """Drop a tenant from the cache"""
+        with self._lock:
+            self._cache.pop(tenant_id, None)
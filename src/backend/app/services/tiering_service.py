@@ -0,0 +1,215 @@
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+import asyncio
+import logging
+import time
+import uuid
+
+from app.config import settings
+from app.metrics import TIERING_OFFLOADS, TIERING_REHYDRATE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of tenant_id -> time of last /ask, document write (or restore)
+ACTIVITY_KEY = "tiering:last_active"
+# Hash of tenant_id -> backend state needed to restore a cold collection
+COLD_KEY = "tiering:cold"
+# Per-tenant sorted set of in-flight document writes -> start time; entries
+# older than WRITE_MAX_SECONDS are a crashed worker's and no longer count
+WRITES_KEY = "tiering:writes:{tenant_id}"
+WRITE_MAX_SECONDS = 3600
+
+
+class TenantBusy(Exception):
+    """The tenant's collection is being offloaded, restored or migrated past the wait limit"""
+
+
+class TieringService:
+    """Moves idle tenant collections to cold storage and restores them on access"""
+    
+    def __init__(self, redis_client, vector_service):
+        self.redis = redis_client
+        self.vector_service = vector_service
+        self.enabled = settings.TIERING_ENABLED
+        self.mode = settings.TIERING_MODE
+        self.idle_seconds = settings.TIERING_IDLE_SECONDS
+        self.rehydrate_timeout = settings.TIERING_REHYDRATE_TIMEOUT
+    
+    def _acquire(self, tenant_id: int, wait: float, expire: int = 600) -> Optional[str]:
+        """Per-tenant lock shared by offload, restore and maintenance; returns a token, or None on timeout"""
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait
+        while True:
+            # Expiry is long enough for a large snapshot restore to finish
+            if self.redis.set(f"tiering:lock:{tenant_id}", token, nx=True, ex=expire):
+                return token
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+    
+    def _release(self, tenant_id: int, token: str):
+        key = f"tiering:lock:{tenant_id}"
+        if self.redis.get(key) == token:
+            self.redis.delete(key)
+    
+    def record_activity(self, tenant_id: int) -> Optional[str]:
+        """Mark the tenant active; returns its cold state, None when hot"""
+        if not self.enabled:
+            return None
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zadd(ACTIVITY_KEY, {tenant_id: time.time()})
+            pipe.hget(COLD_KEY, tenant_id)
+            return pipe.execute()[1]
+        except Exception as e:
+            logger.error(f"Tiering activity error: {e}")
+            return None
+    
+    @asynccontextmanager
+    async def writing(self, tenant_id: int) -> AsyncIterator[None]:
+        """
+        Scope of a document ingest or delete: the tenant counts as active and
+        sweep skips it until the scope ends. An offload or restore under way
+        is waited out first (TIERING_REHYDRATE_TIMEOUT at most, then
+        TenantBusy), so a cold_state check in the scope sees its result.
+        Maintenance that holds the lock (exclusive) blocks writes the same
+        way, so this runs with tiering disabled too. Without Redis neither
+        can start, so writes go ahead.
+        """
+        key, token = WRITES_KEY.format(tenant_id=tenant_id), uuid.uuid4().hex
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zadd(ACTIVITY_KEY, {tenant_id: time.time()})
+            pipe.zadd(key, {token: time.time()})
+            pipe.expire(key, WRITE_MAX_SECONDS)
+            pipe.execute()
+            lock = await asyncio.to_thread(self._acquire, tenant_id, self.rehydrate_timeout)
+        except Exception as e:
+            logger.error(f"Tiering write tracking error: {e}")
+            lock = ""
+        try:
+            if lock is None:
+                raise TenantBusy(tenant_id)
+            if lock:
+                self._release(tenant_id, lock)
+            yield
+        finally:
+            try:
+                self.redis.zrem(key, token)
+            except Exception as e:
+                logger.error(f"Tiering write tracking error: {e}")
+    
+    def _writes_in_flight(self, tenant_id: int) -> int:
+        return self.redis.zcount(WRITES_KEY.format(tenant_id=tenant_id), time.time() - WRITE_MAX_SECONDS, "+inf")
+    
+    def cold_state(self, tenant_id: int) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            return self.redis.hget(COLD_KEY, tenant_id)
+        except Exception as e:
+            logger.error(f"Tiering state error: {e}")
+            return None
+    
+    def _restore(self, tenant_id: int):
+        """Restore the collection if it is cold; caller holds the lock"""
+        # Another worker may have restored it while we waited
+        state = self.redis.hget(COLD_KEY, tenant_id)
+        if state:
+            start = time.perf_counter()
+            self.vector_service.backend.restore_collection(tenant_id, state)
+            self.redis.hdel(COLD_KEY, tenant_id)
+            elapsed = time.perf_counter() - start
+            TIERING_REHYDRATE_SECONDS.observe(elapsed)
+            logger.info(f"Restored tenant {tenant_id} from {state} in {elapsed:.2f}s")
+        self.redis.zadd(ACTIVITY_KEY, {tenant_id: time.time()})
+    
+    def rehydrate(self, tenant_id: int) -> bool:
+        """Restore a cold collection; False if another restore held the lock too long"""
+        token = self._acquire(tenant_id, self.rehydrate_timeout)
+        if token is None:
+            return False
+        try:
+            self._restore(tenant_id)
+            return True
+        finally:
+            self._release(tenant_id, token)
+    
+    @contextmanager
+    def exclusive(self, tenant_id: int, wait: float = WRITE_MAX_SECONDS) -> Iterator[None]:
+        """
+        Hold the tenant's lock for collection maintenance (app.reindex):
+        writes in flight are waited out, new ones wait and then get
+        TenantBusy, and a cold collection is restored first. Raises
+        TenantBusy if that takes longer than wait seconds.
+        """
+        deadline = time.monotonic() + wait
+        token = self._acquire(tenant_id, wait, expire=WRITE_MAX_SECONDS)
+        if token is None:
+            raise TenantBusy(tenant_id)
+        try:
+            while self._writes_in_flight(tenant_id):
+                if time.monotonic() >= deadline:
+                    raise TenantBusy(tenant_id)
+                time.sleep(0.1)
+            self._restore(tenant_id)
+            yield
+        finally:
+            self._release(tenant_id, token)
+    
+    async def ensure_hot(self, tenant_id: int, state: Optional[str]) -> bool:
+        """Restore a cold collection, waiting at most TIERING_REHYDRATE_TIMEOUT"""
+        if not state:
+            return True
+        try:
+            # Shielded: on timeout the restore carries on and later requests find it done
+            restore = asyncio.ensure_future(asyncio.to_thread(self.rehydrate, tenant_id))
+            return await asyncio.wait_for(asyncio.shield(restore), self.rehydrate_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Restore of tenant {tenant_id} exceeded {self.rehydrate_timeout}s")
+            return False
+    
+    def sweep(self) -> int:
+        """Offload collections idle past TIERING_IDLE_SECONDS; returns how many moved"""
+        # One worker sweeps per interval
+        if not self.redis.set("tiering:sweep", 1, nx=True, ex=max(settings.TIERING_SWEEP_INTERVAL - 1, 1)):
+            return 0
+        
+        backend = self.vector_service.backend
+        now = time.time()
+        tenant_ids = backend.list_tenants()
+        if tenant_ids:
+            # Start the idle clock for collections never asked about
+            self.redis.zadd(ACTIVITY_KEY, {tenant_id: now for tenant_id in tenant_ids}, nx=True)
+        
+        cutoff = now - self.idle_seconds
+        cold = set(self.redis.hkeys(COLD_KEY))
+        idle = [int(t) for t in self.redis.zrangebyscore(ACTIVITY_KEY, "-inf", cutoff) if t not in cold]
+        existing = set(tenant_ids)
+        
+        moved = 0
+        for tenant_id in idle:
+            if tenant_id not in existing:
+                self.redis.zrem(ACTIVITY_KEY, tenant_id)
+                continue
+            token = self._acquire(tenant_id, wait=0)
+            if token is None:
+                continue
+            try:
+                # Skip tenants that became active since the scan, or that are
+                # still writing documents (ingests can outlast the idle time)
+                score = self.redis.zscore(ACTIVITY_KEY, tenant_id)
+                if score is not None and score > cutoff or self._writes_in_flight(tenant_id):
+                    continue
+                state = backend.offload_collection(tenant_id, self.mode)
+                if state is None:
+                    continue
+                self.redis.hset(COLD_KEY, tenant_id, state)
+                TIERING_OFFLOADS.labels(mode=self.mode).inc()
+                moved += 1
+                logger.info(f"Offloaded idle tenant {tenant_id} ({state})")
+            except Exception as e:
+                logger.error(f"Failed to offload tenant {tenant_id}: {e}")
+            finally:
+                self._release(tenant_id, token)
+        return moved
@@ -0,0 +1,130 @@
+"""
+Hourly per-tenant usage rollups.
+
+Every answered /ask adds itself to one tenant_usage_hourly row, keyed by
+tenant, UTC hour and latency bucket, in the same transaction as its
+ai_results row. Reports are built from these rows alone, so usage queries
+never scan the partitioned audit tables.
+"""
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import TenantUsageHourly
+
+# Upper bounds (ms) of the latency histogram; index len() is the overflow bucket
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+PERCENTILES = (50, 95, 99)
+
+COUNTERS = (
+    "request_count", "cached_count", "prompt_tokens",
+    "completion_tokens", "total_tokens", "latency_ms_sum"
+)
+
+
+def to_utc(moment: datetime) -> datetime:
+    """Naive UTC, as stored; naive input is taken to be UTC already"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _hour(moment: datetime) -> datetime:
+    return to_utc(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def _percentile(histogram: List[int], total: int, p: int) -> Optional[int]:
+    """Upper bound of the bucket holding the p-th percentile (None if overflow)"""
+    rank = total * p / 100
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if count and seen >= rank:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+    return None
+
+
+class UsageService:
+    def record(
+        self,
+        db: Session,
+        tenant_id: int,
+        latency_ms: int,
+        was_cached: bool,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        total_tokens: Optional[int] = None
+    ):
+        """Add one request to its hourly rollup; committed with the caller's transaction"""
+        values = {
+            "tenant_id": tenant_id,
+            "hour": _hour(datetime.now(timezone.utc)),
+            "latency_bucket": bisect_left(LATENCY_BUCKETS_MS, latency_ms),
+            "request_count": 1,
+            "cached_count": int(was_cached),
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+            "total_tokens": total_tokens or 0,
+            "latency_ms_sum": latency_ms,
+        }
+        # Atomic increment, so concurrent workers never lose updates
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(TenantUsageHourly).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=["tenant_id", "hour", "latency_bucket"],
+            set_={name: getattr(TenantUsageHourly, name) + statement.excluded[name] for name in COUNTERS}
+        )
+        db.execute(statement)
+    
+    def report(self, db: Session, tenant_id: int, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Per-hour usage and totals for [start, end), with estimated latency percentiles"""
+        start, end = _hour(start), to_utc(end)
+        rows = db.query(TenantUsageHourly).filter(
+            TenantUsageHourly.tenant_id == tenant_id,
+            TenantUsageHourly.hour >= start,
+            TenantUsageHourly.hour < end
+        ).order_by(TenantUsageHourly.hour).all()
+        
+        hours: Dict[datetime, Dict[str, Any]] = {}
+        totals = self._empty()
+        for row in rows:
+            bucket = hours.setdefault(row.hour, self._empty())
+            for summary in (bucket, totals):
+                for name in COUNTERS:
+                    summary[name] += getattr(row, name)
+                summary["latency_histogram"][row.latency_bucket] += row.request_count
+        
+        return {
+            "tenant_id": tenant_id,
+            "start": start,
+            "end": end,
+            "totals": self._summarise(totals),
+            "hours": [{"hour": hour, **self._summarise(summary)} for hour, summary in hours.items()]
+        }
+    
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        summary: Dict[str, Any] = {name: 0 for name in COUNTERS}
+        summary["latency_histogram"] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        return summary
+    
+    @staticmethod
+    def _summarise(summary: Dict[str, Any]) -> Dict[str, Any]:
+        count = summary["request_count"]
+        histogram = summary.pop("latency_histogram")
+        latency_ms_sum = summary.pop("latency_ms_sum")
+        return {
+            **summary,
+            "cache_hit_ratio": round(summary["cached_count"] / count, 4) if count else 0.0,
+            "avg_latency_ms": round(latency_ms_sum / count, 1) if count else None,
+            "latency_percentiles_ms": {
+                f"p{p}": _percentile(histogram, count, p) if count else None for p in PERCENTILES
+            },
+            "latency_histogram": [
+                {"le_ms": LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None, "count": n}
+                for i, n in enumerate(histogram)
+            ]
+        }
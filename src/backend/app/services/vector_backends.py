@@ -0,0 +1,842 @@
+"""
+Vector storage backends behind VectorService.
+
+QdrantBackend keeps one Qdrant collection per tenant. LocalBackend is an
+embedded alternative for small deployments: per tenant it keeps an
+append-only float32 matrix (memory-mapped), a JSONL payload log and a
+tombstone log on local disk, and searches by brute-force cosine similarity.
+At a few thousand chunks per tenant that is sub-millisecond and avoids the
+network hop to Qdrant.
+
+Qdrant collections created with a coarse dimension hold two named vectors
+per point: "full" (the embedding) and "coarse" (a low-dimension projection,
+see coarse_projection). search_two_stage walks the coarse index for a wider
+candidate set and rescores it exactly with the full vectors.
+
+Re-indexing (app.reindex) builds a new collection per tenant next to the
+live one and then points the tenant's name at it with a Qdrant alias, so
+after the first re-index tenant_{id} is an alias. Collections created
+before that are migrated to tenant_{id}_v0 behind an alias first. Point
+operations go through the alias; collection-level ones (tiering) resolve
+it first.
+"""
+from qdrant_client import QdrantClient
+from qdrant_client.http.exceptions import UnexpectedResponse
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue,
+    SearchParams, QuantizationSearchParams, VectorParamsDiff, HnswConfigDiff,
+    CollectionParamsDiff, NamedVector, PointVectors, PointIdsList, MatchAny,
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
+)
+from typing import List, Dict, Any, Optional, Tuple
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+import grpc
+import numpy as np
+
+from app.config import settings
+from app.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# (score, payload) pairs, best first
+SearchHits = List[Tuple[float, Dict[str, Any]]]
+
+# Named vectors of two-stage collections
+FULL_VECTOR = "full"
+COARSE_VECTOR = "coarse"
+
+# Points per page when copying a collection (migrate_to_alias)
+MIGRATE_BATCH = 256
+
+
+def collection_name(tenant_id: int) -> str:
+    return f"tenant_{tenant_id}"
+
+
+def shadow_collection_name(tenant_id: int, job: str) -> str:
+    """Collection a re-index job builds for a tenant"""
+    return f"{collection_name(tenant_id)}_{job}"
+
+
+def _not_found(error: Exception) -> bool:
+    """Whether a Qdrant client error means the collection does not exist (REST, gRPC or local mode)"""
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code == 404
+    if isinstance(error, grpc.RpcError):
+        return error.code() == grpc.StatusCode.NOT_FOUND
+    return isinstance(error, ValueError) and "not found" in str(error)
+
+
+def _tenant_id(name: str) -> Optional[int]:
+    suffix = name[len("tenant_"):]
+    return int(suffix) if name.startswith("tenant_") and suffix.isdigit() else None
+
+
+class VectorBackend:
+    """Per-tenant vector storage and nearest-neighbour search"""
+    
+    def connect(self):
+        """Open the store"""
+        raise NotImplementedError
+    
+    def collection_exists(self, tenant_id: int) -> bool:
+        raise NotImplementedError
+    
+    def ensure_collection(self, tenant_id: int, dimension: int, coarse_dimension: Optional[int] = None):
+        """Create the collection if missing, with coarse vectors if coarse_dimension is given"""
+        raise NotImplementedError
+    
+    def coarse_dimension(self, tenant_id: int) -> Optional[int]:
+        """Size of the collection's coarse vectors, or None if it has none"""
+        return None
+    
+    def upsert(
+        self,
+        tenant_id: int,
+        ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        coarse_vectors: Optional[List[List[float]]] = None,
+        wait: bool = True
+    ):
+        """
+        coarse_vectors is required for collections with coarse vectors. With
+        wait=False the write may not be searchable yet on return; follow it
+        with wait_for_writes.
+        """
+        raise NotImplementedError
+    
+    def wait_for_writes(self, tenant_id: int):
+        """Return once every write acknowledged so far is applied"""
+    
+    def search(
+        self,
+        tenant_id: int,
+        vector: List[float],
+        top_k: int,
+        score_threshold: float,
+        hnsw_ef: Optional[int] = None,
+        exact: bool = False,
+        quantization_rescore: Optional[bool] = None
+    ) -> SearchHits:
+        """Cosine search; index tuning parameters are ignored by backends without an index"""
+        raise NotImplementedError
+    
+    def search_two_stage(
+        self,
+        tenant_id: int,
+        vector: List[float],
+        coarse_vector: List[float],
+        top_k: int,
+        score_threshold: float,
+        candidates: int,
+        hnsw_ef: Optional[int] = None,
+        quantization_rescore: Optional[bool] = None
+    ) -> SearchHits:
+        """Best candidates by coarse vector, rescored and cut by full-vector cosine"""
+        raise NotImplementedError
+    
+    def fetch_vectors(self, tenant_id: int, ids: List[str]) -> Dict[str, List[float]]:
+        """Full vectors of those ids that are stored, by id"""
+        raise NotImplementedError
+    
+    def delete_document(self, tenant_id: int, document_id: int):
+        raise NotImplementedError
+    
+    def list_tenants(self) -> List[int]:
+        """Tenant ids that have a collection"""
+        raise NotImplementedError
+    
+    def drop_collection(self, tenant_id: int):
+        raise NotImplementedError
+    
+    def offload_collection(self, tenant_id: int, mode: str) -> Optional[str]:
+        """Move an idle collection out of RAM; returns what restore needs, or None if unsupported"""
+        return None
+    
+    def restore_collection(self, tenant_id: int, state: str):
+        """Undo offload_collection"""
+    
+    def health_check(self) -> bool:
+        raise NotImplementedError
+
+
+class QdrantBackend(VectorBackend):
+    def __init__(self, client: Optional[QdrantClient] = None):
+        self.client = client
+        # tenant_id -> coarse vector size (None: single unnamed vector)
+        self._coarse_dimensions: Dict[int, Optional[int]] = {}
+    
+    def connect(self):
+        """Create the Qdrant client (REST or gRPC, TLS per URL scheme)"""
+        self.client = QdrantClient(
+            url=settings.QDRANT_URL,
+            api_key=settings.QDRANT_API_KEY,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            timeout=settings.QDRANT_TIMEOUT
+        )
+        transport = f"gRPC port {settings.QDRANT_GRPC_PORT}" if settings.QDRANT_PREFER_GRPC else "REST"
+        logger.info(f"Connected to Qdrant at {settings.QDRANT_URL} ({transport})")
+    
+    @traced
+    def collection_exists(self, tenant_id: int) -> bool:
+        """One get_collection call (it resolves the alias), none once the layout is cached"""
+        if tenant_id in self._coarse_dimensions:
+            return True
+        try:
+            self.coarse_dimension(tenant_id)
+        except Exception as e:
+            if _not_found(e):
+                return False
+            raise
+        return True
+    
+    def _physical_name(self, tenant_id: int) -> str:
+        """The collection behind tenant_{id}: itself, or the target of its alias"""
+        name = collection_name(tenant_id)
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == name:
+                return alias.collection_name
+        return name
+    
+    def _create(self, name: str, dimension: int, coarse_dimension: Optional[int]):
+        if coarse_dimension:
+            vectors_config = {
+                FULL_VECTOR: VectorParams(size=dimension, distance=Distance.COSINE),
+                COARSE_VECTOR: VectorParams(size=coarse_dimension, distance=Distance.COSINE)
+            }
+        else:
+            vectors_config = VectorParams(size=dimension, distance=Distance.COSINE)
+        self.client.create_collection(collection_name=name, vectors_config=vectors_config)
+        logger.info(f"Created collection: {name}")
+    
+    def ensure_collection(self, tenant_id: int, dimension: int, coarse_dimension: Optional[int] = None):
+        if not self.collection_exists(tenant_id):
+            self._create(collection_name(tenant_id), dimension, coarse_dimension)
+            self._coarse_dimensions[tenant_id] = coarse_dimension or None
+    
+    def coarse_dimension(self, tenant_id: int) -> Optional[int]:
+        if tenant_id not in self._coarse_dimensions:
+            vectors = self.client.get_collection(collection_name(tenant_id)).config.params.vectors
+            coarse = vectors.get(COARSE_VECTOR) if isinstance(vectors, dict) else None
+            self._coarse_dimensions[tenant_id] = coarse.size if coarse else None
+        return self._coarse_dimensions[tenant_id]
+    
+    def _layout_changed(self, tenant_id: int) -> bool:
+        """Re-read the layout after a failed call; True if it differs (the alias was switched)"""
+        cached = self._coarse_dimensions.pop(tenant_id, None)
+        try:
+            return self.coarse_dimension(tenant_id) != cached
+        except Exception:
+            return False
+    
+    @staticmethod
+    def _points(ids, vectors, payloads, coarse_vectors) -> List[PointStruct]:
+        if coarse_vectors is not None:
+            vectors = [
+                {FULL_VECTOR: vector, COARSE_VECTOR: coarse}
+                for vector, coarse in zip(vectors, coarse_vectors)
+            ]
+        return [
+            PointStruct(id=point_id, vector=vector, payload=payload)
+            for point_id, vector, payload in zip(ids, vectors, payloads)
+        ]
+    
+    @traced
+    def upsert(self, tenant_id, ids, vectors, payloads, coarse_vectors=None, wait=True):
+        coarse = self.coarse_dimension(tenant_id)
+        if coarse and coarse_vectors is None:
+            raise ValueError(f"{collection_name(tenant_id)} needs coarse vectors")
+        points = self._points(ids, vectors, payloads, coarse_vectors if coarse else None)
+        try:
+            self.client.upsert(collection_name=collection_name(tenant_id), points=points, wait=wait)
+        except Exception:
+            if not self._layout_changed(tenant_id):
+                raise
+            raise ValueError(f"{collection_name(tenant_id)} was re-indexed with another layout; retry")
+    
+    @traced
+    def wait_for_writes(self, tenant_id: int):
+        # A collection applies its updates in order, so an acknowledged
+        # no-op that waits is applied after everything queued before it
+        self.client.delete(
+            collection_name=collection_name(tenant_id),
+            points_selector=PointIdsList(points=[]),
+            wait=True
+        )
+    
+    @traced
+    def scroll_vectors(
+        self,
+        tenant_id: int,
+        limit: int,
+        offset: Optional[Any] = None
+    ) -> Tuple[List[Any], List[List[float]], Optional[Any]]:
+        """One page of (ids, full vectors); pass the returned offset back for the next, None when done"""
+        name = FULL_VECTOR if self.coarse_dimension(tenant_id) else ""
+        points, next_offset = self.client.scroll(
+            collection_name=collection_name(tenant_id),
+            limit=limit,
+            offset=offset,
+            with_payload=False,
+            with_vectors=[name] if name else True
+        )
+        vectors = [point.vector[name] if name else point.vector for point in points]
+        return [point.id for point in points], vectors, next_offset
+    
+    @traced
+    def fetch_vectors(self, tenant_id: int, ids: List[str]) -> Dict[str, List[float]]:
+        name = FULL_VECTOR if self.coarse_dimension(tenant_id) else ""
+        points = self.client.retrieve(
+            collection_name=collection_name(tenant_id),
+            ids=ids,
+            with_payload=False,
+            with_vectors=[name] if name else True
+        )
+        return {str(point.id): point.vector[name] if name else point.vector for point in points}
+    
+    @traced
+    def set_coarse_vectors(self, tenant_id: int, ids: List[Any], coarse_vectors: List[List[float]]):
+        """Replace the coarse vectors of existing points, leaving full vectors and payloads alone"""
+        self.client.update_vectors(
+            collection_name=collection_name(tenant_id),
+            points=[
+                PointVectors(id=point_id, vector={COARSE_VECTOR: coarse})
+                for point_id, coarse in zip(ids, coarse_vectors)
+            ]
+        )
+    
+    @staticmethod
+    def _tenant_filter(tenant_id: int) -> Filter:
+        return Filter(
+            must=[
+                FieldCondition(
+                    key="tenant_id",
+                    match=MatchValue(value=tenant_id)
+                )
+            ]
+        )
+    
+    def _search_params(
+        self,
+        hnsw_ef: Optional[int],
+        exact: bool,
+        quantization_rescore: Optional[bool]
+    ) -> Optional[SearchParams]:
+        """Qdrant search params, or None to use the collection defaults"""
+        if not hnsw_ef and not exact and quantization_rescore is None:
+            return None
+        quantization = None
+        if quantization_rescore is not None:
+            quantization = QuantizationSearchParams(rescore=quantization_rescore)
+        return SearchParams(hnsw_ef=hnsw_ef, exact=exact, quantization=quantization)
+    
+    @traced
+    def search(self, tenant_id, vector, top_k, score_threshold,
+               hnsw_ef=None, exact=False, quantization_rescore=None):
+        query_vector = vector
+        if self.coarse_dimension(tenant_id):
+            query_vector = NamedVector(name=FULL_VECTOR, vector=vector)
+        # Tenant filter is defense in depth - the collection is already tenant-scoped
+        try:
+            results = self.client.search(
+                collection_name=collection_name(tenant_id),
+                query_vector=query_vector,
+                query_filter=self._tenant_filter(tenant_id),
+                limit=top_k,
+                score_threshold=score_threshold,
+                search_params=self._search_params(hnsw_ef, exact, quantization_rescore)
+            )
+        except Exception:
+            if not self._layout_changed(tenant_id):
+                raise
+            return self.search(tenant_id, vector, top_k, score_threshold, hnsw_ef, exact, quantization_rescore)
+        return [(hit.score, hit.payload) for hit in results]
+    
+    @traced
+    def search_two_stage(self, tenant_id, vector, coarse_vector, top_k, score_threshold,
+                         candidates, hnsw_ef=None, quantization_rescore=None):
+        if not self.coarse_dimension(tenant_id):
+            # Re-indexed without coarse vectors since the caller looked
+            return self.search(tenant_id, vector, top_k, score_threshold, hnsw_ef,
+                               quantization_rescore=quantization_rescore)
+        # No score threshold on the coarse stage: coarse scores are not
+        # comparable to full-vector ones
+        try:
+            hits = self.client.search(
+                collection_name=collection_name(tenant_id),
+                query_vector=NamedVector(name=COARSE_VECTOR, vector=list(coarse_vector)),
+                query_filter=self._tenant_filter(tenant_id),
+                limit=max(candidates, top_k),
+                with_vectors=[FULL_VECTOR],
+                search_params=self._search_params(hnsw_ef, False, quantization_rescore)
+            )
+        except Exception:
+            if not self._layout_changed(tenant_id):
+                raise
+            return self.search(tenant_id, vector, top_k, score_threshold, hnsw_ef,
+                               quantization_rescore=quantization_rescore)
+        if not hits:
+            return []
+        full = np.asarray([hit.vector[FULL_VECTOR] for hit in hits], dtype=np.float32)
+        full /= np.maximum(np.linalg.norm(full, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        scores = full @ query
+        order = np.argsort(-scores)[:top_k]
+        return [(float(scores[i]), hits[i].payload) for i in order if scores[i] >= score_threshold]
+    
+    @traced
+    def delete_document(self, tenant_id: int, document_id: int):
+        self.client.delete(
+            collection_name=collection_name(tenant_id),
+            points_selector=Filter(
+                must=[
+                    FieldCondition(
+                        key="document_id",
+                        match=MatchValue(value=document_id)
+                    )
+                ]
+            )
+        )
+    
+    def list_tenants(self) -> List[int]:
+        names = [c.name for c in self.client.get_collections().collections]
+        names += [a.alias_name for a in self.client.get_aliases().aliases]
+        return sorted({tenant_id for tenant_id in map(_tenant_id, names) if tenant_id is not None})
+    
+    def create_shadow(self, tenant_id: int, job: str, dimension: int, coarse_dimension: Optional[int] = None) -> str:
+        """Create (or reuse, when resuming) a re-index job's collection for a tenant"""
+        name = shadow_collection_name(tenant_id, job)
+        if not any(c.name == name for c in self.client.get_collections().collections):
+            self._create(name, dimension, coarse_dimension)
+        return name
+    
+    def upsert_shadow(self, name: str, ids, vectors, payloads, coarse_vectors=None):
+        self.client.upsert(collection_name=name, points=self._points(ids, vectors, payloads, coarse_vectors), wait=True)
+    
+    def existing_ids(self, name: str, ids: List[str]) -> set:
+        """Which of ids are stored in a collection"""
+        points = self.client.retrieve(collection_name=name, ids=ids, with_payload=False, with_vectors=False)
+        return {str(point.id) for point in points}
+    
+    def prune_shadow(self, name: str, tenant_id: int, document_ids: List[int]):
+        """Drop points of documents deleted since they were copied"""
+        conditions = [FieldCondition(key="tenant_id", match=MatchValue(value=tenant_id))]
+        must_not = [FieldCondition(key="document_id", match=MatchAny(any=document_ids))] if document_ids else None
+        self.client.delete(
+            collection_name=name,
+            points_selector=Filter(must=conditions, must_not=must_not),
+            wait=True
+        )
+    
+    def aliased_collection(self, tenant_id: int) -> Optional[str]:
+        """The collection tenant_{id} points at; None if it has no alias (yet)"""
+        alias = collection_name(tenant_id)
+        name = self._physical_name(tenant_id)
+        return name if name != alias else None
+    
+    def is_plain_collection(self, tenant_id: int) -> bool:
+        """True if tenant_{id} is a collection created before aliases, not an alias"""
+        return any(c.name == collection_name(tenant_id) for c in self.client.get_collections().collections)
+    
+    def migrate_to_alias(self, tenant_id: int) -> Optional[str]:
+        """
+        Copy a collection created before aliases into tenant_{id}_v0 and
+        make tenant_{id} an alias of it, so that later switches are atomic;
+        returns the new collection, or None if there was nothing to migrate.
+        Qdrant cannot turn a collection's name into an alias, so the plain
+        collection is deleted and the alias created right after the copy;
+        only queries in between find nothing. Writes must be blocked
+        meanwhile (TieringService.exclusive). Rerunning resumes the copy.
+        """
+        alias = collection_name(tenant_id)
+        if not self.is_plain_collection(tenant_id):
+            return None
+        name = shadow_collection_name(tenant_id, "v0")
+        params = self.client.get_collection(alias).config.params
+        if not any(c.name == name for c in self.client.get_collections().collections):
+            self.client.create_collection(
+                collection_name=name,
+                vectors_config=params.vectors,
+                on_disk_payload=params.on_disk_payload
+            )
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=alias,
+                limit=MIGRATE_BATCH,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                self.client.upsert(
+                    collection_name=name,
+                    points=[PointStruct(id=point.id, vector=point.vector, payload=point.payload) for point in points],
+                    wait=True
+                )
+            if offset is None:
+                break
+        self.client.delete_collection(alias)
+        self.client.update_collection_aliases(change_aliases_operations=[
+            CreateAliasOperation(create_alias=CreateAlias(collection_name=name, alias_name=alias))
+        ])
+        self._coarse_dimensions.pop(tenant_id, None)
+        logger.info(f"Migrated {alias} to an alias of {name}")
+        return name
+    
+    def switch_alias(self, tenant_id: int, name: str) -> Optional[str]:
+        """
+        Point tenant_{id} at name in one atomic update; returns the
+        collection it replaced, for the caller to drop, or None if it
+        already pointed there. Collections created before aliases have to
+        go through migrate_to_alias first.
+        """
+        alias = collection_name(tenant_id)
+        if self.is_plain_collection(tenant_id):
+            raise ValueError(f"{alias} is a collection, not an alias; migrate it first (app.reindex --migrate-aliases)")
+        previous = self._physical_name(tenant_id) if self.collection_exists(tenant_id) else None
+        if previous == name:
+            return None
+        operations = [CreateAliasOperation(create_alias=CreateAlias(collection_name=name, alias_name=alias))]
+        if previous:
+            operations.insert(0, DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        self._coarse_dimensions.pop(tenant_id, None)
+        logger.info(f"Switched {alias} to {name}")
+        return previous
+    
+    def drop_named(self, name: str):
+        self.client.delete_collection(name)
+    
+    def drop_collection(self, tenant_id: int):
+        """Drop the tenant's collection (and its alias, if it is one)"""
+        name = self._physical_name(tenant_id)
+        if name != collection_name(tenant_id):
+            self.client.update_collection_aliases(change_aliases_operations=[
+                DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=collection_name(tenant_id)))
+            ])
+        self.client.delete_collection(name)
+        self._coarse_dimensions.pop(tenant_id, None)
+    
+    def _set_on_disk(self, tenant_id: int, on_disk: bool):
+        self.client.update_collection(
+            collection_name=self._physical_name(tenant_id),
+            vectors_config={
+                name: VectorParamsDiff(on_disk=on_disk)
+                for name in ((FULL_VECTOR, COARSE_VECTOR) if self.coarse_dimension(tenant_id) else ("",))
+            },
+            hnsw_config=HnswConfigDiff(on_disk=on_disk),
+            collection_params=CollectionParamsDiff(on_disk_payload=on_disk)
+        )
+    
+    def offload_collection(self, tenant_id: int, mode: str) -> Optional[str]:
+        """
+        "on_disk" keeps the collection searchable with vectors, HNSW graph
+        and payloads memory-mapped; "snapshot" archives it to a Qdrant
+        snapshot and drops the collection entirely.
+        """
+        name = self._physical_name(tenant_id)
+        if mode == "snapshot":
+            snapshot = self.client.create_snapshot(collection_name=name, wait=True)
+            # Deleting the collection deletes its alias too; restore recreates it
+            self.client.delete_collection(name)
+            if name != collection_name(tenant_id):
+                return f"snapshot:{name}/{snapshot.name}"
+            return f"snapshot:{snapshot.name}"
+        self._set_on_disk(tenant_id, True)
+        return "on_disk"
+    
+    def restore_collection(self, tenant_id: int, state: str):
+        alias = collection_name(tenant_id)
+        if state.startswith("snapshot:"):
+            name, _, snapshot_name = state[len("snapshot:"):].rpartition("/")
+            name = name or alias
+            self.client.recover_snapshot(
+                collection_name=name,
+                location=f"{settings.QDRANT_SNAPSHOT_LOCATION}/{name}/{snapshot_name}",
+                wait=True
+            )
+            self.client.delete_snapshot(collection_name=name, snapshot_name=snapshot_name)
+            if name != alias:
+                self.client.update_collection_aliases(change_aliases_operations=[
+                    CreateAliasOperation(create_alias=CreateAlias(collection_name=name, alias_name=alias))
+                ])
+        else:
+            self._set_on_disk(tenant_id, False)
+    
+    def health_check(self) -> bool:
+        try:
+            self.client.get_collections()
+            return True
+        except Exception:
+            return False
+
+
+class LocalCollection:
+    """
+    One tenant's on-disk index.
+    
+    vectors.f32 holds unit-normalised rows back to back, payloads.jsonl one
+    payload per row in the same order, and tombstones.i64 the row numbers of
+    deleted points. All three are append-only between compactions. Writers
+    hold an exclusive flock on the collection; readers re-map the files
+    under a shared lock whenever their size or inode changes, so several
+    worker processes can share a directory.
+    """
+    
+    # Rewrite the files once more than this share of rows is deleted
+    COMPACT_RATIO = 0.5
+    COMPACT_MIN_ROWS = 1000
+    
+    def __init__(self, path: str, dimension: int):
+        self.path = path
+        self.dimension = dimension
+        self.row_bytes = dimension * 4
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.payloads: List[Dict[str, Any]] = []
+        self.deleted = np.zeros(0, dtype=bool)
+        self._payload_offset = 0
+        self._state = None
+        self._lock = threading.Lock()
+    
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+    
+    @contextmanager
+    def _flock(self, operation: int):
+        with open(self._file(".lock"), "a") as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _file_state(self) -> Tuple[int, int, int]:
+        try:
+            stat = os.stat(self._file("vectors.f32"))
+            vectors = (stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            vectors = (0, 0)
+        try:
+            tombstones = os.path.getsize(self._file("tombstones.i64"))
+        except FileNotFoundError:
+            tombstones = 0
+        return (*vectors, tombstones)
+    
+    def _load(self, state: Tuple[int, int, int]):
+        """Map the current files; caller holds the flock"""
+        inode, size, _ = state
+        if self._state is None or inode != self._state[0]:
+            # New or compacted files: read payloads from the start
+            self.payloads = []
+            self._payload_offset = 0
+        
+        if os.path.exists(self._file("payloads.jsonl")):
+            with open(self._file("payloads.jsonl"), "rb") as f:
+                f.seek(self._payload_offset)
+                data = f.read()
+            # Ignore a trailing partial line from an interrupted write
+            complete = data[:data.rfind(b"\n") + 1]
+            self.payloads.extend(json.loads(line) for line in complete.splitlines())
+            self._payload_offset += len(complete)
+        
+        rows = min(size // self.row_bytes, len(self.payloads))
+        if rows:
+            self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r",
+                                     shape=(rows, self.dimension))
+        else:
+            self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+        
+        deleted = np.zeros(rows, dtype=bool)
+        if os.path.exists(self._file("tombstones.i64")):
+            tombstones = np.fromfile(self._file("tombstones.i64"), dtype=np.int64)
+            deleted[tombstones[tombstones < rows]] = True
+        self.deleted = deleted
+        self._state = state
+    
+    def refresh(self):
+        """Pick up writes made by this or another process"""
+        if self._file_state() == self._state:
+            return
+        with self._lock, self._flock(fcntl.LOCK_SH):
+            self._load(self._file_state())
+    
+    def append(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.where(norms == 0, 1, norms)).astype(np.float32)
+        lines = b"".join(
+            json.dumps(dict(payload, _id=point_id)).encode() + b"\n"
+            for point_id, payload in zip(ids, payloads)
+        )
+        
+        with self._lock, self._flock(fcntl.LOCK_EX):
+            self._load(self._file_state())
+            rows = len(self.vectors)
+            # Drop the tail of any interrupted write before appending
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.truncate(rows * self.row_bytes)
+                f.write(vectors.tobytes())
+            with open(self._file("payloads.jsonl"), "ab") as f:
+                f.truncate(self._payload_offset)
+                f.write(lines)
+            self._load(self._file_state())
+    
+    def delete(self, document_id: int) -> int:
+        """Tombstone a document's rows; returns how many were deleted"""
+        with self._lock, self._flock(fcntl.LOCK_EX):
+            self._load(self._file_state())
+            rows = [
+                i for i, payload in enumerate(self.payloads[:len(self.vectors)])
+                if payload["document_id"] == document_id and not self.deleted[i]
+            ]
+            if rows:
+                with open(self._file("tombstones.i64"), "ab") as f:
+                    f.write(np.array(rows, dtype=np.int64).tobytes())
+                self._load(self._file_state())
+            
+            dead = int(self.deleted.sum())
+            if dead >= self.COMPACT_MIN_ROWS and dead > len(self.deleted) * self.COMPACT_RATIO:
+                self._compact()
+        return len(rows)
+    
+    def _compact(self):
+        """Rewrite the files without deleted rows; caller holds the exclusive flock"""
+        live = ~self.deleted
+        vectors = np.ascontiguousarray(self.vectors[live])
+        payloads = [p for p, keep in zip(self.payloads, live) if keep]
+        
+        # Payloads first: readers key off the vectors file's inode
+        with open(self._file("payloads.jsonl.tmp"), "wb") as f:
+            f.write(b"".join(json.dumps(p).encode() + b"\n" for p in payloads))
+        with open(self._file("vectors.f32.tmp"), "wb") as f:
+            f.write(vectors.tobytes())
+        os.replace(self._file("payloads.jsonl.tmp"), self._file("payloads.jsonl"))
+        if os.path.exists(self._file("tombstones.i64")):
+            os.remove(self._file("tombstones.i64"))
+        os.replace(self._file("vectors.f32.tmp"), self._file("vectors.f32"))
+        
+        self._state = None
+        self._load(self._file_state())
+        logger.info(f"Compacted {self.path}: {len(payloads)} live rows")
+    
+    def fetch(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored (normalised) rows of live points among ids"""
+        self.refresh()
+        vectors, payloads, deleted = self.vectors, self.payloads, self.deleted
+        wanted = set(ids)
+        return {
+            payload["_id"]: vectors[i].tolist()
+            for i, payload in enumerate(payloads[:len(vectors)])
+            if payload.get("_id") in wanted and not deleted[i]
+        }
+    
+    def search(self, query: np.ndarray, top_k: int, score_threshold: float) -> SearchHits:
+        self.refresh()
+        # Snapshot, so a concurrent refresh cannot swap arrays mid-search
+        vectors, payloads, deleted = self.vectors, self.payloads, self.deleted
+        if not len(vectors) or top_k <= 0:
+            return []
+        
+        norm = np.linalg.norm(query)
+        scores = vectors @ (query / norm if norm else query)
+        scores[deleted] = -np.inf
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        
+        hits = []
+        for i in best:
+            if scores[i] < score_threshold:
+                break
+            payload = {key: value for key, value in payloads[i].items() if key != "_id"}
+            hits.append((float(scores[i]), payload))
+        return hits
+
+
+class LocalBackend(VectorBackend):
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.VECTOR_LOCAL_PATH
+        self._collections: Dict[int, LocalCollection] = {}
+        self._lock = threading.Lock()
+    
+    def connect(self):
+        os.makedirs(self.path, exist_ok=True)
+        logger.info(f"Using local vector index at {self.path}")
+    
+    def _collection(self, tenant_id: int) -> LocalCollection:
+        with self._lock:
+            collection = self._collections.get(tenant_id)
+            if collection is None:
+                collection = LocalCollection(
+                    os.path.join(self.path, collection_name(tenant_id)),
+                    settings.EMBEDDING_DIMENSION
+                )
+                self._collections[tenant_id] = collection
+            return collection
+    
+    @traced
+    def collection_exists(self, tenant_id: int) -> bool:
+        return os.path.isdir(os.path.join(self.path, collection_name(tenant_id)))
+    
+    def ensure_collection(self, tenant_id: int, dimension: int, coarse_dimension: Optional[int] = None):
+        # Brute force over a few thousand rows needs no coarse stage
+        if dimension != settings.EMBEDDING_DIMENSION:
+            raise ValueError(f"Local index expects {settings.EMBEDDING_DIMENSION}-d vectors, got {dimension}")
+        if not self.collection_exists(tenant_id):
+            os.makedirs(os.path.join(self.path, collection_name(tenant_id)), exist_ok=True)
+            logger.info(f"Created collection: {collection_name(tenant_id)}")
+    
+    @traced
+    def upsert(self, tenant_id, ids, vectors, payloads, coarse_vectors=None, wait=True):
+        self._collection(tenant_id).append(ids, np.asarray(vectors, dtype=np.float32), payloads)
+    
+    @traced
+    def search(self, tenant_id, vector, top_k, score_threshold,
+               hnsw_ef=None, exact=False, quantization_rescore=None):
+        # Brute force is always exact, so the index parameters do not apply
+        return self._collection(tenant_id).search(
+            np.asarray(vector, dtype=np.float32), top_k, score_threshold
+        )
+    
+    @traced
+    def fetch_vectors(self, tenant_id: int, ids: List[str]) -> Dict[str, List[float]]:
+        return self._collection(tenant_id).fetch(ids)
+    
+    @traced
+    def delete_document(self, tenant_id: int, document_id: int):
+        if self.collection_exists(tenant_id):
+            self._collection(tenant_id).delete(document_id)
+    
+    def list_tenants(self) -> List[int]:
+        return [
+            int(name[len("tenant_"):])
+            for name in os.listdir(self.path)
+            if name.startswith("tenant_") and name[len("tenant_"):].isdigit()
+        ]
+    
+    def drop_collection(self, tenant_id: int):
+        with self._lock:
+            self._collections.pop(tenant_id, None)
+        shutil.rmtree(os.path.join(self.path, collection_name(tenant_id)), ignore_errors=True)
+    
+    def health_check(self) -> bool:
+        return os.path.isdir(self.path) and os.access(self.path, os.W_OK)
+
+
+def create_backend() -> VectorBackend:
+    """Backend selected by VECTOR_BACKEND"""
+    if settings.VECTOR_BACKEND == "local":
+        return LocalBackend()
+    if settings.VECTOR_BACKEND == "qdrant":
+        return QdrantBackend()
+    raise ValueError(f"Unknown VECTOR_BACKEND: {settings.VECTOR_BACKEND}")
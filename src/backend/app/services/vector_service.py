@@ -1,190 +1,383 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import asyncio
+import contextvars
 import logging
+import threading
+import time
 import uuid
 
 from app.config import settings
+from app.database import SessionLocal
+from app.metrics import track
+from app.tracing import traced
+from app.services.coarse_projection import CoarseProjection
+from app.services.vector_backends import VectorBackend, collection_name, create_backend
 
 logger = logging.getLogger(__name__)
 
 
+def chunk_payload(tenant_id: int, document_id: int, chunk_index: int, content: str, document_title: str) -> Dict[str, Any]:
+    """Payload stored with each chunk's vector"""
+    return {
+        "tenant_id": tenant_id,
+        "document_id": document_id,
+        "chunk_index": chunk_index,
+        "content": content,
+        "document_title": document_title,
+    }
+
+
 class VectorService:
     def __init__(self):
-        self.client: Optional[QdrantClient] = None
-        self.encoder: Optional[SentenceTransformer] = None
+        # QdrantBackend or LocalBackend, per VECTOR_BACKEND
+        self.backend: Optional[VectorBackend] = None
+        # SentenceTransformer, or RemoteEncoder in remote embedding mode
+        self.encoder = None
+        # True once the encoder has served a warm-up batch
+        self.ready = False
+        # tenant_id -> (expires_at, projection) for two-stage collections
+        self._projections: Dict[int, Tuple[float, CoarseProjection]] = {}
+        self._projections_lock = threading.Lock()
+        # Upsert batches run here, at most QDRANT_UPSERT_PARALLEL at a time;
+        # deferred ones are kept per (tenant_id, document_id) for flush_writes
+        # while the document's document_writes scope is open
+        self._write_pool = ThreadPoolExecutor(
+            max_workers=settings.QDRANT_UPSERT_PARALLEL,
+            thread_name_prefix="vector-write"
+        )
+        self._write_slots = threading.BoundedSemaphore(settings.QDRANT_UPSERT_PARALLEL)
+        self._pending_writes: Dict[Tuple[int, int], List[Future]] = {}
+        self._pending_lock = threading.Lock()
+    
+    def connect(self):
+        """Open the vector store"""
+        self.backend = create_backend()
+        self.backend.connect()
+    
+    def load_encoder(self):
+        """Load the embedding model (or attach to the embedding server)"""
+        if settings.EMBEDDING_MODE == "remote":
+            # Model lives in the per-host embedding server
+            from app.services.embedding_client import RemoteEncoder
+            self.encoder = RemoteEncoder(settings.EMBEDDING_SOCKET_PATH)
+            logger.info(f"Using embedding server at {settings.EMBEDDING_SOCKET_PATH}")
+        else:
+            # Imported here so the API module never imports torch eagerly
+            from app.services.embedding_backends import load_encoder
+            self.encoder = load_encoder()
+            logger.info("Embedding model loaded")
+    
+    def warm_up(self):
+        """Run a dummy batch so the first real request pays no lazy-init cost"""
+        self.encoder.encode(["warm up"] * settings.EMBEDDING_WARMUP_BATCH)
+        self.ready = True
+        logger.info("Embedding model warmed up")
+    
+    async def initialize(self, timings: Optional[Dict[str, float]] = None):
+        """Initialize vector store and embedding model, recording phase timings in ms"""
+        timings = timings if timings is not None else {}
+        
+        async def timed(phase: str, func):
+            start = time.perf_counter()
+            await asyncio.to_thread(func)
+            timings[phase] = round((time.perf_counter() - start) * 1000, 1)
         
-    async def initialize(self):
-        """Initialize Qdrant client and embedding model"""
         try:
-            # Parse Qdrant URL
-            url = settings.QDRANT_URL
-            if url.startswith("http://"):
-                host = url.replace("http://", "").split(":")[0]
-                port = int(url.split(":")[-1])
-            else:
-                host = "localhost"
-                port = 6333
-                
-            self.client = QdrantClient(host=host, port=port)
-            logger.info(f"Connected to Qdrant at {host}:{port}")
-            
-            # Load embedding model
-            logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
-            self.encoder = SentenceTransformer(settings.EMBEDDING_MODEL)
-            logger.info("Embedding model loaded")
-            
+            # Connecting and loading the model are independent, so overlap them
+            await asyncio.gather(
+                timed("qdrant_connect", self.connect),
+                timed("encoder_load", self.load_encoder)
+            )
+            await timed("encoder_warmup", self.warm_up)
         except Exception as e:
             logger.error(f"Failed to initialize vector service: {e}")
             raise
     
+    @traced
     def ensure_collection(self, tenant_id: int) -> str:
         """Ensure collection exists for tenant"""
-        collection_name = f"tenant_{tenant_id}"
-        
         try:
-            collections = self.client.get_collections().collections
-            exists = any(c.name == collection_name for c in collections)
-            
-            if not exists:
-                self.client.create_collection(
-                    collection_name=collection_name,
-                    vectors_config=VectorParams(
-                        size=settings.EMBEDDING_DIMENSION,
-                        distance=Distance.COSINE
-                    )
-                )
-                logger.info(f"Created collection: {collection_name}")
+            self.backend.ensure_collection(
+                tenant_id,
+                settings.EMBEDDING_DIMENSION,
+                settings.VECTOR_COARSE_DIM if settings.VECTOR_TWO_STAGE else None
+            )
         except Exception as e:
             logger.error(f"Error ensuring collection: {e}")
             raise
-            
-        return collection_name
+        
+        return collection_name(tenant_id)
+    
+    def coarse_projection(self, tenant_id: int, coarse_dimension: int) -> CoarseProjection:
+        """The tenant's fitted projection, or truncation if none is stored (cached for TENANT_CACHE_TTL)"""
+        now = time.monotonic()
+        with self._projections_lock:
+            cached = self._projections.get(tenant_id)
+        if cached and cached[0] > now:
+            return cached[1]
+        
+        db = SessionLocal()
+        try:
+            projection = CoarseProjection.load(db, tenant_id)
+        finally:
+            db.close()
+        # A projection fitted for another model or layout does not apply
+        if projection is None or (projection.dimension, projection.coarse_dimension) != (
+            settings.EMBEDDING_DIMENSION, coarse_dimension
+        ):
+            projection = CoarseProjection.truncate(settings.EMBEDDING_DIMENSION, coarse_dimension)
+        with self._projections_lock:
+            self._projections[tenant_id] = (now + settings.TENANT_CACHE_TTL, projection)
+        return projection
+    
+    def invalidate_projection(self, tenant_id: int):
+        with self._projections_lock:
+            self._projections.pop(tenant_id, None)
     
+    @traced
     def embed_text(self, text: str) -> List[float]:
         """Generate embedding for text"""
         return self.encoder.encode(text).tolist()
     
+    @traced
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for multiple texts"""
         return self.encoder.encode(texts).tolist()
     
+    def _write(
+        self,
+        tenant_id: int,
+        ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        coarse_vectors: Optional[List[List[float]]],
+        wait: bool
+    ) -> List[Future]:
+        """Send points in QDRANT_UPSERT_BATCH batches; blocks while the parallel limit is reached"""
+        futures = []
+        size = settings.QDRANT_UPSERT_BATCH
+        for start in range(0, len(ids), size):
+            end = start + size
+            self._write_slots.acquire()
+            try:
+                # In the caller's context, so upsert spans join its trace
+                future = self._write_pool.submit(
+                    contextvars.copy_context().run,
+                    self.backend.upsert,
+                    tenant_id,
+                    ids[start:end],
+                    vectors[start:end],
+                    payloads[start:end],
+                    coarse_vectors[start:end] if coarse_vectors is not None else None,
+                    wait
+                )
+            except BaseException:
+                self._write_slots.release()
+                raise
+            future.add_done_callback(lambda _: self._write_slots.release())
+            futures.append(future)
+        return futures
+    
+    def _take_pending(self, tenant_id: int, document_id: int) -> List[Future]:
+        key = (tenant_id, document_id)
+        with self._pending_lock:
+            futures = self._pending_writes.get(key, [])
+            if key in self._pending_writes:
+                self._pending_writes[key] = []
+            return futures
+    
+    def _add_pending(self, tenant_id: int, document_id: int, futures: List[Future]):
+        with self._pending_lock:
+            pending = self._pending_writes.get((tenant_id, document_id))
+            if pending is not None:
+                pending.extend(futures)
+                return
+        # No open scope (its ingest failed or was cancelled): only log failures
+        for future in futures:
+            future.add_done_callback(self._log_write_error)
+    
+    @staticmethod
+    def _log_write_error(future: Future):
+        if future.exception():
+            logger.error(f"Unflushed vector write failed: {future.exception()}")
+    
+    @contextmanager
+    def document_writes(self, tenant_id: int, document_id: int) -> Iterator[None]:
+        """
+        Scope for a document's upsert_chunks(wait_for_write=False) calls.
+        Writes that flush_writes or delete_document_vectors have not taken
+        when it closes stop being tracked; their failures are only logged.
+        """
+        key = (tenant_id, document_id)
+        with self._pending_lock:
+            self._pending_writes[key] = []
+        try:
+            yield
+        finally:
+            with self._pending_lock:
+                futures = self._pending_writes.pop(key, [])
+            for future in futures:
+                future.add_done_callback(self._log_write_error)
+    
+    @traced
     def upsert_chunks(
         self,
         tenant_id: int,
         document_id: int,
-        chunks: List[Dict[str, Any]]
+        chunks: List[Dict[str, Any]],
+        wait_for_write: bool = True
     ) -> List[str]:
-        """Store document chunks with embeddings"""
-        collection_name = self.ensure_collection(tenant_id)
+        """
+        Store document chunks with embeddings. With wait_for_write=False the
+        upserts are only queued and not acknowledged by Qdrant yet; call it
+        within document_writes and flush_writes once the last batch is in.
+        """
+        self.ensure_collection(tenant_id)
         
         # Generate embeddings
         texts = [chunk["content"] for chunk in chunks]
-        embeddings = self.embed_texts(texts)
+        with track("ingest_embed"):
+            embeddings = self.embed_texts(texts)
         
-        # Create points
-        points = []
-        vector_ids = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            vector_id = str(uuid.uuid4())
-            vector_ids.append(vector_id)
-            
-            points.append(PointStruct(
-                id=vector_id,
-                vector=embedding,
-                payload={
-                    "tenant_id": tenant_id,
-                    "document_id": document_id,
-                    "chunk_index": chunk["chunk_index"],
-                    "content": chunk["content"],
-                    "document_title": chunk.get("document_title", ""),
-                }
-            ))
+        vector_ids = [str(uuid.uuid4()) for _ in chunks]
+        payloads = [
+            chunk_payload(tenant_id, document_id, chunk["chunk_index"], chunk["content"], chunk.get("document_title", ""))
+            for chunk in chunks
+        ]
         
-        # Upsert to Qdrant
-        self.client.upsert(
-            collection_name=collection_name,
-            points=points
-        )
+        coarse_vectors = None
+        coarse_dimension = self.backend.coarse_dimension(tenant_id)
+        if coarse_dimension:
+            coarse_vectors = self.coarse_projection(tenant_id, coarse_dimension).apply(embeddings).tolist()
+        
+        with track("qdrant_upsert"):
+            futures = self._write(tenant_id, vector_ids, embeddings, payloads, coarse_vectors, wait_for_write)
+            if wait_for_write:
+                for future in futures:
+                    future.result()
+        if not wait_for_write:
+            self._add_pending(tenant_id, document_id, futures)
         
-        logger.info(f"Upserted {len(points)} chunks for document {document_id}")
+        logger.info(f"Upserted {len(vector_ids)} chunks for document {document_id}")
         return vector_ids
     
+    @traced
+    def store_vectors(
+        self,
+        tenant_id: int,
+        ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]]
+    ) -> List[Future]:
+        """
+        Queue points whose vectors are already computed (bundle imports) as
+        unwaited batched writes. Check the returned futures, then call
+        backend.wait_for_writes before relying on the points.
+        """
+        coarse_vectors = None
+        coarse_dimension = self.backend.coarse_dimension(tenant_id)
+        if coarse_dimension:
+            coarse_vectors = self.coarse_projection(tenant_id, coarse_dimension).apply(vectors).tolist()
+        return self._write(tenant_id, ids, vectors, payloads, coarse_vectors, wait=False)
+    
+    @traced
+    def flush_writes(self, tenant_id: int, document_id: int):
+        """Wait for a document's queued upserts and until they are searchable; raises the first failure"""
+        futures = self._take_pending(tenant_id, document_id)
+        if not futures:
+            return
+        with track("qdrant_upsert_flush"):
+            errors = [error for error in (future.exception() for future in futures) if error]
+            if errors:
+                raise errors[0]
+            self.backend.wait_for_writes(tenant_id)
+    
+    @traced
     def search(
         self,
         tenant_id: int,
         query: str,
         top_k: int = 5,
-        score_threshold: float = 0.3
+        score_threshold: float = 0.3,
+        hnsw_ef: Optional[int] = None,
+        exact: bool = False,
+        quantization_rescore: Optional[bool] = None,
+        two_stage_oversampling: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Search for relevant chunks"""
-        collection_name = f"tenant_{tenant_id}"
-        
+        """Search for relevant chunks, two-stage where the collection has coarse vectors"""
         # Check if collection exists
         try:
-            collections = self.client.get_collections().collections
-            if not any(c.name == collection_name for c in collections):
-                logger.warning(f"Collection {collection_name} does not exist")
+            with track("qdrant_collection_check"):
+                exists = self.backend.collection_exists(tenant_id)
+            if not exists:
+                logger.warning(f"Collection {collection_name(tenant_id)} does not exist")
                 return []
         except Exception as e:
             logger.error(f"Error checking collection: {e}")
             return []
         
         # Generate query embedding
-        query_embedding = self.embed_text(query)
+        with track("embed"):
+            query_embedding = self.embed_text(query)
         
-        # Search with tenant filter (defense in depth - collection is already tenant-scoped)
-        results = self.client.search(
-            collection_name=collection_name,
-            query_vector=query_embedding,
-            query_filter=Filter(
-                must=[
-                    FieldCondition(
-                        key="tenant_id",
-                        match=MatchValue(value=tenant_id)
-                    )
-                ]
-            ),
-            limit=top_k,
-            score_threshold=score_threshold
-        )
+        oversampling = two_stage_oversampling
+        if oversampling is None:
+            oversampling = settings.VECTOR_COARSE_OVERSAMPLING
+        coarse_dimension = None
+        if oversampling and not exact:
+            coarse_dimension = self.backend.coarse_dimension(tenant_id)
+        
+        projection = self.coarse_projection(tenant_id, coarse_dimension) if coarse_dimension else None
+        with track("qdrant_search"):
+            # While a refit rewrites the coarse vectors they are in two spaces
+            if projection is not None and projection.applied:
+                results = self.backend.search_two_stage(
+                    tenant_id,
+                    query_embedding,
+                    projection.apply(query_embedding).tolist(),
+                    top_k=top_k,
+                    score_threshold=score_threshold,
+                    candidates=top_k * oversampling,
+                    hnsw_ef=hnsw_ef,
+                    quantization_rescore=quantization_rescore
+                )
+            else:
+                results = self.backend.search(
+                    tenant_id,
+                    query_embedding,
+                    top_k=top_k,
+                    score_threshold=score_threshold,
+                    hnsw_ef=hnsw_ef,
+                    exact=exact,
+                    quantization_rescore=quantization_rescore
+                )
         
         return [
             {
-                "content": hit.payload["content"],
-                "document_id": hit.payload["document_id"],
-                "document_title": hit.payload.get("document_title", ""),
-                "chunk_index": hit.payload["chunk_index"],
-                "score": hit.score
+                "content": payload["content"],
+                "document_id": payload["document_id"],
+                "document_title": payload.get("document_title", ""),
+                "chunk_index": payload["chunk_index"],
+                "score": score
             }
-            for hit in results
+            for score, payload in results
         ]
     
+    @traced
     def delete_document_vectors(self, tenant_id: int, document_id: int):
         """Delete all vectors for a document"""
-        collection_name = f"tenant_{tenant_id}"
-        
+        # Queued upserts must land first, or they would outlive the delete
+        for future in self._take_pending(tenant_id, document_id):
+            future.exception()
         try:
-            self.client.delete(
-                collection_name=collection_name,
-                points_selector=Filter(
-                    must=[
-                        FieldCondition(
-                            key="document_id",
-                            match=MatchValue(value=document_id)
-                        )
-                    ]
-                )
-            )
+            self.backend.delete_document(tenant_id, document_id)
             logger.info(f"Deleted vectors for document {document_id}")
         except Exception as e:
             logger.error(f"Error deleting vectors: {e}")
     
+    @traced
     def health_check(self) -> bool:
-        """Check if Qdrant is healthy"""
-        try:
-            self.client.get_collections()
-            return True
-        except Exception:
-            return False
+        """Check if the vector store is healthy"""
+        return self.backend is not None and self.backend.health_check()
@@ -0,0 +1,474 @@
+"""
+Move a tenant's knowledge base between environments without re-embedding.
+
+    python -m app.tenant_bundle export --tenant 12 --out acme.bundle
+    python -m app.tenant_bundle import acme.bundle [--slug acme-staging] [--name "Acme (staging)"]
+
+A bundle is an uncompressed tar of:
+
+- manifest.json: format, tenant settings, embedding model and dimension, counts
+- documents.jsonl.zst: the active documents, one JSON object per line
+- chunks.jsonl.zst: their chunks, in chunk id order
+- vectors.npy: float32 (chunks, dimension); row i is the vector of chunk line i
+- bodies/{id}.txt.gz: stored bodies of large documents, byte for byte
+
+Export reads Postgres in keyset-paginated batches from one REPEATABLE READ
+snapshot, so documents and chunks agree, and fetches each batch's vectors
+from the tenant's collection by point id, restoring the collection first
+if tiering offloaded it. Chunks without a stored point fail the export,
+unless --allow-missing leaves them out (counted in the manifest).
+
+Import creates a new tenant, reserves document ids from the sequence,
+loads documents and chunks with COPY and writes the vectors under their
+point ids with the batched parallel upserts of document ingest
+(QDRANT_UPSERT_BATCH, QDRANT_UPSERT_PARALLEL). The encoder is never
+loaded, so EMBEDDING_MODEL and EMBEDDING_DIMENSION must match the bundle's
+(re-embed afterwards with app.reindex if the target uses another model).
+Everything is committed in one transaction once Qdrant has applied the
+writes; on failure the new collection and copied bodies are removed.
+Two-stage collections start with truncated coarse vectors; refit them
+with app.coarse_index.
+"""
+from concurrent.futures import Future, wait
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+import argparse
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+
+import numpy as np
+import redis
+import zstandard
+from sqlalchemy import Table, func, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import AuditLog, Document, DocumentChunk, Tenant
+from app.reindex import point_id
+from app.services.document_service import DocumentService
+from app.services.tiering_service import TieringService
+from app.services.vector_service import VectorService, chunk_payload
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 1
+BATCH_ROWS = 1000
+ZSTD_LEVEL = 3
+VECTOR_DTYPE = np.dtype("<f4")
+
+
+@contextmanager
+def _jsonl_writer(path: str) -> Iterator[Callable[[Dict[str, Any]], None]]:
+    with open(path, "wb") as f, zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f) as stream:
+        yield lambda row: stream.write(json.dumps(row, ensure_ascii=False).encode() + b"\n")
+
+
+def _jsonl_rows(tar: tarfile.TarFile, name: str) -> Iterator[Dict[str, Any]]:
+    with tar.extractfile(name) as member:
+        stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(member))
+        for line in stream:
+            yield json.loads(line)
+
+
+def _batches(rows: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _export_documents(db: Session, tenant_id: int, staging: str) -> Tuple[int, List[Tuple[str, str]]]:
+    """Write documents.jsonl.zst; returns the count and (member, path) of stored bodies"""
+    count, bodies, after_id = 0, [], 0
+    with _jsonl_writer(os.path.join(staging, "documents.jsonl.zst")) as write:
+        while documents := db.query(Document).filter(
+            Document.tenant_id == tenant_id,
+            Document.id > after_id,
+            Document.is_active == True
+        ).order_by(Document.id).limit(BATCH_ROWS).all():
+            for document in documents:
+                body = f"bodies/{document.id}.txt.gz" if document.content_ref else None
+                if body:
+                    bodies.append((body, os.path.join(settings.DOCUMENT_STORE_PATH, document.content_ref)))
+                write({
+                    "id": document.id,
+                    "title": document.title,
+                    "content": document.content,
+                    "body": body,
+                    "source": document.source,
+                    "content_hash": document.content_hash,
+                    "chunk_count": document.chunk_count,
+                    "created_at": document.created_at.isoformat() if document.created_at else None,
+                })
+            after_id = documents[-1].id
+            count += len(documents)
+            db.expunge_all()
+    return count, bodies
+
+
+def _export_chunks(db: Session, vector_service: VectorService, tenant_id: int, staging: str) -> Tuple[int, int]:
+    """Write chunks.jsonl.zst and the raw vector rows; returns (written, skipped)"""
+    written, skipped, after_id = 0, 0, 0
+    # A tenant that never stored a document has no collection
+    has_collection = vector_service.backend.collection_exists(tenant_id)
+    with _jsonl_writer(os.path.join(staging, "chunks.jsonl.zst")) as write, \
+            open(os.path.join(staging, "vectors.f32"), "wb") as raw:
+        while chunks := db.query(DocumentChunk).join(
+            Document, Document.id == DocumentChunk.document_id
+        ).filter(
+            DocumentChunk.tenant_id == tenant_id,
+            DocumentChunk.id > after_id,
+            Document.is_active == True
+        ).order_by(DocumentChunk.id).limit(BATCH_ROWS).all():
+            after_id = chunks[-1].id
+            ids = [point_id(chunk) for chunk in chunks]
+            vectors = vector_service.backend.fetch_vectors(tenant_id, ids) if has_collection else {}
+            kept = [(chunk, vectors[i]) for chunk, i in zip(chunks, ids) if i in vectors]
+            skipped += len(chunks) - len(kept)
+            if kept:
+                rows = np.asarray([vector for _, vector in kept], dtype=VECTOR_DTYPE)
+                if rows.shape[1] != settings.EMBEDDING_DIMENSION:
+                    raise ValueError(f"Tenant {tenant_id} has {rows.shape[1]}-d vectors; set EMBEDDING_DIMENSION "
+                                     f"and EMBEDDING_MODEL to its model")
+                raw.write(rows.tobytes())
+            for chunk, _ in kept:
+                write({
+                    "document_id": chunk.document_id,
+                    "chunk_index": chunk.chunk_index,
+                    "content": chunk.content,
+                    "vector_id": point_id(chunk),
+                })
+            written += len(kept)
+            db.expunge_all()
+    return written, skipped
+
+
+def _write_npy(raw_path: str, path: str, rows: int):
+    """Prefix the raw rows with an .npy header, now that their number is known"""
+    with open(path, "wb") as f, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(f, {
+            "descr": np.lib.format.dtype_to_descr(VECTOR_DTYPE),
+            "fortran_order": False,
+            "shape": (rows, settings.EMBEDDING_DIMENSION),
+        })
+        shutil.copyfileobj(raw, f, 1024 * 1024)
+
+
+def export_tenant(
+    vector_service: VectorService,
+    tenant_id: int,
+    out: str,
+    tiering_service: TieringService = None,
+    allow_missing: bool = False
+) -> Dict[str, Any]:
+    """Write a tenant's active documents, chunks and vectors to a bundle file"""
+    start = time.monotonic()
+    # A snapshot-offloaded tenant has no collection to read vectors from
+    if tiering_service and not tiering_service.rehydrate(tenant_id):
+        raise RuntimeError(f"Tenant {tenant_id}'s collection is still being restored; retry")
+    db = SessionLocal()
+    try:
+        if _is_postgres(db):
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        tenant = db.get(Tenant, tenant_id)
+        if tenant is None or not tenant.is_active:
+            raise ValueError(f"Tenant {tenant_id} not found")
+        manifest = {
+            "format": FORMAT,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "tenant": {
+                "id": tenant.id,
+                "name": tenant.name,
+                "slug": tenant.slug,
+                "tier": tenant.tier,
+                "retrieval_profile": tenant.retrieval_profile,
+                "retention_months": tenant.retention_months,
+            },
+            "embedding_model": settings.EMBEDDING_MODEL,
+            "dimension": settings.EMBEDDING_DIMENSION,
+        }
+        
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(out))) as staging:
+            manifest["documents"], bodies = _export_documents(db, tenant_id, staging)
+            manifest["chunks"], manifest["skipped_chunks"] = _export_chunks(db, vector_service, tenant_id, staging)
+            if manifest["skipped_chunks"]:
+                if not allow_missing:
+                    raise ValueError(f"Tenant {tenant_id}: {manifest['skipped_chunks']} chunks have no stored vector; "
+                                     f"pass --allow-missing to export without them")
+                logger.warning(f"Tenant {tenant_id}: {manifest['skipped_chunks']} chunks have no stored vector, left out")
+            _write_npy(os.path.join(staging, "vectors.f32"), os.path.join(staging, "vectors.npy"), manifest["chunks"])
+            with open(os.path.join(staging, "manifest.json"), "w") as f:
+                json.dump(manifest, f, indent=2)
+            
+            # Members are compressed already (or float noise), so no tar compression
+            partial = os.path.join(staging, "bundle.tar")
+            with tarfile.open(partial, "w") as tar:
+                for name in ("manifest.json", "documents.jsonl.zst", "chunks.jsonl.zst", "vectors.npy"):
+                    tar.add(os.path.join(staging, name), arcname=name)
+                for member, path in bodies:
+                    tar.add(path, arcname=member)
+            os.replace(partial, out)
+    finally:
+        db.close()
+    
+    report = {
+        "tenant_id": tenant_id,
+        "bundle": out,
+        "documents": manifest["documents"],
+        "chunks": manifest["chunks"],
+        "skipped_chunks": manifest["skipped_chunks"],
+        "bytes": os.path.getsize(out),
+        "seconds": round(time.monotonic() - start, 2),
+    }
+    logger.info(f"Exported tenant bundle: {report}")
+    return report
+
+
+def _copy_value(value: Any) -> str:
+    """A field of COPY's text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _bulk_insert(db: Session, table: Table, records: List[Dict[str, Any]]):
+    """COPY on Postgres, executemany elsewhere; inside the session's transaction"""
+    if not _is_postgres(db):
+        db.execute(table.insert(), records)
+        return
+    columns = list(records[0])
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write("\t".join(_copy_value(record[column]) for column in columns) + "\n")
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def _reserve_document_ids(db: Session, count: int) -> List[int]:
+    if _is_postgres(db):
+        rows = db.execute(
+            text("SELECT nextval(pg_get_serial_sequence('documents', 'id')) FROM generate_series(1, :count)"),
+            {"count": count}
+        )
+        return sorted(row[0] for row in rows)
+    # SQLite (development) has one writer, so continue from the largest id
+    first = (db.query(func.max(Document.id)).scalar() or 0) + 1
+    return list(range(first, first + count))
+
+
+def _import_documents(
+    db: Session,
+    tar: tarfile.TarFile,
+    tenant_id: int,
+    stored_bodies: List[str]
+) -> Dict[int, Tuple[int, str]]:
+    """Load documents.jsonl.zst; returns exported id -> (new id, title)"""
+    document_service = DocumentService()
+    documents = {}
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for rows in _batches(_jsonl_rows(tar, "documents.jsonl.zst")):
+        records = []
+        for row, document_id in zip(rows, _reserve_document_ids(db, len(rows))):
+            content_ref = None
+            if row["body"]:
+                with tar.extractfile(row["body"]) as body:
+                    content_ref = document_service.copy_body(body, tenant_id, document_id)
+                stored_bodies.append(content_ref)
+            records.append({
+                "id": document_id,
+                "tenant_id": tenant_id,
+                "title": row["title"],
+                "content": row["content"],
+                "content_ref": content_ref,
+                "source": row["source"],
+                "content_hash": row["content_hash"],
+                "chunk_count": row["chunk_count"],
+                "created_at": datetime.fromisoformat(row["created_at"]) if row["created_at"] else now,
+                "is_active": True,
+            })
+            documents[row["id"]] = (document_id, row["title"])
+        _bulk_insert(db, Document.__table__, records)
+    return documents
+
+
+def _raise_failed(futures: List[Future]) -> List[Future]:
+    """Raise the first failed write; returns the writes still running"""
+    for future in futures:
+        if future.done() and future.exception():
+            raise future.exception()
+    return [future for future in futures if not future.done()]
+
+
+def _import_chunks(
+    db: Session,
+    tar: tarfile.TarFile,
+    vector_service: VectorService,
+    tenant_id: int,
+    documents: Dict[int, Tuple[int, str]]
+) -> int:
+    """Load chunks.jsonl.zst with COPY and their vectors.npy rows into the collection"""
+    count, futures = 0, []
+    with tar.extractfile("vectors.npy") as vectors_file:
+        version = np.lib.format.read_magic(vectors_file)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(vectors_file)
+        if dtype != VECTOR_DTYPE or fortran_order or len(shape) != 2 or shape[1] != settings.EMBEDDING_DIMENSION:
+            raise ValueError(f"vectors.npy is {dtype} {shape}, expected float32 rows of {settings.EMBEDDING_DIMENSION}")
+        row_bytes = shape[1] * VECTOR_DTYPE.itemsize
+        try:
+            for rows in _batches(_jsonl_rows(tar, "chunks.jsonl.zst")):
+                data = vectors_file.read(len(rows) * row_bytes)
+                if len(data) != len(rows) * row_bytes:
+                    raise ValueError("vectors.npy has fewer rows than chunks.jsonl.zst")
+                records, payloads = [], []
+                for row in rows:
+                    document_id, title = documents[row["document_id"]]
+                    records.append({
+                        "document_id": document_id,
+                        "tenant_id": tenant_id,
+                        "chunk_index": row["chunk_index"],
+                        "content": row["content"],
+                        "vector_id": row["vector_id"],
+                    })
+                    payloads.append(chunk_payload(tenant_id, document_id, row["chunk_index"], row["content"], title))
+                _bulk_insert(db, DocumentChunk.__table__, records)
+                # Blocks while QDRANT_UPSERT_PARALLEL batches are in flight
+                futures = _raise_failed(futures + vector_service.store_vectors(
+                    tenant_id,
+                    [row["vector_id"] for row in rows],
+                    np.frombuffer(data, dtype=VECTOR_DTYPE).reshape(len(rows), shape[1]).tolist(),
+                    payloads
+                ))
+                count += len(rows)
+        finally:
+            # Nothing may still be writing if the caller drops the collection
+            wait(futures)
+    _raise_failed(futures)
+    vector_service.backend.wait_for_writes(tenant_id)
+    return count
+
+
+def import_bundle(vector_service: VectorService, path: str, slug: str = None, name: str = None) -> Dict[str, Any]:
+    """Create a tenant from a bundle; returns a report with the new tenant id"""
+    start = time.monotonic()
+    with tarfile.open(path, "r:") as tar:
+        with tar.extractfile("manifest.json") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"Unsupported bundle format {manifest.get('format')}")
+        if (manifest["embedding_model"], manifest["dimension"]) != (settings.EMBEDDING_MODEL, settings.EMBEDDING_DIMENSION):
+            raise ValueError(f"Bundle vectors are {manifest['embedding_model']} ({manifest['dimension']}-d); "
+                             f"import with that model configured, then re-index if needed")
+        
+        source = manifest["tenant"]
+        slug = slug or source["slug"]
+        db = SessionLocal()
+        tenant_id, created_collection, stored_bodies = None, False, []
+        try:
+            if db.query(Tenant).filter(Tenant.slug == slug).first():
+                raise ValueError(f"Tenant slug {slug} already exists; pass --slug")
+            tenant = Tenant(
+                name=name or source["name"],
+                slug=slug,
+                tier=source["tier"],
+                retrieval_profile=source["retrieval_profile"],
+                retention_months=source["retention_months"]
+            )
+            db.add(tenant)
+            db.flush()
+            tenant_id = tenant.id
+            if vector_service.backend.collection_exists(tenant_id):
+                raise ValueError(f"A collection for tenant {tenant_id} already exists")
+            
+            documents = _import_documents(db, tar, tenant_id, stored_bodies)
+            vector_service.ensure_collection(tenant_id)
+            created_collection = True
+            chunks = _import_chunks(db, tar, vector_service, tenant_id, documents)
+            db.add(AuditLog(
+                tenant_id=tenant_id,
+                action="tenant_imported",
+                entity_type="tenant",
+                entity_id=tenant_id,
+                details={
+                    "bundle": os.path.basename(path),
+                    "source_tenant_id": source["id"],
+                    "documents": len(documents),
+                    "chunks": chunks,
+                },
+                retention_months=tenant.retention_months
+            ))
+            db.commit()
+        except BaseException:
+            db.rollback()
+            if created_collection:
+                vector_service.backend.drop_collection(tenant_id)
+            for ref in stored_bodies:
+                DocumentService().remove_body(ref)
+            raise
+        finally:
+            db.close()
+    
+    elapsed = time.monotonic() - start
+    report = {
+        "tenant_id": tenant_id,
+        "slug": slug,
+        "documents": len(documents),
+        "chunks": chunks,
+        "seconds": round(elapsed, 2),
+        "chunks_per_second": round(chunks / elapsed, 1) if elapsed else None,
+    }
+    logger.info(f"Imported tenant bundle: {report}")
+    return report
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export or import a tenant's documents, chunks and vectors")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a tenant to a bundle file")
+    export.add_argument("--tenant", type=int, required=True, help="tenant id")
+    export.add_argument("--out", required=True, help="bundle file to write")
+    export.add_argument("--allow-missing", action="store_true",
+                        help="leave out chunks whose vectors are missing instead of failing")
+    load = commands.add_parser("import", help="create a tenant from a bundle file")
+    load.add_argument("bundle", help="bundle file to read")
+    load.add_argument("--slug", help="slug of the new tenant (default: the exported one)")
+    load.add_argument("--name", help="name of the new tenant (default: the exported one)")
+    args = parser.parse_args(argv)
+    
+    vector_service = VectorService()
+    vector_service.connect()
+    if args.command == "export":
+        tiering_service = TieringService(redis.from_url(settings.REDIS_URL, decode_responses=True), vector_service)
+        report = export_tenant(vector_service, args.tenant, args.out, tiering_service, args.allow_missing)
+    else:
+        report = import_bundle(vector_service, args.bundle, args.slug, args.name)
+    print(json.dumps(report))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""
+OpenTelemetry tracing (TRACING_ENABLED; needs requirements-tracing.txt).
+
+Each HTTP request gets a root span, continuing an incoming traceparent.
+Below it are spans for CacheService, VectorService and LLMService calls
+(the traced decorator), for vector backend and encoder calls within them,
+for embedding executor jobs (with their queue wait) and for every SQL
+statement and session commit. Spans carry the /ask request_id once it is
+assigned (set_request_id), and tenant_id where the call has one.
+
+Spans go to the console or to a JSON-lines file (TRACING_EXPORTER), so no
+collector is needed. Sampling is decided per trace when its root span
+ends: a trace is kept if it took TRACING_SLOW_MS or longer, if it failed,
+or with probability TRACING_SAMPLE_RATIO by trace id. Finished spans wait
+in memory until then, at most TRACING_MAX_PENDING_SPANS per process.
+TRACING_SLOW_MS=0 samples up front by ratio instead, which records
+nothing for unsampled requests but can no longer keep slow ones.
+
+With tracing disabled, nothing here imports OpenTelemetry and traced
+functions cost one global lookup.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import functools
+import inspect
+import logging
+import os
+import threading
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Set by configure(); None means tracing is off
+_tracer = None
+_provider = None
+
+_request_id: ContextVar[Optional[str]] = ContextVar("trace_request_id", default=None)
+_root_span: ContextVar[Any] = ContextVar("trace_root_span", default=None)
+
+# Longest db.statement attribute kept
+STATEMENT_MAX_CHARS = 2000
+
+
+def _attributes(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    request_id = _request_id.get()
+    if request_id:
+        attributes["request_id"] = request_id
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """A child span of the current one; yields None when tracing is off"""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=_attributes(attributes)) as current:
+        yield current
+
+
+def traced(func: Callable) -> Callable:
+    """Run every call of func in a span named after it, with its tenant_id if it takes one"""
+    name = func.__qualname__
+    parameters = list(inspect.signature(func).parameters)
+    tenant_index = parameters.index("tenant_id") if "tenant_id" in parameters else None
+    
+    def tenant_id(args: tuple, kwargs: dict) -> Optional[int]:
+        if tenant_index is None:
+            return None
+        if "tenant_id" in kwargs:
+            return kwargs["tenant_id"]
+        return args[tenant_index] if tenant_index < len(args) else None
+    
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if _tracer is None:
+                return await func(*args, **kwargs)
+            with span(name, tenant_id=tenant_id(args, kwargs)):
+                return await func(*args, **kwargs)
+        return async_wrapper
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _tracer is None:
+            return func(*args, **kwargs)
+        with span(name, tenant_id=tenant_id(args, kwargs)):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def set_request_id(request_id: Any):
+    """Tag the request's root span, and every span started after this in its context"""
+    _request_id.set(str(request_id))
+    if _tracer is None:
+        return
+    from opentelemetry import trace
+    for current in (_root_span.get(), trace.get_current_span()):
+        if current is not None:
+            current.set_attribute("request_id", str(request_id))
+
+
+class TailSamplingProcessor:
+    """
+    Holds finished spans per trace until the trace's local root ends, then
+    passes them all on to the exporting processor or drops them all.
+    """
+    
+    # Decisions remembered for spans that end after their root (background work)
+    DECIDED_MAX = 10000
+    
+    def __init__(self, exporter_processor, sample_ratio: float, slow_ms: int, max_pending_spans: int):
+        from opentelemetry.sdk.trace.sampling import TraceIdRatioBased
+        self.exporter_processor = exporter_processor
+        self.bound = TraceIdRatioBased.get_bound_for_rate(sample_ratio)
+        self.slow_ns = slow_ms * 1_000_000
+        self.max_pending_spans = max_pending_spans
+        self._pending: "OrderedDict[int, List[Any]]" = OrderedDict()
+        self._pending_count = 0
+        self._decided: "OrderedDict[int, bool]" = OrderedDict()
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+    
+    def _keep(self, root) -> bool:
+        from opentelemetry.trace import StatusCode
+        if root.end_time - root.start_time >= self.slow_ns:
+            return True
+        if root.status.status_code == StatusCode.ERROR:
+            return True
+        # The same test as TraceIdRatioBased, so sampled traces agree across services
+        return root.context.trace_id & 0xFFFFFFFFFFFFFFFF < self.bound
+    
+    def on_start(self, span, parent_context=None):
+        pass
+    
+    def on_end(self, span):
+        trace_id = span.context.trace_id
+        local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            decided = self._decided.get(trace_id)
+            if decided is None and not local_root:
+                self._pending.setdefault(trace_id, []).append(span)
+                self._pending_count += 1
+                # Evict whole traces, oldest first, rather than grow unbounded
+                while self._pending_count > self.max_pending_spans and self._pending:
+                    _, evicted = self._pending.popitem(last=False)
+                    self._pending_count -= len(evicted)
+                    self.dropped_spans += len(evicted)
+                return
+            spans = self._pending.pop(trace_id, [])
+            self._pending_count -= len(spans)
+            spans.append(span)
+            if decided is None:
+                decided = self._keep(span)
+                self._decided[trace_id] = decided
+                if len(self._decided) > self.DECIDED_MAX:
+                    self._decided.popitem(last=False)
+        if decided:
+            for finished in spans:
+                self.exporter_processor.on_end(finished)
+    
+    def shutdown(self):
+        self.exporter_processor.shutdown()
+    
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.exporter_processor.force_flush(timeout_millis)
+
+
+def _exporter():
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+    if settings.TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    if settings.TRACING_EXPORTER == "file":
+        path = settings.TRACING_FILE.format(pid=os.getpid())
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One JSON object per line; a per-process file keeps lines whole
+        return ConsoleSpanExporter(
+            out=open(path, "a", encoding="utf-8"),
+            formatter=lambda finished: finished.to_json(indent=None) + "\n"
+        )
+    raise ValueError(f"Unknown TRACING_EXPORTER: {settings.TRACING_EXPORTER}")
+
+
+def _instrument_sqlalchemy(engine, session_factory):
+    """Spans per SQL statement, and per session commit (flush plus COMMIT)"""
+    from sqlalchemy import event
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+    
+    def start(name: str, **attributes):
+        return _tracer.start_span(name, kind=SpanKind.CLIENT, attributes=_attributes(attributes))
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        conn.info.setdefault("trace_spans", []).append(start(
+            f"db {operation}",
+            **{
+                "db.system": engine.dialect.name,
+                "db.statement": statement[:STATEMENT_MAX_CHARS],
+                "db.executemany": executemany,
+            }
+        ))
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            current = spans.pop()
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                current.set_attribute("db.rowcount", cursor.rowcount)
+            current.end()
+    
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            current = spans.pop()
+            current.record_exception(context.original_exception)
+            current.set_status(Status(StatusCode.ERROR, type(context.original_exception).__name__))
+            current.end()
+    
+    @event.listens_for(session_factory, "before_commit")
+    def before_commit(session):
+        session.info["trace_commit"] = start("db commit", **{"db.system": engine.dialect.name})
+    
+    def end_commit(session, failed: bool):
+        current = session.info.pop("trace_commit", None)
+        if current is not None:
+            if failed:
+                current.set_status(Status(StatusCode.ERROR, "rolled back"))
+            current.end()
+    
+    event.listen(session_factory, "after_commit", lambda session: end_commit(session, False))
+    event.listen(session_factory, "after_soft_rollback", lambda session, previous: end_commit(session, True))
+
+
+def configure():
+    """Install the tracer provider and database hooks; call once per process"""
+    global _tracer, _provider
+    if not settings.TRACING_ENABLED or _tracer is not None:
+        return
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased, TraceIdRatioBased
+    from app.database import SessionLocal, engine
+    
+    resource = Resource.create({"service.name": settings.TRACING_SERVICE_NAME})
+    exporting = BatchSpanProcessor(_exporter())
+    if settings.TRACING_SLOW_MS > 0:
+        # Record everything; TailSamplingProcessor decides per finished trace
+        _provider = TracerProvider(resource=resource, sampler=ALWAYS_ON)
+        _provider.add_span_processor(TailSamplingProcessor(
+            exporting, settings.TRACING_SAMPLE_RATIO, settings.TRACING_SLOW_MS, settings.TRACING_MAX_PENDING_SPANS
+        ))
+    else:
+        _provider = TracerProvider(resource=resource, sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)))
+        _provider.add_span_processor(exporting)
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("app")
+    _instrument_sqlalchemy(engine, SessionLocal)
+    logger.info(
+        f"Tracing to {settings.TRACING_EXPORTER}: sample ratio {settings.TRACING_SAMPLE_RATIO}, "
+        f"slow traces from {settings.TRACING_SLOW_MS} ms always kept"
+    )
+
+
+def shutdown():
+    """Export what is buffered"""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+class TracingMiddleware:
+    """Root span per HTTP request (pure ASGI, so the endpoint runs in its context)"""
+    
+    def __init__(self, app):
+        self.app = app
+        # endpoint -> route path template, for span names without ids in them
+        self._routes: Dict[Callable, str] = {}
+    
+    def _route(self, scope) -> Optional[str]:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return None
+        if endpoint not in self._routes:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._routes[endpoint] = route.path
+                    break
+        return self._routes.get(endpoint)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+        from opentelemetry import propagate
+        from opentelemetry.trace import SpanKind, Status, StatusCode
+        
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        response = {}
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            await send(message)
+        
+        with _tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=propagate.extract(headers),
+            kind=SpanKind.SERVER,
+            attributes=_attributes({
+                "http.method": scope["method"],
+                "http.target": scope["path"],
+                "tenant_id": headers.get("x-tenant-id"),
+            })
+        ) as root:
+            root_token, request_token = _root_span.set(root), _request_id.set(None)
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                _root_span.reset(root_token)
+                _request_id.reset(request_token)
+                route = self._route(scope)
+                if route:
+                    root.update_name(f"{scope['method']} {route}")
+                    root.set_attribute("http.route", route)
+                if "status" in response:
+                    root.set_attribute("http.status_code", response["status"])
+                    if response["status"] >= 500:
+                        root.set_status(Status(StatusCode.ERROR))
@@ -0,0 +1,118 @@
+"""
+RAG pipeline benchmark suite.
+
+Runs micro-benchmarks (chunk_document, embed_texts, search,
+build_user_prompt) and an end-to-end load test of /ask and /documents
+against local stand-ins: SQLite or a local Postgres, fakeredis and an
+in-memory Qdrant. Reports throughput, p50/p95/p99 and memory, and can
+save a JSON baseline or compare against one.
+
+    cd src/backend
+    pip install -r requirements-bench.txt
+    python -m benchmarks --save baseline.json
+    python -m benchmarks --compare baseline.json
+"""
+import argparse
+import asyncio
+import importlib.util
+import platform
+import sys
+import time
+from typing import List
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="RAG pipeline benchmark suite")
+    parser.add_argument("--suite", choices=["all", "micro", "load"], default="all")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of each benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="load test callers")
+    parser.add_argument("--encoder", choices=["auto", "model", "hashing"], default="auto",
+                        help="real embedding model, or a model-free hashing stand-in")
+    parser.add_argument("--vector-backend", choices=["qdrant", "local"], default="qdrant",
+                        help="in-memory Qdrant or the embedded local index")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--url", help="load test a running deployment instead of the in-process app")
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    
+    # Must happen before any app module reads settings
+    from benchmarks import standins
+    database_url = standins.configure(args.database_url)
+    
+    from benchmarks import load, micro
+    from benchmarks.stats import compare_baseline, peak_rss_mb, save_baseline
+    
+    encoder_kind = args.encoder
+    if encoder_kind == "auto":
+        has_model = importlib.util.find_spec("sentence_transformers") is not None
+        encoder_kind = "model" if has_model else "hashing"
+    encoder = standins.load_encoder(encoder_kind)
+    
+    benchmarks = {}
+    if args.suite in ("all", "micro"):
+        vector_service = standins.build_vector_service(encoder, args.vector_backend)
+        for name, result in micro.run(vector_service, args.seconds).items():
+            benchmarks[f"micro.{name}"] = result
+    
+    if args.suite in ("all", "load"):
+        app = None if args.url else standins.build_app(encoder, args.vector_backend)
+        
+        async def run_load():
+            async with load.make_client(app, args.url) as client:
+                return await load.run_scenarios(client, args.concurrency, args.seconds)
+        
+        for name, result in asyncio.run(run_load()).items():
+            benchmarks[f"load.{name}"] = result
+    
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "encoder": encoder_kind,
+            "vector_backend": args.vector_backend,
+            "database": args.url or database_url.split(":")[0],
+            "seconds": args.seconds,
+            "concurrency": args.concurrency,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "benchmarks": benchmarks,
+    }
+    
+    print(f"{'benchmark':<36}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in benchmarks.items():
+        print(
+            f"{name:<36}{result['ops_per_sec']:>12}{result['p50_ms']:>10}"
+            f"{result['p95_ms']:>10}{result['p99_ms']:>10}"
+        )
+    print(f"peak RSS: {results['meta']['peak_rss_mb']} MB (encoder: {encoder_kind})")
+    
+    # Timings of a run with failed requests are not comparable
+    failed = {name: result["errors"] for name, result in benchmarks.items() if result.get("errors")}
+    if failed:
+        print(f"Failed requests: {failed}")
+        return 1
+    
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"Saved baseline to {args.save}")
+    
+    if args.compare:
+        regressions = compare_baseline(args.compare, results, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Size and speed of the cached answer encodings.
+
+Builds a corpus of answers shaped like real /ask responses (a few sentences
+to a few paragraphs from the seed documents, with sources and confidence)
+and compares JSON, msgpack and msgpack+zstd value sizes and encode/decode
+time. With --redis-url it also stores the corpus both ways in that Redis,
+reports MEMORY USAGE per encoding, and times one GET per key against
+CacheService.get_many on the same keys.
+
+    cd src/backend
+    python -m benchmarks.cache_encoding --answers 5000
+    python -m benchmarks.cache_encoding --redis-url redis://localhost:6379/15
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List
+
+import msgpack
+
+from app.config import settings
+from app.services.cache_service import CacheService, decode_value, encode_value
+from benchmarks.corpus import SEED_DOCUMENTS
+
+
+def answer_corpus(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Answers of 1-15 sentences drawn from the seed documents"""
+    rng = random.Random(seed)
+    sentences = [
+        (doc["title"], sentence.strip())
+        for doc in SEED_DOCUMENTS
+        for sentence in re.split(r"(?<=[.!?])\s+", re.sub(r"#.*\n", "", doc["content"]))
+        if sentence.strip()
+    ]
+    answers = []
+    for _ in range(count):
+        picked = rng.sample(sentences, rng.randint(1, 15))
+        answers.append({
+            "answer": " ".join(sentence for _, sentence in picked),
+            "sources": sorted({title for title, _ in picked}),
+            "confidence": rng.choice(["high", "medium", "low"]),
+        })
+    return answers
+
+
+def encodings() -> Dict[str, Any]:
+    """name -> (encode, decode)"""
+    return {
+        "json": (lambda value: json.dumps(value).encode(), json.loads),
+        "msgpack": (lambda value: msgpack.packb(value, use_bin_type=True), msgpack.unpackb),
+        "msgpack+zstd": (encode_value, decode_value),
+    }
+
+
+def measure_sizes(answers: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, (encode, decode) in encodings().items():
+        start = time.perf_counter()
+        values = [encode(answer) for answer in answers]
+        encode_us = (time.perf_counter() - start) / len(answers) * 1e6
+        start = time.perf_counter()
+        for value in values:
+            decode(value)
+        decode_us = (time.perf_counter() - start) / len(answers) * 1e6
+        total = sum(len(value) for value in values)
+        results[name] = {
+            "total_bytes": total,
+            "avg_bytes": round(total / len(values), 1),
+            "encode_us": round(encode_us, 2),
+            "decode_us": round(decode_us, 2),
+        }
+    baseline = results["json"]["total_bytes"]
+    for result in results.values():
+        result["saving_pct"] = round((1 - result["total_bytes"] / baseline) * 100, 1)
+    return results
+
+
+def measure_redis(url: str, answers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import redis
+    client = redis.from_url(url)
+    cache = CacheService()
+    cache.binary_client = client
+    
+    memory = {}
+    for name in ("json", "msgpack+zstd"):
+        encode = encodings()[name][0]
+        keys = [f"bench:{name}:{i}" for i in range(len(answers))]
+        pipe = client.pipeline(transaction=False)
+        for key, answer in zip(keys, answers):
+            pipe.set(key, encode(answer))
+        pipe.execute()
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key, samples=0)
+        memory[name] = sum(pipe.execute())
+    
+    keys = [f"bench:msgpack+zstd:{i}" for i in range(len(answers))]
+    start = time.perf_counter()
+    for key in keys:
+        client.get(key)
+    single_s = time.perf_counter() - start
+    start = time.perf_counter()
+    cache.get_many(keys)
+    batch_s = time.perf_counter() - start
+    
+    for name in ("json", "msgpack+zstd"):
+        for start_index in range(0, len(answers), 1000):
+            client.delete(*[f"bench:{name}:{i}" for i in range(start_index, min(start_index + 1000, len(answers)))])
+    return {
+        "memory_usage_bytes": memory,
+        "memory_saving_pct": round((1 - memory["msgpack+zstd"] / memory["json"]) * 100, 1),
+        "get_one_by_one_ms": round(single_s * 1000, 1),
+        "get_many_ms": round(batch_s * 1000, 1),
+        "round_trips": {"one_by_one": len(keys), "get_many": -(-len(keys) // settings.CACHE_PIPELINE_BATCH)},
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cached answer encoding benchmark")
+    parser.add_argument("--answers", type=int, default=5000)
+    parser.add_argument("--redis-url", help="also measure MEMORY USAGE and pipelining against this Redis")
+    args = parser.parse_args(argv)
+    
+    answers = answer_corpus(args.answers)
+    report: Dict[str, Any] = {
+        "answers": len(answers),
+        "compression_min_bytes": settings.CACHE_COMPRESSION_MIN_BYTES,
+        "sizes": measure_sizes(answers),
+    }
+    if args.redis_url:
+        report["redis"] = measure_redis(args.redis_url, answers)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
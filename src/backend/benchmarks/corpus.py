@@ -0,0 +1,57 @@
+"""
+Sample corpus shared by the benchmarks (same documents as scripts/seed.sh).
+"""
+
+SEED_DOCUMENTS = [
+    {
+        "title": "Employee Handbook",
+        "source": "hr/employee-handbook.md",
+        "content": (
+            "# Vacation Policy\n\n"
+            "All full-time employees receive 20 days of paid time off (PTO) per year. PTO accrues monthly at a rate of 1.67 days per month. Unused PTO can roll over to the next year, up to a maximum of 5 days. Any PTO beyond 5 days will be forfeited at year end.\n\n"
+            "# Sick Leave\n\n"
+            "Employees have unlimited sick leave with manager approval. For absences longer than 3 consecutive days, a doctor note may be required. Sick leave should not be used for vacation purposes.\n\n"
+            "# Remote Work\n\n"
+            "Employees may work remotely up to 3 days per week with manager approval. Core collaboration hours are 10am-3pm in your local timezone. All remote work must be logged in the HR system.\n\n"
+            "# Performance Reviews\n\n"
+            "Performance reviews are conducted twice per year in June and December. Self-assessments are due two weeks before the review meeting. Managers provide written feedback and discuss career development goals."
+        ),
+    },
+    {
+        "title": "IT Security Policy",
+        "source": "it/security-policy.md",
+        "content": (
+            "# Password Requirements\n\n"
+            "All passwords must be at least 12 characters long and include uppercase, lowercase, numbers, and special characters. Passwords must be changed every 90 days. Do not reuse your last 5 passwords.\n\n"
+            "# Two-Factor Authentication\n\n"
+            "2FA is required for all company systems. Use the approved authenticator app (Google Authenticator or Authy). Hardware security keys are available for high-security roles.\n\n"
+            "# Data Classification\n\n"
+            "Data is classified as Public, Internal, Confidential, or Restricted. Confidential and Restricted data must be encrypted at rest and in transit. Never share Restricted data via email.\n\n"
+            "# Incident Reporting\n\n"
+            "Report security incidents immediately to security@company.com. Do not attempt to investigate on your own. Preserve all evidence and document what you observed."
+        ),
+    },
+    {
+        "title": "Expense Reimbursement Policy",
+        "source": "finance/expense-policy.md",
+        "content": (
+            "# Eligible Expenses\n\n"
+            "The company reimburses reasonable business expenses including travel, meals with clients, office supplies, and professional development. All expenses over $50 require a receipt.\n\n"
+            "# Travel Policy\n\n"
+            "Book flights at least 14 days in advance when possible. Economy class is standard for flights under 6 hours. Hotel rates should not exceed $200/night without VP approval.\n\n"
+            "# Meal Limits\n\n"
+            "Daily meal limits: Breakfast $20, Lunch $30, Dinner $50. Client entertainment meals up to $100/person with director approval.\n\n"
+            "# Submission Process\n\n"
+            "Submit expenses within 30 days of incurrence via the expense system. Include itemized receipts and business justification. Approvals are required from your direct manager for expenses under $500, and VP for expenses above."
+        ),
+    },
+]
+
+QUERIES = [
+    "How many vacation days do employees get?",
+    "What is the password rotation policy?",
+    "Can I work remotely on Fridays?",
+    "What is the hotel limit for business travel?",
+    "Who approves expenses above $500?",
+    "When are performance reviews held?",
+]
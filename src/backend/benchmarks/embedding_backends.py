@@ -0,0 +1,94 @@
+"""
+Parity and throughput of the torch and ONNX Runtime embedding backends.
+
+Encodes the seed corpus chunks with each backend, checks that the ONNX
+vectors stay within tolerance of the torch vectors (so existing Qdrant
+collections remain searchable), then measures texts/second for single
+queries and ingest-sized batches.
+
+    cd src/backend
+    pip install -r requirements-onnx.txt
+    python -m benchmarks.embedding_backends --threads 4
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List
+
+from app.config import settings
+from app.services.document_service import DocumentService
+from app.services.embedding_backends import load_encoder, min_cosine_similarity
+from benchmarks.corpus import SEED_DOCUMENTS, QUERIES
+
+# Minimum row-wise cosine similarity against the torch vectors
+TOLERANCE = {"onnx": 0.999, "onnx-int8": 0.98}
+
+
+def corpus_texts() -> List[str]:
+    doc_service = DocumentService()
+    chunks = [
+        chunk["content"]
+        for doc in SEED_DOCUMENTS
+        for chunk in doc_service.chunk_document(doc["content"], doc["title"])
+    ]
+    return chunks + QUERIES
+
+
+def load(variant: str):
+    settings.EMBEDDING_BACKEND = "torch" if variant == "torch" else "onnx"
+    settings.EMBEDDING_ONNX_QUANTIZE = variant == "onnx-int8"
+    return load_encoder()
+
+
+def throughput(encoder, texts: List[str], batch: int, seconds: float) -> float:
+    batch_texts = (texts * (batch // len(texts) + 1))[:batch]
+    encoder.encode(batch_texts)
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        encoder.encode(batch_texts)
+        done += batch
+    return done / (time.perf_counter() - start)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--variants", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = default)")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+    
+    settings.EMBEDDING_INTRA_OP_THREADS = args.threads
+    texts = corpus_texts()
+    reference = load("torch").encode(texts)
+    
+    results: List[Dict] = []
+    failed = False
+    for variant in args.variants:
+        encoder = load(variant)
+        parity = min_cosine_similarity(reference, encoder.encode(texts))
+        ok = parity >= TOLERANCE.get(variant, 1.0 - 1e-6)
+        failed = failed or not ok
+        result = {
+            "variant": variant,
+            "min_cosine": round(parity, 5),
+            "parity_ok": ok,
+            "query_texts_per_sec": round(throughput(encoder, texts, 1, args.seconds), 1),
+            "batch32_texts_per_sec": round(throughput(encoder, texts, 32, args.seconds), 1),
+        }
+        print(
+            f"{variant:>10}: min cosine {result['min_cosine']:.5f} ({'ok' if ok else 'FAIL'})  "
+            f"query {result['query_texts_per_sec']:>8}/s  batch32 {result['batch32_texts_per_sec']:>8}/s"
+        )
+        results.append(result)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Compare per-worker embedding models against the shared embedding server.
+
+For each worker count, starts N worker processes that each embed short
+query-sized texts in a loop, first with EMBEDDING_MODE=local (every worker
+loads its own SentenceTransformer) and then with EMBEDDING_MODE=remote (one
+app.embedding_server process owns the model). Reports total RSS/PSS of all
+processes involved and aggregate texts/second.
+
+    cd src/backend
+    python -m benchmarks.embedding_workers --workers 4 8 --seconds 20
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.corpus import QUERIES
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """RSS and PSS for a process, read from /proc (Linux only)"""
+    result = {"rss_kb": 0, "pss_kb": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    result["rss_kb"] = int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    result["pss_kb"] = int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return result
+
+
+def worker(mode: str, socket_path: str, ready, start, seconds: float, batch: int, counts):
+    os.environ["EMBEDDING_MODE"] = mode
+    os.environ["EMBEDDING_SOCKET_PATH"] = socket_path
+    from app.config import settings
+    
+    if mode == "remote":
+        from app.services.embedding_client import RemoteEncoder
+        encoder = RemoteEncoder(socket_path)
+    else:
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer(settings.EMBEDDING_MODEL)
+    encoder.encode(QUERIES[:1])
+    
+    ready.wait()
+    start.wait()
+    texts = (QUERIES * (batch // len(QUERIES) + 1))[:batch]
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        encoder.encode(texts)
+        done += len(texts)
+    counts.put(done)
+    # Stay alive until the parent has sampled memory
+    start.wait()
+
+
+def wait_for_socket(path: str, timeout: float = 300):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        if time.time() > deadline:
+            raise RuntimeError("Embedding server did not start")
+        time.sleep(0.5)
+
+
+def run(mode: str, workers: int, seconds: float, batch: int) -> Dict[str, float]:
+    ctx = mp.get_context("spawn")
+    socket_path = os.path.join(tempfile.mkdtemp(), "embedding.sock")
+    server = None
+    if mode == "remote":
+        env = dict(os.environ, EMBEDDING_SOCKET_PATH=socket_path)
+        server = subprocess.Popen([sys.executable, "-m", "app.embedding_server"], env=env)
+        wait_for_socket(socket_path)
+    
+    ready = ctx.Barrier(workers + 1)
+    start = ctx.Barrier(workers + 1)
+    counts = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(mode, socket_path, ready, start, seconds, batch, counts))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    
+    ready.wait()
+    start.wait()
+    total = sum(counts.get() for _ in procs)
+    
+    pids = [p.pid for p in procs] + ([server.pid] if server else [])
+    mem = [memory_kb(pid) for pid in pids]
+    start.wait()
+    for p in procs:
+        p.join()
+    if server:
+        server.terminate()
+        server.wait()
+    
+    return {
+        "mode": mode,
+        "workers": workers,
+        "texts_per_sec": round(total / seconds, 1),
+        "total_rss_mb": round(sum(m["rss_kb"] for m in mem) / 1024, 1),
+        "total_pss_mb": round(sum(m["pss_kb"] for m in mem) / 1024, 1),
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--batch", type=int, default=1, help="texts per encode call (1 = /ask)")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+    
+    results = []
+    for workers in args.workers:
+        for mode in ("local", "remote"):
+            result = run(mode, workers, args.seconds, args.batch)
+            print(
+                f"{mode:>6} x{workers}: {result['texts_per_sec']:>8} texts/s  "
+                f"RSS {result['total_rss_mb']:>8} MB  PSS {result['total_pss_mb']:>8} MB"
+            )
+            results.append(result)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+End-to-end load generator for POST /ask and POST /documents.
+
+Runs in-process against the app (through httpx's ASGI transport) or, with
+a base URL, against a running deployment.
+"""
+import asyncio
+import itertools
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from benchmarks.corpus import SEED_DOCUMENTS, QUERIES
+from benchmarks.stats import summarize
+
+RequestFactory = Callable[[int], Tuple[str, str, Dict[str, Any]]]
+
+
+def make_client(app=None, base_url: Optional[str] = None) -> httpx.AsyncClient:
+    if base_url:
+        return httpx.AsyncClient(base_url=base_url, timeout=60)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+
+async def setup_tenant(client: httpx.AsyncClient) -> int:
+    """Create a fresh tenant and ingest the seed documents"""
+    slug = f"bench-{uuid.uuid4().hex[:8]}"
+    response = await client.post("/tenants", json={"name": "Bench Corp", "slug": slug})
+    response.raise_for_status()
+    tenant_id = response.json()["id"]
+    for doc in SEED_DOCUMENTS:
+        response = await client.post("/documents", json=doc, headers={"X-Tenant-ID": str(tenant_id)})
+        response.raise_for_status()
+    return tenant_id
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    make_request: RequestFactory,
+    concurrency: int,
+    seconds: float
+) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` callers issue requests back to back"""
+    latencies = []
+    errors = 0
+    counter = itertools.count()
+    deadline = time.perf_counter() + seconds
+    
+    async def caller():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, path, kwargs = make_request(next(counter))
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    result = summarize(latencies, time.perf_counter() - start)
+    result["errors"] = errors
+    result["concurrency"] = concurrency
+    return result
+
+
+async def run_scenarios(client: httpx.AsyncClient, concurrency: int, seconds: float) -> Dict[str, Dict[str, Any]]:
+    tenant_id = await setup_tenant(client)
+    headers = {"X-Tenant-ID": str(tenant_id)}
+    
+    def ask_cached(i: int):
+        # A handful of popular questions, so nearly every call is a cache hit
+        return "POST", "/ask", {"json": {"question": QUERIES[i % len(QUERIES)]}, "headers": headers}
+    
+    def ask_uncached(i: int):
+        question = f"{QUERIES[i % len(QUERIES)]} (variant {uuid.uuid4().hex[:8]})"
+        return "POST", "/ask", {"json": {"question": question}, "headers": headers}
+    
+    def ingest(i: int):
+        doc = SEED_DOCUMENTS[i % len(SEED_DOCUMENTS)]
+        body = dict(doc, title=f"{doc['title']} {i}", content=f"{doc['content']}\n\nRevision {uuid.uuid4()}.")
+        return "POST", "/documents", {"json": body, "headers": headers}
+    
+    return {
+        "ask_cached": await run_load(client, ask_cached, concurrency, seconds),
+        "ask_uncached": await run_load(client, ask_uncached, concurrency, seconds),
+        "documents_ingest": await run_load(client, ingest, concurrency, seconds),
+    }
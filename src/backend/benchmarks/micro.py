@@ -0,0 +1,46 @@
+"""
+Micro-benchmarks for the hot functions of the RAG pipeline.
+"""
+from typing import Any, Dict
+
+from app.services.document_service import DocumentService
+from app.services.llm_service import LLMService
+from benchmarks.corpus import SEED_DOCUMENTS, QUERIES
+from benchmarks.stats import run_micro
+
+# Vector-only tenant, kept apart from the tenant the load test creates
+BENCH_TENANT_ID = 999999
+
+
+def large_document(target_chars: int = 50_000) -> str:
+    """Seed documents repeated up to roughly target_chars"""
+    body = "\n\n".join(doc["content"] for doc in SEED_DOCUMENTS)
+    return "\n\n".join([body] * (target_chars // len(body) + 1))
+
+
+def run(vector_service, seconds: float, search_chunks: int = 500) -> Dict[str, Dict[str, Any]]:
+    doc_service = DocumentService()
+    llm_service = LLMService()
+    document = large_document()
+    chunks = doc_service.chunk_document(document, "Bench Document")
+    texts = [chunk["content"] for chunk in chunks][:32]
+    
+    # Populate the tenant collection once for search
+    corpus = (chunks * (search_chunks // len(chunks) + 1))[:search_chunks]
+    corpus = [dict(chunk, chunk_index=i) for i, chunk in enumerate(corpus)]
+    vector_service.upsert_chunks(tenant_id=BENCH_TENANT_ID, document_id=1, chunks=corpus)
+    context = vector_service.search(BENCH_TENANT_ID, QUERIES[0], top_k=5, score_threshold=0.0)
+    
+    query_index = [0]
+    
+    def search():
+        query = QUERIES[query_index[0] % len(QUERIES)]
+        query_index[0] += 1
+        vector_service.search(BENCH_TENANT_ID, query, top_k=5, score_threshold=0.3)
+    
+    return {
+        "chunk_document_50kb": run_micro(lambda: doc_service.chunk_document(document, "Bench Document"), seconds),
+        "embed_texts_x32": run_micro(lambda: vector_service.embed_texts(texts), seconds, ops_per_call=len(texts)),
+        f"search_{search_chunks}_chunks": run_micro(search, seconds),
+        "build_user_prompt_5_chunks": run_micro(lambda: llm_service.build_user_prompt(QUERIES[0], context), seconds),
+    }
@@ -0,0 +1,160 @@
+"""
+Large-document ingest: one waited upsert per job vs batched parallel writes.
+
+Embeds and stores a document of --chunks chunks the way POST /documents
+does (EMBEDDING_BULK_BATCH chunks per job) in two modes:
+
+- sequential: each job's points go in one upsert with wait=True, as before
+- batched: QDRANT_UPSERT_BATCH points per upsert, QDRANT_UPSERT_PARALLEL in
+  flight, wait=False, and one flush_writes barrier at the end
+
+    cd src/backend
+    python -m benchmarks.qdrant_ingest --chunks 5000
+    python -m benchmarks.qdrant_ingest --qdrant-url http://localhost:6333 [--grpc]
+
+Without --qdrant-url the in-memory client sits behind a simulated network:
+--rtt-ms per request and --apply-us per point of server-side apply time,
+which waited writes pay inline and unwaited ones overlap with embedding.
+Those numbers show the mechanism; absolute gains need a real Qdrant.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+from benchmarks.corpus import SEED_DOCUMENTS
+
+BENCH_TENANT_ID = 10_000_001
+
+
+class SimulatedNetwork:
+    """In-memory Qdrant client with request latency and an apply queue"""
+    
+    def __init__(self, client, rtt_s: float, apply_s_per_point: float):
+        self.client = client
+        self.rtt_s = rtt_s
+        self.apply_s_per_point = apply_s_per_point
+        self._applied_at = 0.0
+        # The local client is not thread-safe
+        self._lock = threading.Lock()
+    
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+    
+    def _settle(self, points: int, wait: bool):
+        with self._lock:
+            self._applied_at = max(time.perf_counter(), self._applied_at) + points * self.apply_s_per_point
+            applied_at = self._applied_at
+        time.sleep(self.rtt_s)
+        if wait:
+            time.sleep(max(0.0, applied_at - time.perf_counter()))
+    
+    def upsert(self, collection_name, points, wait=True, **kwargs):
+        with self._lock:
+            result = self.client.upsert(collection_name=collection_name, points=points, wait=wait, **kwargs)
+        self._settle(len(points), wait)
+        return result
+    
+    def delete(self, collection_name, points_selector, wait=True, **kwargs):
+        with self._lock:
+            result = self.client.delete(collection_name=collection_name, points_selector=points_selector, **kwargs)
+        self._settle(0, wait)
+        return result
+
+
+def document_chunks(count: int) -> List[Dict[str, Any]]:
+    from app.services.document_service import DocumentService
+    doc_service = DocumentService()
+    base = [
+        chunk["content"]
+        for doc in SEED_DOCUMENTS
+        for chunk in doc_service.chunk_document(doc["content"], doc["title"])
+    ]
+    return [
+        {"content": f"{base[i % len(base)]} ({i})", "chunk_index": i, "document_title": "Large document"}
+        for i in range(count)
+    ]
+
+
+def ingest(vector_service, chunks: List[Dict[str, Any]], document_id: int, deferred: bool) -> float:
+    from app.config import settings
+    start = time.perf_counter()
+    with vector_service.document_writes(BENCH_TENANT_ID, document_id):
+        for begin in range(0, len(chunks), settings.EMBEDDING_BULK_BATCH):
+            vector_service.upsert_chunks(
+                BENCH_TENANT_ID, document_id, chunks[begin:begin + settings.EMBEDDING_BULK_BATCH],
+                wait_for_write=not deferred
+            )
+        if deferred:
+            vector_service.flush_writes(BENCH_TENANT_ID, document_id)
+    return time.perf_counter() - start
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Qdrant ingest write path benchmark")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--encoder", choices=["model", "hashing"], default="hashing")
+    parser.add_argument("--qdrant-url", help="benchmark a real Qdrant instead of the simulated one")
+    parser.add_argument("--grpc", action="store_true", help="with --qdrant-url, use gRPC")
+    parser.add_argument("--rtt-ms", type=float, default=1.0)
+    parser.add_argument("--apply-us", type=float, default=50.0)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+    
+    from benchmarks import standins
+    standins.configure()
+    from app.config import settings
+    from app.services.vector_backends import QdrantBackend, collection_name
+    
+    encoder = standins.load_encoder(args.encoder)
+    chunks = document_chunks(args.chunks)
+    results = {}
+    for mode in ("sequential", "batched"):
+        if args.qdrant_url:
+            settings.QDRANT_URL = args.qdrant_url
+            settings.QDRANT_PREFER_GRPC = args.grpc
+            backend = QdrantBackend()
+            backend.connect()
+        else:
+            from qdrant_client import QdrantClient
+            backend = QdrantBackend(SimulatedNetwork(QdrantClient(":memory:"), args.rtt_ms / 1000, args.apply_us / 1e6))
+        
+        defaults = settings.QDRANT_UPSERT_BATCH, settings.QDRANT_UPSERT_PARALLEL
+        if mode == "sequential":
+            # The previous write path: each job's points in one waited request
+            settings.QDRANT_UPSERT_BATCH, settings.QDRANT_UPSERT_PARALLEL = settings.EMBEDDING_BULK_BATCH, 1
+        try:
+            vector_service = standins.build_vector_service(encoder)
+            vector_service.backend = backend
+            vector_service.ensure_collection(BENCH_TENANT_ID)
+            elapsed = ingest(vector_service, chunks, document_id=1, deferred=mode == "batched")
+        finally:
+            settings.QDRANT_UPSERT_BATCH, settings.QDRANT_UPSERT_PARALLEL = defaults
+        
+        stored = backend.client.count(collection_name(BENCH_TENANT_ID)).count
+        results[mode] = {
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(len(chunks) / elapsed, 1),
+            "stored": stored,
+        }
+        backend.client.delete_collection(collection_name(BENCH_TENANT_ID))
+    
+    results["speedup"] = round(results["sequential"]["seconds"] / results["batched"]["seconds"], 2)
+    print(json.dumps({
+        "chunks": len(chunks),
+        "target": args.qdrant_url or f"simulated (rtt {args.rtt_ms} ms, apply {args.apply_us} us/point)",
+        "transport": "grpc" if args.grpc and args.qdrant_url else "rest",
+        "upsert_batch": settings.QDRANT_UPSERT_BATCH,
+        "upsert_parallel": settings.QDRANT_UPSERT_PARALLEL,
+        **results,
+    }, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Offline retrieval quality-vs-latency evaluation.
+
+Takes a labelled dataset of documents and question -> relevant document
+pairs per tenant, ingests it with each chunk size, and sweeps top_k,
+score_threshold and hnsw_ef through VectorService.search. Reports
+recall@k, MRR and search latency per configuration.
+
+    cd src/backend
+    python -m benchmarks.retrieval_eval --generate eval_dataset.json
+    python -m benchmarks.retrieval_eval eval_dataset.json --top-k 3 5 10 \\
+        --thresholds 0.0 0.3 0.5 --chunk-sizes 300 500 800
+
+Dataset format:
+    {"tenants": [{"tenant_id": 1,
+                  "documents": [{"title": ..., "content": ..., "source": ...}],
+                  "questions": [{"question": ..., "relevant": ["<document title>"]}]}]}
+
+The in-memory Qdrant used by default searches exhaustively, so hnsw_ef
+only changes results with --qdrant-url pointing at a real Qdrant. Eval
+collections there use tenant ids offset by EVAL_TENANT_OFFSET and are
+dropped afterwards.
+"""
+import argparse
+import itertools
+import json
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.corpus import SEED_DOCUMENTS
+from benchmarks.stats import percentile
+
+EVAL_TENANT_OFFSET = 10_000_000
+
+
+def generate_synthetic_dataset() -> Dict[str, Any]:
+    """Two questions per seed-document section, labelled with that document"""
+    questions = []
+    for doc in SEED_DOCUMENTS:
+        for section in re.split(r"\n\n(?=# )", doc["content"]):
+            heading, _, body = section.partition("\n\n")
+            topic = heading.lstrip("# ").strip().lower()
+            if topic.endswith(" policy"):
+                topic = topic[:-len(" policy")]
+            sentences = [s.strip() for s in body.split(". ") if s.strip()]
+            questions.append({"question": f"What is the policy on {topic}?", "relevant": [doc["title"]]})
+            if len(sentences) > 1:
+                # Taken from mid-section so the heading alone does not give it away
+                words = sentences[1].rstrip(".").split()
+                questions.append({"question": f"Is it true that {' '.join(words[:10]).lower()}?", "relevant": [doc["title"]]})
+    return {"tenants": [{"tenant_id": 1, "documents": SEED_DOCUMENTS, "questions": questions}]}
+
+
+def ingest(vector_service, doc_service, tenant: Dict[str, Any], tenant_id: int) -> Dict[int, str]:
+    """Chunk and upsert a tenant's documents; returns document_id -> title"""
+    titles = {}
+    for document_id, doc in enumerate(tenant["documents"], start=1):
+        chunks = doc_service.chunk_document(doc["content"], doc["title"])
+        vector_service.upsert_chunks(tenant_id=tenant_id, document_id=document_id, chunks=chunks)
+        titles[document_id] = doc["title"]
+    return titles
+
+
+def evaluate(vector_service, questions: List[Dict[str, Any]], tenant_id: int, titles: Dict[int, str],
+             top_k: int, score_threshold: float, hnsw_ef: Optional[int]) -> Dict[str, Any]:
+    hits = 0
+    reciprocal_ranks = []
+    latencies = []
+    returned = 0
+    for item in questions:
+        relevant = set(item["relevant"])
+        start = time.perf_counter()
+        results = vector_service.search(tenant_id, item["question"], top_k=top_k,
+                                        score_threshold=score_threshold, hnsw_ef=hnsw_ef)
+        latencies.append(time.perf_counter() - start)
+        returned += len(results)
+        
+        rank = next(
+            (i for i, hit in enumerate(results, start=1) if titles.get(hit["document_id"]) in relevant),
+            None
+        )
+        hits += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    
+    ordered = sorted(latencies)
+    return {
+        "recall_at_k": round(hits / len(questions), 4),
+        "mrr": round(sum(reciprocal_ranks) / len(questions), 4),
+        "avg_results": round(returned / len(questions), 2),
+        "latency_p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "latency_p95_ms": round(percentile(ordered, 95) * 1000, 3),
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Retrieval quality-vs-latency evaluation")
+    parser.add_argument("dataset", nargs="?", help="labelled dataset JSON (default: synthetic)")
+    parser.add_argument("--generate", metavar="PATH", help="write the synthetic dataset and exit")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.3])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[500])
+    parser.add_argument("--hnsw-ef", type=int, nargs="+", default=[0], help="0 = collection default")
+    parser.add_argument("--encoder", choices=["model", "hashing"], default="model")
+    parser.add_argument("--qdrant-url", help="evaluate against a real Qdrant instead of in-memory")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+    
+    if args.generate:
+        with open(args.generate, "w") as f:
+            json.dump(generate_synthetic_dataset(), f, indent=2)
+        print(f"Wrote synthetic dataset to {args.generate}")
+        return 0
+    
+    from benchmarks import standins
+    standins.configure()
+    from app.services.document_service import DocumentService
+    
+    if args.dataset:
+        with open(args.dataset) as f:
+            dataset = json.load(f)
+    else:
+        dataset = generate_synthetic_dataset()
+    
+    encoder = standins.load_encoder(args.encoder)
+    results = []
+    for chunk_size in args.chunk_sizes:
+        vector_service = standins.build_vector_service(encoder)
+        tenant_offset = 0
+        if args.qdrant_url:
+            from qdrant_client import QdrantClient
+            from app.services.vector_backends import QdrantBackend
+            vector_service.backend = QdrantBackend(QdrantClient(url=args.qdrant_url))
+            tenant_offset = EVAL_TENANT_OFFSET
+        doc_service = DocumentService()
+        doc_service.chunk_size = chunk_size
+        
+        for tenant in dataset["tenants"]:
+            tenant_id = tenant["tenant_id"] + tenant_offset
+            titles = ingest(vector_service, doc_service, tenant, tenant_id)
+            for top_k, threshold, hnsw_ef in itertools.product(args.top_k, args.thresholds, args.hnsw_ef):
+                metrics = evaluate(vector_service, tenant["questions"], tenant_id, titles,
+                                   top_k, threshold, hnsw_ef or None)
+                config = {
+                    "tenant_id": tenant["tenant_id"],
+                    "chunk_size": chunk_size,
+                    "top_k": top_k,
+                    "score_threshold": threshold,
+                    "hnsw_ef": hnsw_ef or None,
+                }
+                results.append({**config, **metrics})
+            if args.qdrant_url:
+                vector_service.backend.client.delete_collection(f"tenant_{tenant_id}")
+    
+    print(f"{'tenant':>6}{'chunk':>7}{'top_k':>7}{'thresh':>8}{'ef':>6}{'recall@k':>10}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for r in results:
+        print(
+            f"{r['tenant_id']:>6}{r['chunk_size']:>7}{r['top_k']:>7}{r['score_threshold']:>8}"
+            f"{str(r['hnsw_ef'] or '-'):>6}{r['recall_at_k']:>10}{r['mrr']:>8}"
+            f"{r['latency_p50_ms']:>9}{r['latency_p95_ms']:>9}"
+        )
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
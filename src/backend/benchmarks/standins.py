@@ -0,0 +1,160 @@
+"""
+Local stand-ins for the benchmark suite: SQLite (or a local Postgres),
+fakeredis and an in-memory Qdrant (or the embedded local vector index),
+wired into the real FastAPI app.
+
+configure() must run before anything imports app.config, because the
+database engine is created from settings at import time.
+"""
+import functools
+import hashlib
+import os
+import tempfile
+import threading
+from typing import List, Optional, Union
+
+import numpy as np
+
+
+def configure(database_url: Optional[str] = None) -> str:
+    """Point the app at a throwaway database and permissive limits"""
+    if database_url is None:
+        database_url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000000")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    return database_url
+
+
+class HashingEncoder:
+    """Deterministic, model-free encoder for when sentence-transformers is unavailable"""
+    
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+    
+    def _vector(self, text: str) -> np.ndarray:
+        # Bag of hashed tokens, so texts sharing words score as similar
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in text.lower().split():
+            digest = hashlib.md5(token.strip(".,?!:#").encode()).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self._vector(sentences)
+        return np.array([self._vector(s) for s in sentences], dtype=np.float32).reshape(-1, self.dimension)
+
+
+def load_encoder(kind: str):
+    """'model' loads EMBEDDING_MODEL; 'hashing' uses the model-free stand-in"""
+    from app.config import settings
+    if kind == "model":
+        from app.services.embedding_backends import load_encoder as load_model
+        return load_model()
+    return HashingEncoder(settings.EMBEDDING_DIMENSION)
+
+
+def create_schema(engine=None):
+    """Create tables (in the app's database by default), mapping Postgres-only column types onto SQLite equivalents"""
+    from sqlalchemy import ARRAY, JSON, Uuid
+    from sqlalchemy.dialects.postgresql import JSONB, UUID
+    from app.database import Base
+    from app import models  # noqa: F401 - registers the tables
+    
+    if engine is None:
+        from app.database import engine
+    if engine.dialect.name == "sqlite":
+        for table in Base.metadata.tables.values():
+            for column in table.columns:
+                if isinstance(column.type, UUID):
+                    column.type = Uuid()
+                elif isinstance(column.type, (JSONB, ARRAY)):
+                    column.type = JSON()
+    Base.metadata.create_all(engine)
+
+
+class LockedClient:
+    """
+    Serializes calls into an in-memory QdrantClient, which is not
+    thread-safe; the app calls it from the embedding executor and the
+    vector write pool at once.
+    """
+    
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+    
+    def __getattr__(self, name: str):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+        
+        @functools.wraps(attribute)
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return locked
+
+
+def build_backend(kind: str = "qdrant"):
+    """In-memory Qdrant, or the embedded local index in a temporary directory"""
+    from app.services.vector_backends import LocalBackend, QdrantBackend
+    if kind == "local":
+        backend = LocalBackend(tempfile.mkdtemp(prefix="vectors-"))
+        backend.connect()
+        return backend
+    from qdrant_client import QdrantClient
+    return QdrantBackend(LockedClient(QdrantClient(":memory:")))
+
+
+def build_vector_service(encoder, backend: str = "qdrant"):
+    from app.services.vector_service import VectorService
+    
+    vector_service = VectorService()
+    vector_service.backend = build_backend(backend)
+    vector_service.encoder = encoder
+    vector_service.ready = True
+    return vector_service
+
+
+def build_cache_service():
+    import fakeredis
+    from app.services.cache_service import CacheService
+    
+    cache_service = CacheService()
+    server = fakeredis.FakeServer()
+    cache_service.client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    cache_service.binary_client = fakeredis.FakeRedis(server=server)
+    return cache_service
+
+
+def build_app(encoder, backend: str = "qdrant", engine=None):
+    """The real app with stand-in services attached; lifespan is not run"""
+    from app.main import app
+    from app.services.tenant_service import TenantService
+    from app.services.tiering_service import TieringService
+    from app.services.extraction_service import ExtractionService
+    from app.services.embedding_executor import EmbeddingExecutor
+    from app.services.usage_service import UsageService
+    from app.services.cache_warmer import CacheWarmer
+    
+    create_schema(engine)
+    app.state.vector_service = build_vector_service(encoder, backend)
+    app.state.cache_service = build_cache_service()
+    app.state.tenant_service = TenantService()
+    app.state.usage_service = UsageService()
+    app.state.extraction_service = ExtractionService()
+    app.state.embedding_executor = EmbeddingExecutor()
+    app.state.tiering_service = TieringService(app.state.cache_service.client, app.state.vector_service)
+    app.state.cache_warmer = CacheWarmer(
+        app.state.cache_service, app.state.vector_service, app.state.tenant_service,
+        app.state.tiering_service, app.state.embedding_executor
+    )
+    app.state.startup_timings = {}
+    app.state.startup_error = None
+    return app
@@ -0,0 +1,77 @@
+"""
+Timing, memory and baseline helpers shared by the benchmark suite.
+"""
+import json
+import math
+import resource
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+
+def summarize(latencies_s: List[float], elapsed_s: float, ops_per_call: int = 1) -> Dict[str, float]:
+    """Throughput and latency percentiles (ms) for a run"""
+    ordered = sorted(latencies_s)
+    return {
+        "calls": len(ordered),
+        "ops_per_sec": round(len(ordered) * ops_per_call / elapsed_s, 2) if elapsed_s else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (Linux reports KiB)"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_micro(func: Callable[[], Any], seconds: float, ops_per_call: int = 1, warmup: int = 3) -> Dict[str, float]:
+    """Call func repeatedly for about `seconds`, tracking Python heap peak"""
+    for _ in range(warmup):
+        func()
+    latencies = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        call_start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = summarize(latencies, elapsed, ops_per_call)
+    result["heap_peak_kb"] = round(heap_peak / 1024, 1)
+    return result
+
+
+def save_baseline(path: str, results: Dict[str, Any]):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def compare_baseline(path: str, results: Dict[str, Any], tolerance: float) -> List[str]:
+    """Benchmarks whose throughput dropped or p95 rose by more than tolerance"""
+    with open(path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, current in results.get("benchmarks", {}).items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous:
+            continue
+        if previous["ops_per_sec"] and current["ops_per_sec"] < previous["ops_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['ops_per_sec']} -> {current['ops_per_sec']} ops/s"
+            )
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+    return regressions
@@ -0,0 +1,173 @@
+"""
+Two-stage (coarse + rescore) search against single-stage search.
+
+Loads one collection with full vectors only and one with full plus coarse
+vectors, then runs the same queries through QdrantBackend.search and
+search_two_stage with truncated and PCA-fitted coarse vectors at several
+oversampling factors. Reports recall@k against exact (brute-force) top-k
+and search latency.
+
+    cd src/backend
+    python -m benchmarks.two_stage --points 20000 --queries 200
+    python -m benchmarks.two_stage --qdrant-url http://localhost:6333 --points 200000
+
+The corpus is synthetic: clustered vectors with a decaying spectrum under a
+random rotation, which is the shape sentence-embedding sets have (most
+variance in a few dozen directions, none of them axis-aligned). Real
+embeddings can be exported and passed with --vectors (a .npy file). The
+in-memory Qdrant used by default searches exhaustively, so its latencies
+show the cost of scoring 384 vs 64 dimensions, not HNSW behaviour; use
+--qdrant-url for those. Collections there use tenant ids offset by
+EVAL_TENANT_OFFSET and are dropped afterwards.
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.retrieval_eval import EVAL_TENANT_OFFSET
+from benchmarks.stats import percentile
+
+SINGLE_TENANT = 1
+TWO_STAGE_TENANT = 2
+UPSERT_BATCH = 1000
+
+
+def synthetic_vectors(count: int, dimension: int, seed: int = 7) -> np.ndarray:
+    """Clustered, anisotropic, unit-normalised vectors"""
+    rng = np.random.default_rng(seed)
+    spectrum = 1.0 / np.sqrt(np.arange(1, dimension + 1))
+    rotation, _ = np.linalg.qr(rng.standard_normal((dimension, dimension)))
+    centres = rng.standard_normal((max(count // 200, 8), dimension)) * spectrum
+    points = centres[rng.integers(len(centres), size=count)] + 0.5 * rng.standard_normal((count, dimension)) * spectrum
+    points = (points @ rotation).astype(np.float32)
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> List[set]:
+    scores = queries @ vectors.T
+    return [set(np.argpartition(-row, top_k)[:top_k].tolist()) for row in scores]
+
+
+def load(backend, vectors: np.ndarray, projection, tenant_offset: int):
+    from app.services.vector_backends import collection_name
+    dimension = vectors.shape[1]
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(len(vectors))]
+    payloads = [{"tenant_id": None, "row": i} for i in range(len(vectors))]
+    for tenant_id, coarse_dimension in ((SINGLE_TENANT, None), (TWO_STAGE_TENANT, projection.coarse_dimension)):
+        tenant_id += tenant_offset
+        if backend.collection_exists(tenant_id):
+            backend.client.delete_collection(collection_name(tenant_id))
+        backend.ensure_collection(tenant_id, dimension, coarse_dimension)
+        for start in range(0, len(vectors), UPSERT_BATCH):
+            batch = vectors[start:start + UPSERT_BATCH]
+            backend.upsert(
+                tenant_id,
+                ids[start:start + UPSERT_BATCH],
+                batch.tolist(),
+                [{**payload, "tenant_id": tenant_id} for payload in payloads[start:start + UPSERT_BATCH]],
+                projection.apply(batch).tolist() if coarse_dimension else None
+            )
+
+
+def measure(search, queries: np.ndarray, truth: List[set], top_k: int) -> Dict[str, Any]:
+    latencies, found = [], 0
+    for query, relevant in zip(queries, truth):
+        start = time.perf_counter()
+        hits = search(query)
+        latencies.append(time.perf_counter() - start)
+        found += len(relevant & {payload["row"] for _, payload in hits})
+    ordered = sorted(latencies)
+    return {
+        "recall_at_k": round(found / (len(queries) * top_k), 4),
+        "latency_p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "latency_p95_ms": round(percentile(ordered, 95) * 1000, 3),
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Two-stage vs single-stage vector search")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vectors", help=".npy matrix of real embeddings instead of the synthetic corpus")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--coarse-dim", type=int, default=64)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--oversampling", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--hnsw-ef", type=int, help="for the HNSW searches of both modes")
+    parser.add_argument("--qdrant-url", help="benchmark a real Qdrant instead of in-memory")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+    
+    from benchmarks import standins
+    standins.configure()
+    from app.services.coarse_projection import CoarseProjection
+    from app.services.vector_backends import collection_name
+    
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    else:
+        vectors = synthetic_vectors(args.points + args.queries, args.dimension)
+    # Held-out queries, near (but not in) the corpus
+    rng = np.random.default_rng(11)
+    queries = vectors[-args.queries:] + 0.05 * rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    vectors = vectors[:-args.queries]
+    truth = exact_top_k(vectors, queries, args.top_k)
+    
+    tenant_offset = 0
+    backend = standins.build_backend("qdrant")
+    if args.qdrant_url:
+        from qdrant_client import QdrantClient
+        from app.services.vector_backends import QdrantBackend
+        backend = QdrantBackend(QdrantClient(url=args.qdrant_url, timeout=300))
+        tenant_offset = EVAL_TENANT_OFFSET
+    
+    truncate = CoarseProjection.truncate(vectors.shape[1], args.coarse_dim)
+    pca = CoarseProjection.fit_pca(vectors[:20000], args.coarse_dim)
+    load(backend, vectors, truncate, tenant_offset)
+    single_id, two_stage_id = SINGLE_TENANT + tenant_offset, TWO_STAGE_TENANT + tenant_offset
+    
+    results = {"single_stage": measure(
+        lambda q: backend.search(single_id, q.tolist(), args.top_k, 0.0, hnsw_ef=args.hnsw_ef),
+        queries, truth, args.top_k
+    )}
+    for projection in (truncate, pca):
+        if projection is pca:
+            for start in range(0, len(vectors), UPSERT_BATCH):
+                backend.set_coarse_vectors(
+                    two_stage_id,
+                    [str(uuid.UUID(int=i + 1)) for i in range(start, min(start + UPSERT_BATCH, len(vectors)))],
+                    pca.apply(vectors[start:start + UPSERT_BATCH]).tolist()
+                )
+        for oversampling in args.oversampling:
+            results[f"two_stage.{projection.method}.x{oversampling}"] = measure(
+                lambda q: backend.search_two_stage(
+                    two_stage_id, q.tolist(), projection.apply(q).tolist(), args.top_k, 0.0,
+                    candidates=args.top_k * oversampling, hnsw_ef=args.hnsw_ef
+                ),
+                queries, truth, args.top_k
+            )
+    
+    if args.qdrant_url:
+        for tenant_id in (single_id, two_stage_id):
+            backend.client.delete_collection(collection_name(tenant_id))
+    
+    print(f"{'mode':<26}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<26}{result['recall_at_k']:>10}{result['latency_p50_ms']:>10}{result['latency_p95_ms']:>10}")
+    print(f"points: {len(vectors)}, dimension: {vectors.shape[1]} -> {args.coarse_dim}, "
+          f"PCA explained variance: {pca.explained_variance:.3f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
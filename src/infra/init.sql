@@ -5,6 +5,11 @@ CREATE TABLE IF NOT EXISTS tenants (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
     slug VARCHAR(100) UNIQUE NOT NULL,
+    tier VARCHAR(50) NOT NULL DEFAULT 'standard'
+        CHECK (tier IN ('free', 'standard', 'enterprise')),
+    retrieval_profile JSONB,
+    -- Audit rows are kept this long; one of retention_classes() below
+    retention_months SMALLINT NOT NULL DEFAULT 12 CHECK (retention_months IN (1, 3, 6, 12, 24)),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     is_active BOOLEAN DEFAULT TRUE
@@ -15,14 +20,17 @@ CREATE TABLE IF NOT EXISTS documents (
     id SERIAL PRIMARY KEY,
     tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
     title VARCHAR(500) NOT NULL,
-    content TEXT NOT NULL,
+    content TEXT,
+    -- Large documents keep their body gzip-compressed on disk instead
+    content_ref VARCHAR(500),
     source VARCHAR(500),
     content_hash VARCHAR(64) NOT NULL,
     chunk_count INTEGER DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     is_active BOOLEAN DEFAULT TRUE,
-    CONSTRAINT unique_doc_per_tenant UNIQUE (tenant_id, content_hash)
+    CONSTRAINT unique_doc_per_tenant UNIQUE (tenant_id, content_hash),
+    CONSTRAINT document_body CHECK (content IS NOT NULL OR content_ref IS NOT NULL)
 );
 
 -- Document chunks table (for RAG)
@@ -36,23 +44,151 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- AI Requests table (audit trail)
+-- Audit tables (ai_requests, ai_results, audit_logs) are partitioned by
+-- month on created_at, and each month by LIST on the retention_months copied
+-- from the tenant at insert. Retention is enforced by dropping a month's
+-- partition for a retention class once it has expired, never by DELETE.
+CREATE OR REPLACE FUNCTION retention_classes() RETURNS SMALLINT[] AS $$
+    SELECT ARRAY[1, 3, 6, 12, 24]::SMALLINT[]
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Create monthly partitions from from_month (or the oldest month waiting in
+-- the DEFAULT partition) through months_ahead months past the current one;
+-- returns how many months were added. Rows inserted while maintenance was
+-- behind land in <parent>_default and are moved into their month here.
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, from_month DATE, months_ahead INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    default_table TEXT := parent || '_default';
+    month_start DATE := date_trunc('month', from_month)::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    oldest_default DATE;
+    month_end DATE;
+    month_table TEXT;
+    has_default_rows BOOLEAN;
+    retention SMALLINT;
+    created INTEGER := 0;
+BEGIN
+    -- Serialise concurrent maintenance from several API workers
+    PERFORM pg_advisory_xact_lock(hashtext('partition_maintenance'));
+    IF to_regclass(default_table) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF %I DEFAULT PARTITION BY LIST (retention_months)',
+            default_table, parent
+        );
+        FOREACH retention IN ARRAY retention_classes() LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES IN (%s)',
+                default_table || '_r' || retention, default_table, retention
+            );
+        END LOOP;
+    END IF;
+    EXECUTE format('SELECT date_trunc(''month'', min(created_at))::date FROM %I', default_table) INTO oldest_default;
+    IF oldest_default < month_start THEN
+        month_start := oldest_default;
+    END IF;
+    WHILE month_start <= last_month LOOP
+        month_table := parent || '_' || to_char(month_start, '"y"YYYY"m"MM');
+        month_end := (month_start + interval '1 month')::date;
+        IF to_regclass(month_table) IS NULL THEN
+            EXECUTE format(
+                'SELECT EXISTS (SELECT 1 FROM %I WHERE created_at >= %L AND created_at < %L)',
+                default_table, month_start, month_end
+            ) INTO has_default_rows;
+            -- A month cannot be added while the DEFAULT partition holds rows
+            -- for it: build it detached, move the rows, then attach it
+            IF has_default_rows THEN
+                EXECUTE format(
+                    'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY LIST (retention_months)',
+                    month_table, parent
+                );
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L) PARTITION BY LIST (retention_months)',
+                    month_table, parent, month_start, month_end
+                );
+            END IF;
+            FOREACH retention IN ARRAY retention_classes() LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES IN (%s)',
+                    month_table || '_r' || retention, month_table, retention
+                );
+            END LOOP;
+            IF has_default_rows THEN
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                    default_table, month_start, month_end, month_table
+                );
+                EXECUTE format(
+                    'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    parent, month_table, month_start, month_end
+                );
+            END IF;
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop retention-class partitions whose newest possible row is older than
+-- their retention, then months left empty; returns how many were dropped.
+-- The DEFAULT partition is left alone: create_monthly_partitions empties it.
+CREATE OR REPLACE FUNCTION drop_expired_partitions(parent TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    month_table RECORD;
+    class_table RECORD;
+    month_start DATE;
+    retention INTEGER;
+    dropped INTEGER := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('partition_maintenance'));
+    FOR month_table IN
+        SELECT c.oid, c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent::regclass AND c.relname <> parent || '_default'
+    LOOP
+        month_start := to_date(right(month_table.relname, 8), '"y"YYYY"m"MM');
+        FOR class_table IN
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = month_table.oid
+        LOOP
+            retention := substring(class_table.relname FROM '_r(\d+)$')::INTEGER;
+            IF month_start + make_interval(months => 1 + retention) <= CURRENT_DATE THEN
+                EXECUTE format('DROP TABLE %I', class_table.relname);
+                dropped := dropped + 1;
+            END IF;
+        END LOOP;
+        IF NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhparent = month_table.oid) THEN
+            EXECUTE format('DROP TABLE %I', month_table.relname);
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- AI Requests table (audit trail). Partitioned tables need the partition
+-- keys in every unique constraint, so request_id is indexed, not unique,
+-- and ai_results links to it without a foreign key.
 CREATE TABLE IF NOT EXISTS ai_requests (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
-    request_id UUID UNIQUE NOT NULL,
+    request_id UUID NOT NULL,
     question TEXT NOT NULL,
     context_chunks TEXT[],
     prompt_tokens INTEGER,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     user_id VARCHAR(100),
-    ip_address VARCHAR(45)
-);
+    ip_address VARCHAR(45),
+    retention_months SMALLINT NOT NULL DEFAULT 12,
+    PRIMARY KEY (id, created_at, retention_months)
+) PARTITION BY RANGE (created_at);
 
 -- AI Results table (audit trail)
 CREATE TABLE IF NOT EXISTS ai_results (
-    id SERIAL PRIMARY KEY,
-    request_id UUID NOT NULL REFERENCES ai_requests(request_id) ON DELETE CASCADE,
+    id BIGSERIAL,
+    request_id UUID NOT NULL,
     tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
     answer TEXT NOT NULL,
     sources JSONB,
@@ -61,25 +197,82 @@ CREATE TABLE IF NOT EXISTS ai_results (
     total_tokens INTEGER,
     latency_ms INTEGER,
     was_cached BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    retention_months SMALLINT NOT NULL DEFAULT 12,
+    PRIMARY KEY (id, created_at, retention_months)
+) PARTITION BY RANGE (created_at);
 
 -- Audit log table
 CREATE TABLE IF NOT EXISTS audit_logs (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     tenant_id INTEGER REFERENCES tenants(id) ON DELETE SET NULL,
     action VARCHAR(100) NOT NULL,
     entity_type VARCHAR(100),
-    entity_id INTEGER,
+    entity_id BIGINT,
     details JSONB,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    retention_months SMALLINT NOT NULL DEFAULT 12,
+    PRIMARY KEY (id, created_at, retention_months)
+) PARTITION BY RANGE (created_at);
+
+-- The API also runs this daily (app.partitions) to keep months ahead
+SELECT create_monthly_partitions('ai_requests', CURRENT_DATE, 3);
+SELECT create_monthly_partitions('ai_results', CURRENT_DATE, 3);
+SELECT create_monthly_partitions('audit_logs', CURRENT_DATE, 3);
+
+-- Hourly usage rollups, one row per tenant, UTC hour and latency bucket
+-- (app.services.usage_service); /tenants/{id}/usage reads only this table
+CREATE TABLE IF NOT EXISTS tenant_usage_hourly (
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    hour TIMESTAMP NOT NULL,
+    latency_bucket SMALLINT NOT NULL,
+    request_count INTEGER NOT NULL DEFAULT 0,
+    cached_count INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    latency_ms_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, hour, latency_bucket)
+);
+
+-- Per-tenant projections for two-stage vector search (app.coarse_index)
+CREATE TABLE IF NOT EXISTS vector_projections (
+    tenant_id INTEGER PRIMARY KEY REFERENCES tenants(id) ON DELETE CASCADE,
+    method VARCHAR(20) NOT NULL,
+    dimension SMALLINT NOT NULL,
+    coarse_dimension SMALLINT NOT NULL,
+    components BYTEA NOT NULL,
+    mean BYTEA NOT NULL,
+    sample_size INTEGER,
+    explained_variance REAL,
+    status VARCHAR(20) NOT NULL DEFAULT 'applied',
+    fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Re-index job checkpoints (app.reindex)
+CREATE TABLE IF NOT EXISTS reindex_progress (
+    job VARCHAR(50) NOT NULL,
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    model VARCHAR(200) NOT NULL,
+    collection VARCHAR(100) NOT NULL,
+    last_chunk_id INTEGER NOT NULL DEFAULT 0,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'copying',
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    switched_at TIMESTAMP,
+    replaced_collection VARCHAR(100),
+    PRIMARY KEY (job, tenant_id)
 );
 
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_documents_tenant ON documents(tenant_id);
+CREATE INDEX IF NOT EXISTS idx_documents_tenant_active_id ON documents(tenant_id, is_active, id);
 CREATE INDEX IF NOT EXISTS idx_document_chunks_tenant ON document_chunks(tenant_id);
+CREATE INDEX IF NOT EXISTS idx_document_chunks_tenant_id ON document_chunks(tenant_id, id);
 CREATE INDEX IF NOT EXISTS idx_document_chunks_document ON document_chunks(document_id);
 CREATE INDEX IF NOT EXISTS idx_ai_requests_tenant ON ai_requests(tenant_id);
+CREATE INDEX IF NOT EXISTS idx_ai_requests_request ON ai_requests(request_id);
 CREATE INDEX IF NOT EXISTS idx_ai_requests_created ON ai_requests(created_at);
 CREATE INDEX IF NOT EXISTS idx_ai_results_tenant ON ai_results(tenant_id);
 CREATE INDEX IF NOT EXISTS idx_ai_results_request ON ai_results(request_id);
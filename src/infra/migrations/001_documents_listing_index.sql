@@ -0,0 +1,6 @@
+-- Backs keyset-paginated GET /documents (tenant_id, is_active, id DESC).
+-- init.sql already creates this index for fresh databases; run this against
+-- existing ones. CONCURRENTLY avoids blocking ingest while it builds, so it
+-- must run outside a transaction block.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_tenant_active_id
+    ON documents(tenant_id, is_active, id);
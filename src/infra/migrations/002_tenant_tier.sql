@@ -0,0 +1,2 @@
+-- Tenant tier, used to label per-tenant metrics without per-tenant cardinality.
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS tier VARCHAR(50) NOT NULL DEFAULT 'standard';
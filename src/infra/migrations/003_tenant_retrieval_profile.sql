@@ -0,0 +1,3 @@
+-- Per-tenant retrieval overrides (top_k, score_threshold, hnsw_ef, exact,
+-- quantization_rescore); NULL means the RetrievalProfile defaults.
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS retrieval_profile JSONB;
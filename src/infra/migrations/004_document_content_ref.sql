@@ -0,0 +1,6 @@
+-- Large documents store their body gzip-compressed under DOCUMENT_STORE_PATH
+-- and reference it here instead of keeping it in documents.content.
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_ref VARCHAR(500);
+ALTER TABLE documents ALTER COLUMN content DROP NOT NULL;
+ALTER TABLE documents DROP CONSTRAINT IF EXISTS document_body;
+ALTER TABLE documents ADD CONSTRAINT document_body CHECK (content IS NOT NULL OR content_ref IS NOT NULL);
@@ -0,0 +1,168 @@
+-- Partition the audit tables by month and retention class (see init.sql).
+-- Existing rows are copied into the new tables; the old ones are kept as
+-- *_legacy until the copy has been checked, then drop them by hand:
+--   DROP TABLE ai_results_legacy, ai_requests_legacy, audit_logs_legacy;
+-- Run in a maintenance window: the copy holds locks on the legacy tables.
+BEGIN;
+
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS retention_months SMALLINT NOT NULL DEFAULT 12
+    CHECK (retention_months IN (1, 3, 6, 12, 24));
+
+CREATE OR REPLACE FUNCTION retention_classes() RETURNS SMALLINT[] AS $$
+    SELECT ARRAY[1, 3, 6, 12, 24]::SMALLINT[]
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Create monthly partitions from from_month through months_ahead months
+-- past the current one; returns how many months were added.
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, from_month DATE, months_ahead INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    month_table TEXT;
+    retention SMALLINT;
+    created INTEGER := 0;
+BEGIN
+    -- Serialise concurrent maintenance from several API workers
+    PERFORM pg_advisory_xact_lock(hashtext('partition_maintenance'));
+    WHILE month_start <= last_month LOOP
+        month_table := parent || '_' || to_char(month_start, '"y"YYYY"m"MM');
+        IF to_regclass(month_table) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L) PARTITION BY LIST (retention_months)',
+                month_table, parent, month_start, (month_start + interval '1 month')::date
+            );
+            FOREACH retention IN ARRAY retention_classes() LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES IN (%s)',
+                    month_table || '_r' || retention, month_table, retention
+                );
+            END LOOP;
+            created := created + 1;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop retention-class partitions whose newest possible row is older than
+-- their retention, then months left empty; returns how many were dropped.
+CREATE OR REPLACE FUNCTION drop_expired_partitions(parent TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    month_table RECORD;
+    class_table RECORD;
+    month_start DATE;
+    retention INTEGER;
+    dropped INTEGER := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('partition_maintenance'));
+    FOR month_table IN
+        SELECT c.oid, c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent::regclass
+    LOOP
+        month_start := to_date(right(month_table.relname, 8), '"y"YYYY"m"MM');
+        FOR class_table IN
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = month_table.oid
+        LOOP
+            retention := substring(class_table.relname FROM '_r(\d+)$')::INTEGER;
+            IF month_start + make_interval(months => 1 + retention) <= CURRENT_DATE THEN
+                EXECUTE format('DROP TABLE %I', class_table.relname);
+                dropped := dropped + 1;
+            END IF;
+        END LOOP;
+        IF NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhparent = month_table.oid) THEN
+            EXECUTE format('DROP TABLE %I', month_table.relname);
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE ai_results DROP CONSTRAINT IF EXISTS ai_results_request_id_fkey;
+ALTER TABLE ai_requests RENAME TO ai_requests_legacy;
+ALTER TABLE ai_results RENAME TO ai_results_legacy;
+ALTER TABLE audit_logs RENAME TO audit_logs_legacy;
+-- Free the index names for the partitioned tables
+DROP INDEX IF EXISTS idx_ai_requests_tenant, idx_ai_requests_created,
+    idx_ai_results_tenant, idx_ai_results_request,
+    idx_audit_logs_tenant, idx_audit_logs_created;
+
+CREATE TABLE ai_requests (
+    id BIGSERIAL,
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    request_id UUID NOT NULL,
+    question TEXT NOT NULL,
+    context_chunks TEXT[],
+    prompt_tokens INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    user_id VARCHAR(100),
+    ip_address VARCHAR(45),
+    retention_months SMALLINT NOT NULL DEFAULT 12,
+    PRIMARY KEY (id, created_at, retention_months)
+) PARTITION BY RANGE (created_at);
+
+-- AI Results table (audit trail)
+CREATE TABLE ai_results (
+    id BIGSERIAL,
+    request_id UUID NOT NULL,
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    answer TEXT NOT NULL,
+    sources JSONB,
+    confidence VARCHAR(20),
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    latency_ms INTEGER,
+    was_cached BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    retention_months SMALLINT NOT NULL DEFAULT 12,
+    PRIMARY KEY (id, created_at, retention_months)
+) PARTITION BY RANGE (created_at);
+
+-- Audit log table
+CREATE TABLE audit_logs (
+    id BIGSERIAL,
+    tenant_id INTEGER REFERENCES tenants(id) ON DELETE SET NULL,
+    action VARCHAR(100) NOT NULL,
+    entity_type VARCHAR(100),
+    entity_id BIGINT,
+    details JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    retention_months SMALLINT NOT NULL DEFAULT 12,
+    PRIMARY KEY (id, created_at, retention_months)
+) PARTITION BY RANGE (created_at);
+
+SELECT create_monthly_partitions('ai_requests', COALESCE((SELECT min(created_at) FROM ai_requests_legacy)::date, CURRENT_DATE), 3);
+SELECT create_monthly_partitions('ai_results', COALESCE((SELECT min(created_at) FROM ai_results_legacy)::date, CURRENT_DATE), 3);
+SELECT create_monthly_partitions('audit_logs', COALESCE((SELECT min(created_at) FROM audit_logs_legacy)::date, CURRENT_DATE), 3);
+
+INSERT INTO ai_requests (id, tenant_id, request_id, question, context_chunks, prompt_tokens, created_at, user_id, ip_address, retention_months)
+SELECT r.id, r.tenant_id, r.request_id, r.question, r.context_chunks, r.prompt_tokens,
+       COALESCE(r.created_at, CURRENT_TIMESTAMP), r.user_id, r.ip_address, t.retention_months
+FROM ai_requests_legacy r JOIN tenants t ON t.id = r.tenant_id;
+
+INSERT INTO ai_results (id, request_id, tenant_id, answer, sources, confidence, completion_tokens, total_tokens, latency_ms, was_cached, created_at, retention_months)
+SELECT r.id, r.request_id, r.tenant_id, r.answer, r.sources, r.confidence, r.completion_tokens, r.total_tokens,
+       r.latency_ms, r.was_cached, COALESCE(r.created_at, CURRENT_TIMESTAMP), t.retention_months
+FROM ai_results_legacy r JOIN tenants t ON t.id = r.tenant_id;
+
+INSERT INTO audit_logs (id, tenant_id, action, entity_type, entity_id, details, created_at, retention_months)
+SELECT a.id, a.tenant_id, a.action, a.entity_type, a.entity_id, a.details,
+       COALESCE(a.created_at, CURRENT_TIMESTAMP), COALESCE(t.retention_months, 12)
+FROM audit_logs_legacy a LEFT JOIN tenants t ON t.id = a.tenant_id;
+
+SELECT setval(pg_get_serial_sequence('ai_requests', 'id'), COALESCE((SELECT max(id) FROM ai_requests), 0) + 1, false);
+SELECT setval(pg_get_serial_sequence('ai_results', 'id'), COALESCE((SELECT max(id) FROM ai_results), 0) + 1, false);
+SELECT setval(pg_get_serial_sequence('audit_logs', 'id'), COALESCE((SELECT max(id) FROM audit_logs), 0) + 1, false);
+
+CREATE INDEX IF NOT EXISTS idx_ai_requests_tenant ON ai_requests(tenant_id);
+CREATE INDEX IF NOT EXISTS idx_ai_requests_request ON ai_requests(request_id);
+CREATE INDEX IF NOT EXISTS idx_ai_requests_created ON ai_requests(created_at);
+CREATE INDEX IF NOT EXISTS idx_ai_results_tenant ON ai_results(tenant_id);
+CREATE INDEX IF NOT EXISTS idx_ai_results_request ON ai_results(request_id);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_tenant ON audit_logs(tenant_id);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_created ON audit_logs(created_at);
+
+COMMIT;
@@ -0,0 +1,36 @@
+-- Hourly per-tenant usage rollups served by GET /tenants/{id}/usage.
+-- New requests are added by the API; existing ai_results rows are backfilled
+-- once here. Bucket bounds must match LATENCY_BUCKETS_MS. Rollup hours are
+-- UTC, while created_at holds CURRENT_TIMESTAMP in the server's TimeZone, so
+-- the backfill converts it first.
+CREATE TABLE IF NOT EXISTS tenant_usage_hourly (
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    hour TIMESTAMP NOT NULL,
+    latency_bucket SMALLINT NOT NULL,
+    request_count INTEGER NOT NULL DEFAULT 0,
+    cached_count INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    latency_ms_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, hour, latency_bucket)
+);
+
+INSERT INTO tenant_usage_hourly (
+    tenant_id, hour, latency_bucket, request_count, cached_count,
+    prompt_tokens, completion_tokens, total_tokens, latency_ms_sum
+)
+SELECT r.tenant_id,
+       date_trunc('hour', (r.created_at AT TIME ZONE current_setting('TimeZone')) AT TIME ZONE 'UTC'),
+       (SELECT count(*) FROM unnest(ARRAY[50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]) AS bound
+        WHERE bound < COALESCE(r.latency_ms, 0)),
+       count(*),
+       count(*) FILTER (WHERE r.was_cached),
+       COALESCE(sum(q.prompt_tokens), 0),
+       COALESCE(sum(r.completion_tokens), 0),
+       COALESCE(sum(r.total_tokens), 0),
+       COALESCE(sum(r.latency_ms), 0)
+FROM ai_results r
+LEFT JOIN ai_requests q ON q.request_id = r.request_id
+GROUP BY 1, 2, 3
+ON CONFLICT (tenant_id, hour, latency_bucket) DO NOTHING;
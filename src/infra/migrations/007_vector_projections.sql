@@ -0,0 +1,13 @@
+-- Fitted coarse-vector projections for two-stage search, one per tenant.
+-- Written by python -m app.coarse_index; tenants without a row use truncation.
+CREATE TABLE IF NOT EXISTS vector_projections (
+    tenant_id INTEGER PRIMARY KEY REFERENCES tenants(id) ON DELETE CASCADE,
+    method VARCHAR(20) NOT NULL,
+    dimension SMALLINT NOT NULL,
+    coarse_dimension SMALLINT NOT NULL,
+    components BYTEA NOT NULL,
+    mean BYTEA NOT NULL,
+    sample_size INTEGER,
+    explained_variance REAL,
+    fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,20 @@
+-- Checkpoints for python -m app.reindex, one row per job and tenant, and the
+-- index its keyset pagination over a tenant's chunks walks.
+CREATE TABLE IF NOT EXISTS reindex_progress (
+    job VARCHAR(50) NOT NULL,
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    model VARCHAR(200) NOT NULL,
+    collection VARCHAR(100) NOT NULL,
+    last_chunk_id INTEGER NOT NULL DEFAULT 0,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'copying',
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    switched_at TIMESTAMP,
+    replaced_collection VARCHAR(100),
+    PRIMARY KEY (job, tenant_id)
+);
+-- Tables created by an earlier revision of this migration
+ALTER TABLE reindex_progress ADD COLUMN IF NOT EXISTS replaced_collection VARCHAR(100);
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_tenant_id ON document_chunks(tenant_id, id);
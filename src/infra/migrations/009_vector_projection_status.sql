@@ -0,0 +1,3 @@
+-- Refit state of a coarse projection: while python -m app.coarse_index
+-- rewrites a tenant's coarse vectors ('refitting'), searches are single-stage.
+ALTER TABLE vector_projections ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'applied';
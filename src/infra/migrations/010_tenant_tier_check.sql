@@ -0,0 +1,6 @@
+-- Restrict tenants.tier to the tiers the API accepts (TenantTier in
+-- schemas.py); the metrics are labelled by tier, so free-form values would
+-- grow their cardinality. Map any other existing tier to one of these first.
+ALTER TABLE tenants DROP CONSTRAINT IF EXISTS tenants_tier_check;
+ALTER TABLE tenants ADD CONSTRAINT tenants_tier_check
+    CHECK (tier IN ('free', 'standard', 'enterprise'));
@@ -0,0 +1,127 @@
+-- Give the audit tables a DEFAULT partition per retention class, so /ask
+-- inserts keep working when partition maintenance falls more than
+-- PARTITION_MONTHS_AHEAD months behind; the next maintenance run moves those
+-- rows into their month (see init.sql).
+BEGIN;
+
+-- Create monthly partitions from from_month (or the oldest month waiting in
+-- the DEFAULT partition) through months_ahead months past the current one;
+-- returns how many months were added. Rows inserted while maintenance was
+-- behind land in <parent>_default and are moved into their month here.
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, from_month DATE, months_ahead INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    default_table TEXT := parent || '_default';
+    month_start DATE := date_trunc('month', from_month)::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    oldest_default DATE;
+    month_end DATE;
+    month_table TEXT;
+    has_default_rows BOOLEAN;
+    retention SMALLINT;
+    created INTEGER := 0;
+BEGIN
+    -- Serialise concurrent maintenance from several API workers
+    PERFORM pg_advisory_xact_lock(hashtext('partition_maintenance'));
+    IF to_regclass(default_table) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF %I DEFAULT PARTITION BY LIST (retention_months)',
+            default_table, parent
+        );
+        FOREACH retention IN ARRAY retention_classes() LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES IN (%s)',
+                default_table || '_r' || retention, default_table, retention
+            );
+        END LOOP;
+    END IF;
+    EXECUTE format('SELECT date_trunc(''month'', min(created_at))::date FROM %I', default_table) INTO oldest_default;
+    IF oldest_default < month_start THEN
+        month_start := oldest_default;
+    END IF;
+    WHILE month_start <= last_month LOOP
+        month_table := parent || '_' || to_char(month_start, '"y"YYYY"m"MM');
+        month_end := (month_start + interval '1 month')::date;
+        IF to_regclass(month_table) IS NULL THEN
+            EXECUTE format(
+                'SELECT EXISTS (SELECT 1 FROM %I WHERE created_at >= %L AND created_at < %L)',
+                default_table, month_start, month_end
+            ) INTO has_default_rows;
+            -- A month cannot be added while the DEFAULT partition holds rows
+            -- for it: build it detached, move the rows, then attach it
+            IF has_default_rows THEN
+                EXECUTE format(
+                    'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY LIST (retention_months)',
+                    month_table, parent
+                );
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L) PARTITION BY LIST (retention_months)',
+                    month_table, parent, month_start, month_end
+                );
+            END IF;
+            FOREACH retention IN ARRAY retention_classes() LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES IN (%s)',
+                    month_table || '_r' || retention, month_table, retention
+                );
+            END LOOP;
+            IF has_default_rows THEN
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                    default_table, month_start, month_end, month_table
+                );
+                EXECUTE format(
+                    'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    parent, month_table, month_start, month_end
+                );
+            END IF;
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop retention-class partitions whose newest possible row is older than
+-- their retention, then months left empty; returns how many were dropped.
+-- The DEFAULT partition is left alone: create_monthly_partitions empties it.
+CREATE OR REPLACE FUNCTION drop_expired_partitions(parent TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    month_table RECORD;
+    class_table RECORD;
+    month_start DATE;
+    retention INTEGER;
+    dropped INTEGER := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('partition_maintenance'));
+    FOR month_table IN
+        SELECT c.oid, c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent::regclass AND c.relname <> parent || '_default'
+    LOOP
+        month_start := to_date(right(month_table.relname, 8), '"y"YYYY"m"MM');
+        FOR class_table IN
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = month_table.oid
+        LOOP
+            retention := substring(class_table.relname FROM '_r(\d+)$')::INTEGER;
+            IF month_start + make_interval(months => 1 + retention) <= CURRENT_DATE THEN
+                EXECUTE format('DROP TABLE %I', class_table.relname);
+                dropped := dropped + 1;
+            END IF;
+        END LOOP;
+        IF NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhparent = month_table.oid) THEN
+            EXECUTE format('DROP TABLE %I', month_table.relname);
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_monthly_partitions('ai_requests', CURRENT_DATE, 3);
+SELECT create_monthly_partitions('ai_results', CURRENT_DATE, 3);
+SELECT create_monthly_partitions('audit_logs', CURRENT_DATE, 3);
+
+COMMIT;